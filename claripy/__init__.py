@@ -91,5 +91,10 @@ from .solvers import *
 
 def reset():
     downsize()
-    from .ast import bv  # pylint:disable=redefined-outer-name
+    from .ast import bv, base  # pylint:disable=redefined-outer-name
+    from . import simplifications, balancer  # pylint:disable=redefined-outer-name
     bv._bvv_cache.clear()
+    base._excavation_memo.clear()
+    balancer._balancer_cache.clear()
+    if simplifications.simpleton.memo is not None:
+        simplifications.simpleton.memo.clear()
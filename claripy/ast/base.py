@@ -11,6 +11,9 @@ try:
 except ImportError:
     import pickle
 
+from ..profiling import profiler
+from ..utils import LRUMemo
+
 l = logging.getLogger("claripy.ast")
 
 WORKER = bool(os.environ.get('WORKER', False))
@@ -55,6 +58,10 @@ def _d(h, cls, state):
     op, args, length, variables, symbolic, annotations = state
     return cls.__new__(cls, op, args, length=length, variables=variables, symbolic=symbolic, annotations=annotations, hash=h)
 
+# the excavated forms (see Base.ite_excavated) of interior AST nodes, keyed by their hashes, so that excavating an
+# expression does not walk again the subexpressions that were excavated recently as part of another one
+_excavation_memo = LRUMemo(0x4000)
+
 class Base:
     """
     This is the base class of all claripy ASTs. An AST tracks a tree of operations on arguments.
@@ -144,18 +151,20 @@ class Base:
         if add_variables:
             kwargs['variables'] = kwargs['variables'] | add_variables
 
-        eager_backends = list(backends._eager_backends) if 'eager_backends' not in kwargs else kwargs['eager_backends']
+        eager_backends = backends._eager_backends if 'eager_backends' not in kwargs else kwargs['eager_backends']
 
-        if not kwargs['symbolic'] and eager_backends is not None and op not in operations.leaf_operations:
+        if not kwargs['symbolic'] and eager_backends and op not in operations.leaf_operations:
             for eb in eager_backends:
+                # constant folding, without a round trip through backend objects
+                r = eb.fold(op, a_args)
+                if r is not None:
+                    return r
                 try:
                     r = operations._handle_annotations(eb._abstract(eb.call(op, args)), args)
                     if r is not None:
                         return r
-                    else:
-                        eager_backends.remove(eb)
                 except BackendError:
-                    eager_backends.remove(eb)
+                    pass
 
         # if we can't be eager anymore, null out the eagerness
         kwargs['eager_backends'] = None
@@ -172,6 +181,8 @@ class Base:
 
         h = Base._calc_hash(op, a_args, kwargs) if hash is None else hash
         self = cls._hash_cache.get(h, None)
+        if profiler.enabled:
+            profiler.count('ast.hash_cons.hit' if self is not None else 'ast.hash_cons.miss')
         if self is None:
             self = super(Base, cls).__new__(cls)
             depth = arg_max_depth + 1
@@ -844,10 +855,19 @@ class Base:
         # print("replaced the",different_idx,"arg:",new_args)
         return old_true.__class__(old_true.op, new_args, length=self.length)
 
-    def _excavate_ite(self):
+    def _excavate_ite(self, memo=None):
+        """
+        Each interior node is excavated once: nodes that were excavated before, in this walk, with the same `memo`, or
+        recently (see _excavation_memo), are not walked again.
+
+        :param memo:    A dict of id() of an AST to its excavated form, which is used and filled for the interior nodes.
+                        The ASTs must be kept alive as long as the memo is used.
+        """
         ast_queue = [iter([self])]
         arg_queue = []
         op_queue = []
+        memo = { } if memo is None else memo
+        shared = _excavation_memo if _excavation_memo.maxsize else None
 
         while ast_queue:
             try:
@@ -865,6 +885,15 @@ class Base:
                     arg_queue.append(ast)
                     continue
 
+                excavated = ast._excavated
+                if excavated is None:
+                    excavated = memo.get(id(ast), None)
+                if excavated is None and shared is not None:
+                    excavated = shared.get(ast._hash)
+                if excavated is not None:
+                    arg_queue.append(excavated)
+                    continue
+
                 op_queue.append(ast)
                 ast_queue.append(iter(ast.args))
 
@@ -880,8 +909,12 @@ class Base:
                     ite_args = [isinstance(a, Base) and a.op == 'If' for a in args]
 
                     if op.op == 'If':
-                        # if we are an If, call the If handler so that we can take advantage of its simplifiers
-                        excavated = If(*args)
+                        if all(a is b for a, b in zip(args, op.args)):
+                            # nothing came to the surface, and the If handler has already seen these arguments
+                            excavated = op
+                        else:
+                            # if we are an If, call the If handler so that we can take advantage of its simplifiers
+                            excavated = If(*args)
 
                     elif ite_args.count(True) == 0:
                         # if there are no ifs that came to the surface, there's nothing more to do
@@ -891,6 +924,7 @@ class Base:
                         # this gets called when we're *not* in an If, but there are Ifs in the args.
                         # it pulls those Ifs out to the surface.
                         cond = args[ite_args.index(True)].args[0]
+                        not_cond = None
                         new_true_args = []
                         new_false_args = []
 
@@ -898,10 +932,15 @@ class Base:
                             if not isinstance(a, Base) or a.op != 'If':
                                 new_true_args.append(a)
                                 new_false_args.append(a)
+                                continue
                             elif a.args[0] is cond:
                                 new_true_args.append(a.args[1])
                                 new_false_args.append(a.args[2])
-                            elif a.args[0] is Not(cond):
+                                continue
+
+                            if not_cond is None:
+                                not_cond = Not(cond)
+                            if a.args[0] is not_cond:
                                 new_true_args.append(a.args[2])
                                 new_false_args.append(a.args[1])
                             else:
@@ -914,6 +953,9 @@ class Base:
                                            op.swap_args(new_false_args))
 
                     # continue
+                    memo[id(op)] = excavated
+                    if shared is not None:
+                        shared.put(op._hash, excavated)
                     arg_queue.append(excavated)
 
         assert len(op_queue) == 0, "op_queue is not empty"
@@ -1,5 +1,7 @@
 import binascii
+import collections
 import logging
+import math
 import numbers
 
 from .bits import Bits
@@ -8,7 +10,96 @@ from .bool import If
 
 l = logging.getLogger("claripy.ast.bv")
 
-_bvv_cache = dict()
+class BVVCache:
+    """
+    The cache of BVV ASTs, keyed by (value, size).
+
+    Small constants (those within `hot_limit` of 0, at the common widths in `hot_sizes`) live in a permanent table.
+    Every other constant goes into an LRU tier that holds at most `maxsize` entries, so that long runs which create
+    many distinct constants (addresses, for instance) do not keep all of them alive through the hash-cons table.
+    """
+
+    def __init__(self, maxsize=0x10000, hot_limit=0x100, hot_sizes=(1, 8, 16, 32, 64)):
+        self.maxsize = maxsize
+        self.hot_limit = hot_limit
+        self.hot_sizes = frozenset(hot_sizes)
+        self._hot = { }
+        self._lru = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _is_hot(self, key):
+        value, size = key
+        if size not in self.hot_sizes or type(value) is not int:
+            return False
+        # small non-negative values, and small negative ones in two's complement
+        return value < self.hot_limit or value >= (1 << size) - self.hot_limit
+
+    def __getitem__(self, key):
+        try:
+            r = self._hot[key]
+        except KeyError:
+            try:
+                r = self._lru[key]
+                self._lru.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                raise
+        self.hits += 1
+        return r
+
+    def __setitem__(self, key, value):
+        if self._is_hot(key):
+            self._hot[key] = value
+            return
+
+        self._lru[key] = value
+        if len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self._hot or key in self._lru
+
+    def __len__(self):
+        return len(self._hot) + len(self._lru)
+
+    def __iter__(self):
+        yield from self._hot
+        yield from self._lru
+
+    def items(self):
+        yield from self._hot.items()
+        yield from self._lru.items()
+
+    def trim(self, fraction):
+        """
+        Drops `fraction` of the least recently used entries of the LRU tier. The permanent table is kept.
+
+        :return:    The number of entries dropped.
+        """
+        k = min(len(self._lru), int(math.ceil(len(self._lru) * fraction)))
+        for _ in range(k):
+            self._lru.popitem(last=False)
+        self.evictions += k
+        return k
+
+    def clear(self):
+        self._hot.clear()
+        self._lru.clear()
+
+    def stats(self):
+        return {
+            'hot': len(self._hot),
+            'lru': len(self._lru),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+_bvv_cache = BVVCache()
 
 # This is a hilarious hack to get around some sort of bug in z3's python bindings, where
 # under some circumstances stuff gets destructed out of order
@@ -252,12 +343,18 @@ def BVV(value, size=None, **kwargs):
     if value is not None:
         value &= (1 << size) -1
 
-    if not kwargs:
-        try: return _bvv_cache[(value, size)]
-        except KeyError: pass
+    if kwargs:
+        # annotated constants are not shared
+        return BV('BVV', (value, size), length=size, **kwargs)
+
+    key = (value, size)
+    try:
+        return _bvv_cache[key]
+    except KeyError:
+        pass
 
-    result = BV('BVV', (value, size), length=size, **kwargs)
-    _bvv_cache[(value, size)] = result
+    result = BV('BVV', key, length=size)
+    _bvv_cache[key] = result
     return result
 
 def SI(name=None, bits=0, lower_bound=None, upper_bound=None, stride=None, to_conv=None, explicit_name=None,
@@ -7,6 +7,8 @@ class BackendObject:
     Backend objects that *don't* derive from this class need to be wrapped in a type-I claripy.ast.Base.
     """
 
+    __slots__ = ()
+
     def to_claripy(self):
         """
         Claripy calls this to retrieve something that it can directly reason about.
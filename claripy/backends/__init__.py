@@ -1,11 +1,16 @@
+import contextlib
 import ctypes
 import weakref
 import operator
 import threading
+import time
 
 import logging
 l = logging.getLogger('claripy.backend')
 
+from ..profiling import profiler, profiled
+from .object_cache import ObjectCache, WeakObjectCache, LRUObjectCache, ArenaObjectCache
+
 class Backend:
     """
     Backends are Claripy's workhorses. Claripy exposes ASTs (claripy.ast.Base objects)
@@ -47,12 +52,19 @@ class Backend:
     _convert() to see if the backend can handle that type of object.
     """
 
-    __slots__ = ('_op_raw', '_op_expr', '_cache_objects', '_solver_required', '_tls', '_true_cache', '_false_cache', )
+    __slots__ = ('_op_raw', '_op_expr', '_cache_objects', '_object_cache_factory', '_solver_required', '_tls',
+                 '_true_cache', '_false_cache', )
 
-    def __init__(self, solver_required=None):
+    def __init__(self, solver_required=None, object_cache=None):
+        """
+        :param solver_required: Whether this backend needs a solver to evaluate expressions.
+        :param object_cache:    A callable returning a new ObjectCache, which sets the policy of the conversion cache
+                                (default: WeakObjectCache). It is called once per thread.
+        """
         self._op_raw = { }
         self._op_expr = { }
         self._cache_objects = True
+        self._object_cache_factory = WeakObjectCache if object_cache is None else object_cache
         self._solver_required = solver_required is not None
 
         self._tls = threading.local()
@@ -68,9 +80,26 @@ class Backend:
         try:
             return self._tls.object_cache
         except AttributeError:
-            self._tls.object_cache = weakref.WeakKeyDictionary()
+            self._tls.object_cache = self._object_cache_factory()
             return self._tls.object_cache
 
+    @contextlib.contextmanager
+    def object_cache_scope(self):
+        """
+        Opens a scope for the conversion cache of this thread. With an ArenaObjectCache, everything converted in the
+        scope shares conversions, and is dropped when the outermost scope ends. With other caches, this does nothing.
+        """
+        cache = self._object_cache
+        if not cache.scoped:
+            yield
+            return
+
+        cache.enter()
+        try:
+            yield
+        finally:
+            cache.exit()
+
     def _make_raw_ops(self, op_list, op_dict=None, op_module=None):
         for o in op_list:
             if op_dict is not None:
@@ -124,6 +153,17 @@ class Backend:
         self._true_cache.clear()
         self._false_cache.clear()
 
+    def _caches(self):
+        """
+        Returns a dict of cache name to `(cache, trimmable)` for the caches of this backend, for introspection by
+        :func:`claripy.caches.cache_stats`. Per-thread caches are those of the calling thread.
+        """
+        return {
+            'object_cache': (self._object_cache, True),
+            'true_cache': (self._true_cache, True),
+            'false_cache': (self._false_cache, True),
+        }
+
     def handles(self, expr):
         """
         Checks whether this backend can handle the expression.
@@ -142,12 +182,44 @@ class Backend:
         Resolves a claripy.ast.Base into something usable by the backend.
 
         :param expr:    The expression.
-        :param save:    Save the result in the expression's object cache
         :return:        A backend object.
         """
-        ast_queue = [[expr]]
+        # this is too hot for @profiled, which costs a call even when profiling is disabled
+        if profiler.enabled:
+            start = time.perf_counter()
+            try:
+                return self._convert_all([expr])[0]
+            finally:
+                profiler.record_time(type(self).__name__ + '.convert', time.perf_counter() - start)
+        return self._convert_all([expr])[0]
+
+    @profiled
+    def convert_list(self, args):
+        """
+        Resolves a list of claripy.ast.Base objects into something usable by the backend. The union of their DAGs is
+        walked once, so subexpressions that they share are converted once, even if this backend does not cache objects.
+
+        :param args:    The expressions.
+        :return:        A list of backend objects.
+        """
+        with self.object_cache_scope():
+            return self._convert_all(list(args))
+
+    def _convert_all(self, exprs):
+        """
+        Converts all the expressions of the list `exprs` (which is consumed) in a single traversal, with a memo of the
+        nodes converted so far.
+        """
+        ast_queue = [exprs]
         arg_queue = []
         op_queue = []
+        # id() of a node to its conversion. The nodes are alive until we return, so their ids cannot be reused.
+        memo = { }
+        root = None
+
+        cache = self._object_cache if self._cache_objects else None
+        if cache is not None and cache.scoped:
+            cache.enter()
 
         try:
             while ast_queue:
@@ -155,6 +227,8 @@ class Backend:
 
                 if args_list:
                     ast = args_list.pop(0)
+                    if len(ast_queue) == 1:
+                        root = ast
 
                     if type(ast) in {bool, int, str, float} or not isinstance(ast, Base):
                         converted = self._convert(ast)
@@ -165,11 +239,12 @@ class Backend:
                         raise BackendError("%s can't handle operation %s (%s) due to a failed "
                                            "conversion on a child node" % (self, ast.op, ast.__class__.__name__))
 
-                    if self._cache_objects:
-                        cached_obj = self._object_cache.get(ast._cache_key, None)
-                        if cached_obj is not None:
-                            arg_queue.append(cached_obj)
-                            continue
+                    cached_obj = memo.get(id(ast), None)
+                    if cached_obj is None and cache is not None:
+                        cached_obj = cache.lookup(ast)
+                    if cached_obj is not None:
+                        arg_queue.append(cached_obj)
+                        continue
 
                     op_queue.append(ast)
                     if ast.op in self._op_expr:
@@ -199,8 +274,9 @@ class Backend:
                         for a in ast.annotations:
                             r = self.apply_annotation(r, a)
 
-                        if self._cache_objects:
-                            self._object_cache[ast._cache_key] = r
+                        memo[id(ast)] = r
+                        if cache is not None:
+                            cache.store(ast, r)
 
                         arg_queue.append(r)
 
@@ -210,24 +286,34 @@ class Backend:
         except BackendError:
             for ast in op_queue:
                 ast._errored.add(self)
-            if isinstance(expr, Base):
-                expr._errored.add(self)
+            if isinstance(root, Base):
+                root._errored.add(self)
             raise
 
+        finally:
+            if cache is not None and cache.scoped:
+                cache.exit()
+
         # Note: Uncomment the following assertions if you are touching the above implementation
         # assert len(op_queue) == 0, "op_queue is not empty"
         # assert len(ast_queue) == 0, "ast_queue is not empty"
-        # assert len(arg_queue) == 1, ("arg_queue has unexpected length", len(arg_queue))
-
-        return arg_queue.pop()
+        # assert len(arg_queue) == number of expressions, ("arg_queue has unexpected length", len(arg_queue))
 
-    def convert_list(self, args):
-        return [ self.convert(a) for a in args ]
+        return arg_queue
 
     #
     # These functions provide support for applying operations to expressions.
     #
 
+    def fold(self, op, args): #pylint:disable=no-self-use,unused-argument
+        """
+        Evaluates operation `op` on the AST arguments `args` without going through backend objects, if the backend has
+        a shortcut for it. This is tried by eager evaluation before call().
+
+        :return:   The resulting AST, or None if there is no shortcut for this operation and these arguments.
+        """
+        return None
+
     def call(self, op, args):
         """
         Calls operation `op` on args `args` with this backend.
@@ -282,6 +368,7 @@ class Backend:
     # These functions simplify expressions.
     #
 
+    @profiled
     def simplify(self, e):
         o = self._abstract(self._simplify(self.convert(e)))
         o._simplified = Base.FULL_SIMPLIFY
@@ -478,6 +565,7 @@ class Backend:
     # These functions provide evaluation support.
     #
 
+    @profiled
     def eval(self, expr, n, extra_constraints=(), solver=None, model_callback=None):
         """
         This function returns up to `n` possible solutions for expression `expr`.
@@ -512,6 +600,7 @@ class Backend:
         """
         raise BackendError("backend doesn't support eval()")
 
+    @profiled
     def batch_eval(self, exprs, n, extra_constraints=(), solver=None, model_callback=None):
         """
         Evaluate one or multiple expressions.
@@ -547,6 +636,7 @@ class Backend:
 
         raise BackendError("backend doesn't support batch_eval()")
 
+    @profiled
     def min(self, expr, extra_constraints=(), solver=None, model_callback=None):
         """
         Return the minimum value of `expr`.
@@ -576,6 +666,7 @@ class Backend:
         """
         raise BackendError("backend doesn't support min()")
 
+    @profiled
     def max(self, expr, extra_constraints=(), solver=None, model_callback=None):
         """
         Return the maximum value of expr.
@@ -627,6 +718,7 @@ class Backend:
         """
         return 'SAT' if self.satisfiable(extra_constraints=extra_constraints, solver=solver, model_callback=model_callback) else 'UNSAT'
 
+    @profiled
     def satisfiable(self, extra_constraints=(), solver=None, model_callback=None):
         """
         This function does a constraint check and checks if the solver is in a sat state.
@@ -650,6 +742,7 @@ class Backend:
         raise BackendError("backend doesn't support solving")
 
 
+    @profiled
     def solution(self, expr, v, extra_constraints=(), solver=None, model_callback=None):
         """
         Return True if `v` is a solution of `expr` with the extra constraints, False otherwise.
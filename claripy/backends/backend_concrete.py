@@ -67,16 +67,50 @@ class BackendConcrete(Backend):
     def _op_and(*args):
         return reduce(operator.__and__, args)
 
+    def fold(self, op, args):
+        """
+        Override Backend.fold() to evaluate bitvector and boolean operations on unannotated BVVs and BoolVs directly on
+        their Python values, without creating bv.BVV objects. The results are the shared BVV and BoolV ASTs.
+        """
+        folder = _folders.get(op, None)
+        if folder is None:
+            return None
+
+        values = [ ]
+        sizes = [ ]
+        for a in args:
+            ta = type(a)
+            if ta is int:
+                values.append(a)
+                sizes.append(None)
+            elif ta is BV and a.op == 'BVV' and not a.annotations and a.args[0] is not None:
+                values.append(a.args[0])
+                sizes.append(a.args[1])
+            elif ta is Bool and a.op == 'BoolV' and not a.annotations:
+                values.append(a.args[0])
+                sizes.append(None)
+            else:
+                return None
+
+        r = folder(values, sizes)
+        if r is None:
+            return None
+        elif type(r) is bool:
+            return BoolV(r)
+        else:
+            return BVV(r[0] & _mask(r[1]), r[1])
+
     def convert(self, expr):
         """
         Override Backend.convert() to add fast paths for BVVs and BoolVs.
         """
         if type(expr) is BV:
             if expr.op == "BVV":
-                cached_obj = self._object_cache.get(expr._cache_key, None)
+                cache = self._object_cache
+                cached_obj = cache.lookup(expr)
                 if cached_obj is None:
                     cached_obj = self.BVV(*expr.args)
-                    self._object_cache[expr._cache_key] = cached_obj
+                    cache.store(expr, cached_obj)
                 return cached_obj
         if type(expr) is Bool and expr.op == "BoolV":
             return expr.args[0]
@@ -200,6 +234,199 @@ class BackendConcrete(Backend):
     def _has_false(self, e, extra_constraints=(), solver=None, model_callback=None):
         return e == False
 
+#
+# Constant folding on Python ints. Each folder takes the values and sizes of the arguments (the size of an int or bool
+# argument is None), and returns a bool, a (value, size) tuple, or None if it can't handle the arguments. The results
+# are masked by fold().
+#
+
+_masks = tuple((1 << n) - 1 for n in range(129))
+
+def _mask(n):
+    return _masks[n] if n <= 128 else (1 << n) - 1
+
+def _signed(v, n):
+    return v - (1 << n) if v >> (n - 1) else v
+
+def _same_size(sizes):
+    n = sizes[0] if sizes else None
+    if not n or any(s != n for s in sizes):
+        return None
+    return n
+
+def _variadic(f):
+    def folder(values, sizes):
+        n = _same_size(sizes)
+        if n is None:
+            return None
+        return reduce(f, values), n
+    return folder
+
+def _binary(f):
+    def folder(values, sizes):
+        if len(values) != 2:
+            return None
+        n = _same_size(sizes)
+        if n is None:
+            return None
+        return f(values[0], values[1], n)
+    return folder
+
+def _unary(f):
+    def folder(values, sizes):
+        if len(values) != 1 or not sizes[0]:
+            return None
+        return f(values[0], sizes[0]), sizes[0]
+    return folder
+
+def _fold_div(a, b, n):
+    return (a // b, n) if b else None
+
+def _fold_mod(a, b, n):
+    return (a % b, n) if b else None
+
+def _fold_sdiv(a, b, n):
+    a, b = _signed(a, n), _signed(b, n)
+    if b == 0:
+        return None
+    # round towards zero
+    q = abs(a) // abs(b)
+    return (q if (a < 0) == (b < 0) else -q), n
+
+def _fold_smod(a, b, n):
+    a, b = _signed(a, n), _signed(b, n)
+    if b == 0:
+        return None
+    # the sign of the result is the sign of the dividend, like the % operator in C
+    r = abs(a) % abs(b)
+    return (-r if a < 0 else r), n
+
+def _fold_lshift(a, b, n):
+    b = _signed(b, n)
+    if b < 0:
+        return None
+    return (a << b if b < n else 0), n
+
+def _fold_rshift(a, b, n):
+    b = _signed(b, n)
+    if b < 0:
+        return None
+    return (_signed(a, n) >> b if b < n else 0), n
+
+def _fold_lshr(a, b, n):
+    b = _signed(b, n)
+    if b < 0:
+        return None
+    return a >> b, n
+
+def _compare(f, signed=False):
+    def folder(values, sizes):
+        if len(values) != 2:
+            return None
+        n = _same_size(sizes)
+        if n is None:
+            return None
+        a, b = values
+        if signed:
+            a, b = _signed(a, n), _signed(b, n)
+        return f(a, b)
+    return folder
+
+def _equality(f):
+    def folder(values, sizes):
+        if len(values) != 2 or sizes[0] != sizes[1]:
+            return None
+        a, b = values
+        if sizes[0] is None and (type(a) is not bool or type(b) is not bool):
+            return None
+        return f(a, b)
+    return folder
+
+def _fold_extract(values, sizes):
+    if len(values) != 3 or sizes[0] is not None or sizes[1] is not None or not sizes[2]:
+        return None
+    hi, lo, v = values
+    if not 0 <= lo <= hi < sizes[2]:
+        return None
+    return v >> lo, hi - lo + 1
+
+def _extend(signed):
+    def folder(values, sizes):
+        if len(values) != 2 or sizes[0] is not None or not sizes[1]:
+            return None
+        k, v = values
+        if k < 0:
+            return None
+        return (_signed(v, sizes[1]) if signed else v), sizes[1] + k
+    return folder
+
+def _fold_concat(values, sizes):
+    total_value = 0
+    total_size = 0
+    for v, n in zip(values, sizes):
+        if not n:
+            return None
+        total_value = (total_value << n) | v
+        total_size += n
+    return total_value, total_size
+
+def _boolean(f):
+    def folder(values, sizes): #pylint:disable=unused-argument
+        if not all(type(v) is bool for v in values):
+            return None
+        return f(values)
+    return folder
+
+def _fold_not(values, sizes): #pylint:disable=unused-argument
+    if len(values) != 1 or type(values[0]) is not bool:
+        return None
+    return not values[0]
+
+def _fold_if(values, sizes):
+    if len(values) != 3 or type(values[0]) is not bool or sizes[1] is None or sizes[1] != sizes[2]:
+        return None
+    return (values[1], sizes[1]) if values[0] else (values[2], sizes[2])
+
+_folders = {
+    '__add__': _variadic(operator.__add__),
+    '__sub__': _variadic(operator.__sub__),
+    '__mul__': _variadic(operator.__mul__),
+    '__and__': _variadic(operator.__and__),
+    '__or__': _variadic(operator.__or__),
+    '__xor__': _variadic(operator.__xor__),
+    '__floordiv__': _binary(_fold_div),
+    '__mod__': _binary(_fold_mod),
+    'SDiv': _binary(_fold_sdiv),
+    'SMod': _binary(_fold_smod),
+    '__lshift__': _binary(_fold_lshift),
+    '__rshift__': _binary(_fold_rshift),
+    'LShR': _binary(_fold_lshr),
+    '__invert__': _unary(lambda v, n: v ^ _mask(n)),
+    '__neg__': _unary(lambda v, n: -v),
+    '__eq__': _equality(operator.__eq__),
+    '__ne__': _equality(operator.__ne__),
+    '__lt__': _compare(operator.__lt__),
+    '__le__': _compare(operator.__le__),
+    '__gt__': _compare(operator.__gt__),
+    '__ge__': _compare(operator.__ge__),
+    'ULT': _compare(operator.__lt__),
+    'ULE': _compare(operator.__le__),
+    'UGT': _compare(operator.__gt__),
+    'UGE': _compare(operator.__ge__),
+    'SLT': _compare(operator.__lt__, signed=True),
+    'SLE': _compare(operator.__le__, signed=True),
+    'SGT': _compare(operator.__gt__, signed=True),
+    'SGE': _compare(operator.__ge__, signed=True),
+    'Extract': _fold_extract,
+    'ZeroExt': _extend(False),
+    'SignExt': _extend(True),
+    'Concat': _fold_concat,
+    'And': _boolean(all),
+    'Or': _boolean(any),
+    'Not': _fold_not,
+    'If': _fold_if,
+}
+
 from ..operations import backend_operations, backend_fp_operations, backend_strings_operations
 from .. import bv, fp, strings
 from ..ast import Base
@@ -12,7 +12,7 @@ from pysmt.typing import STRING, INT, BOOL
 l = logging.getLogger("claripy.backends.backend_smt")
 
 
-from . import BackendError, Backend
+from . import BackendError, Backend, ArenaObjectCache
 
 
 def _expr_to_smtlib(e, daggify=True):
@@ -59,6 +59,8 @@ class BackendSMTLibBase(Backend):
     def __init__(self, *args, **kwargs):
         self.daggify = kwargs.pop('daggify', True)
         self.reuse_z3_solver = False
+        # conversions are only needed while a query's script is built
+        kwargs.setdefault('object_cache', ArenaObjectCache)
         Backend.__init__(self, *args, **kwargs)
 
         # ------------------- LEAF OPERATIONS ------------------- 
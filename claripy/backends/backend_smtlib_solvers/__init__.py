@@ -206,8 +206,9 @@ class SMTLibSolverBackend(BackendSMTLibBase):
         if self._solver_required and solver is None:
             raise BackendError("%s requires a solver for evaluation" % self.__class__.__name__)
 
+        converted = self.convert_list((expr,) + tuple(extra_constraints))
         results = self._eval(
-            self.convert(expr), n, extra_constraints=self.convert_list(extra_constraints),
+            converted[0], n, extra_constraints=converted[1:],
             solver=solver, model_callback=model_callback
         )
 
@@ -7,6 +7,7 @@ from functools import reduce
 l = logging.getLogger("claripy.backends.backend_vsa")
 
 from . import Backend, BackendError
+from ..utils import LRUMemo
 from ..vsa import RegionAnnotation
 
 def arg_filter(f):
@@ -44,16 +45,86 @@ def convert_args(f):
         for i in range(len(raw_args)):
             raw_args[i] = self.convert(raw_args[i])
 
-        normalized = ast.swap_args(raw_args)
-        ret = f(self, normalized)
-
-        return ret
+        return self._memoized(f.__name__, raw_args, lambda: f(self, ast.swap_args(raw_args)))
 
     return converter
 
+
+class OperationCache(LRUMemo):
+    """
+    A bounded LRU cache of the results of operations on StridedIntervals, keyed by the operation and the identity of
+    its operands. The StridedIntervals that BackendVSA hands out are never modified, so an operation on the same
+    objects always has the same result. The entries hold their operands, so that their ids can't be reused while they
+    are cached. Operands that are not shared (see StridedInterval.intern()), such as the named StridedIntervals of
+    symbolic variables, are keyed by their value and their name instead. Only shared results are cached, since an
+    unshared one (e.g., the Reverse of a named StridedInterval) may be modified by whoever it is handed to.
+
+    Whether DiscreteStridedIntervalSets are allowed changes the results of some operations, so it is part of the key.
+    Hits and misses are counted for every operation.
+    """
+
+    def __init__(self, maxsize=0x10000):
+        super().__init__(maxsize)
+        # op -> [hits, misses]
+        self._op_counts = { }
+
+    @staticmethod
+    def key(op, args):
+        """
+        Returns the key of an operation, or None if its operands can't be cached.
+        """
+        key = [ op, strided_interval.allow_dsis ]
+        for a in args:
+            ta = type(a)
+            if ta is StridedInterval:
+                if a._shared:
+                    key.append(id(a))
+                else:
+                    key.append((a._name, a._bits, a._stride, a._lower_bound, a._upper_bound, a._reversed,
+                                a._uninitialized, a._is_bottom))
+            elif ta is int:
+                # not an id or a value
+                key.append((a,))
+            else:
+                return None
+        return tuple(key)
+
+    def lookup(self, key):
+        """
+        Returns the cached result for `key`, or None.
+        """
+        r = self.get(key)
+        with self._lock:
+            counts = self._op_counts.get(key[0], None)
+            if counts is None:
+                counts = self._op_counts[key[0]] = [ 0, 0 ]
+            counts[r is None] += 1
+        return None if r is None else r[1]
+
+    def store(self, key, args, result):
+        self.put(key, (tuple(args), result))
+
+    def op_stats(self):
+        """
+        Returns a dict of operation to a dict with its `hits` and `misses`.
+        """
+        with self._lock:
+            return { op: { 'hits': h, 'misses': m } for op, (h, m) in self._op_counts.items() }
+
+    def stats(self):
+        stats = super().stats()
+        stats['ops'] = self.op_stats()
+        return stats
+
+
 class BackendVSA(Backend):
-    def __init__(self):
-        Backend.__init__(self)
+    def __init__(self, object_cache=None, op_cache_size=0x10000):
+        """
+        :param op_cache_size:   The number of operation results to keep in the operation cache (see OperationCache),
+                                or 0 to disable it.
+        """
+        Backend.__init__(self, object_cache=object_cache)
+        self._op_cache = OperationCache(op_cache_size) if op_cache_size else None
         # self._make_raw_ops(set(expression_operations) - set(expression_set_operations), op_module=BackendVSA)
         self._make_expr_ops(set(expression_set_operations), op_class=self)
         self._make_raw_ops(set(backend_operations_vsa_compliant), op_module=BackendVSA)
@@ -101,6 +172,81 @@ class BackendVSA(Backend):
     def convert(self, expr):
         return Backend.convert(self, expr.ite_excavated if isinstance(expr, Base) else expr)
 
+    def _call(self, op, args):
+        return self._memoized(op, args, lambda: Backend._call(self, op, args))
+
+    def _memoized(self, op, args, f):
+        """
+        Returns the result of the operation `op` on the backend objects `args`, which `f` computes if it isn't in the
+        operation cache.
+        """
+        cache = self._op_cache
+        key = OperationCache.key(op, args) if cache is not None else None
+        if key is not None:
+            r = cache.lookup(key)
+            if r is not None:
+                return r
+
+        r = f()
+        if type(r) is StridedInterval:
+            # hand out shared StridedIntervals, so that equal results of different ASTs are one object
+            r = r.intern()
+        if key is not None and (isinstance(r, BoolResult) or (type(r) is StridedInterval and r._shared)):
+            cache.store(key, args, r)
+        return r
+
+    def downsize(self):
+        Backend.downsize(self)
+        if self._op_cache is not None:
+            self._op_cache.clear()
+
+    def _caches(self):
+        caches = Backend._caches(self)
+        if self._op_cache is not None:
+            caches['op_cache'] = (self._op_cache, True)
+        return caches
+
+    def convert_list(self, args):
+        return Backend.convert_list(self, self._excavate_all(args))
+
+    @staticmethod
+    def _excavate_all(exprs):
+        """
+        Excavates the ITEs of a list of expressions with one memo, so that the subexpressions they share are excavated
+        once.
+        """
+        memo = { }
+        excavated = [ ]
+        for e in exprs:
+            if isinstance(e, Base):
+                if e._excavated is None:
+                    e._excavated = e._excavate_ite(memo)
+                    e._excavated._excavated = e._excavated
+                e = e._excavated
+            excavated.append(e)
+        return excavated
+
+    def evaluate_batch(self, exprs, constraints=()):
+        """
+        Evaluates many expressions and constraints at once, like the ones of a basic block. The ITEs of all of them are
+        excavated with one memo, the expressions are converted in one pass over the union of their DAGs, and all of it
+        happens in one conversion cache scope, so the subexpressions they share are excavated and converted once.
+
+        :param exprs:       The expressions to evaluate.
+        :param constraints: The constraints to turn into bounds on their variables, as constraint_to_si() does.
+        :return:            A tuple of the list of the values of the expressions (StridedIntervals, ValueSets or
+                            BoolResults), and the list of the (sat, replacements) tuples of the constraints.
+        """
+        exprs = list(exprs)
+        constraints = list(constraints)
+
+        with self.object_cache_scope():
+            excavated = self._excavate_all(exprs + constraints)
+            values = self._convert_all(excavated[:len(exprs)])
+            bounds = [ balance(self, c) for c in constraints ]
+
+        return values, bounds
+
     def _convert(self, a):
         if isinstance(a, numbers.Number):
             return a
@@ -236,7 +382,7 @@ class BackendVSA(Backend):
         if ast.args[0] is None:
             return StridedInterval.empty(ast.args[1])
         else:
-            return CreateStridedInterval(bits=ast.args[1], stride=0, lower_bound=ast.args[0], upper_bound=ast.args[0])
+            return CreateStridedInterval(bits=ast.args[1], stride=0, lower_bound=ast.args[0], upper_bound=ast.args[0]).intern()
 
     @staticmethod
     def BoolV(ast): #pylint:disable=unused-argument
@@ -422,14 +568,15 @@ class BackendVSA(Backend):
 
     @staticmethod
     def CreateTopStridedInterval(bits, name=None, uninitialized=False): #pylint:disable=unused-argument,no-self-use
-        return StridedInterval.top(bits, name, uninitialized=uninitialized)
+        return StridedInterval.top(bits, name, uninitialized=uninitialized).intern()
 
     def constraint_to_si(self, expr):
-        return Balancer(self, expr).compat_ret
+        return balance(self, expr)
 
 from ..ast.base import Base
 from ..operations import backend_operations_vsa_compliant, expression_set_operations
 from ..vsa import StridedInterval, CreateStridedInterval, DiscreteStridedIntervalSet, ValueSet, AbstractLocation, BoolResult, TrueResult, FalseResult
-from ..balancer import Balancer
+from ..balancer import balance
+from ..vsa import strided_interval
 
 BackendVSA.CreateStridedInterval = staticmethod(CreateStridedInterval)
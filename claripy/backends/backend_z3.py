@@ -1,18 +1,21 @@
 
 import os
 import z3
+import math
+import collections
 import ctypes
 import logging
 import numbers
 import operator
 import threading
+import time
 import weakref
 from functools import reduce
 from decimal import Decimal
 
-from cachetools import LRUCache
 
 from ..errors import ClaripyZ3Error
+from ..profiling import profiled
 
 l = logging.getLogger("claripy.backends.backend_z3")
 
@@ -84,30 +87,306 @@ def _z3_decl_name_str(ctx, decl):
     return symbol_name
 
 
-class SmartLRUCache(LRUCache):
-    def __init__(self, maxsize, getsizeof=None, evict=None):
-        LRUCache.__init__(self, maxsize, getsizeof)
+#
+# Raw conversion: constructors for the Z3 C API, working on Ast pointers, keyed by claripy operation
+#
+
+def _raw_unop(mk):
+    return lambda ctx, args: mk(ctx, args[0])
+
+def _raw_binop(mk):
+    return lambda ctx, args: mk(ctx, args[0], args[1])
+
+def _raw_fold(mk):
+    # left fold, like reduce() over the z3 operators does
+    def fold(ctx, args):
+        r = args[0]
+        for a in args[1:]:
+            r = mk(ctx, r, a)
+        return r
+    return fold
+
+def _raw_array(mk):
+    def array_op(ctx, args):
+        return mk(ctx, len(args), (z3.Ast * len(args))(*args))
+    return array_op
+
+def _raw_comparison(mk):
+    # Python tries the reflected comparison first when the right operand is of a subclass of the left one's type, so
+    # the z3 operators put numerals on the left. Do the same, so that both conversion paths build the same terms.
+    def comparison(ctx, args):
+        a, b = args
+        if z3.Z3_is_numeral_ast(ctx, b) and not z3.Z3_is_numeral_ast(ctx, a):
+            a, b = b, a
+        return mk(ctx, a, b)
+    return comparison
+
+_raw_ops = {
+    '__add__': _raw_fold(z3.Z3_mk_bvadd),
+    '__sub__': _raw_fold(z3.Z3_mk_bvsub),
+    '__mul__': _raw_fold(z3.Z3_mk_bvmul),
+    '__and__': _raw_fold(z3.Z3_mk_bvand),
+    '__or__': _raw_fold(z3.Z3_mk_bvor),
+    '__xor__': _raw_fold(z3.Z3_mk_bvxor),
+    '__floordiv__': _raw_binop(z3.Z3_mk_bvudiv),
+    '__mod__': _raw_binop(z3.Z3_mk_bvurem),
+    'SDiv': _raw_binop(z3.Z3_mk_bvsdiv),
+    'SMod': _raw_binop(z3.Z3_mk_bvsrem),
+    '__lshift__': _raw_binop(z3.Z3_mk_bvshl),
+    '__rshift__': _raw_binop(z3.Z3_mk_bvashr),
+    'LShR': _raw_binop(z3.Z3_mk_bvlshr),
+    'RotateLeft': _raw_binop(z3.Z3_mk_ext_rotate_left),
+    'RotateRight': _raw_binop(z3.Z3_mk_ext_rotate_right),
+    '__neg__': _raw_unop(z3.Z3_mk_bvneg),
+    '__invert__': _raw_unop(z3.Z3_mk_bvnot),
+    'Concat': _raw_fold(z3.Z3_mk_concat),
+    'Extract': lambda ctx, args: z3.Z3_mk_extract(ctx, args[0], args[1], args[2]),
+    'ZeroExt': lambda ctx, args: z3.Z3_mk_zero_ext(ctx, args[0], args[1]),
+    'SignExt': lambda ctx, args: z3.Z3_mk_sign_ext(ctx, args[0], args[1]),
+
+    '__eq__': _raw_comparison(z3.Z3_mk_eq),
+    '__ne__': _raw_comparison(lambda ctx, a, b: z3.Z3_mk_distinct(ctx, 2, (z3.Ast * 2)(a, b))),
+    '__ge__': _raw_binop(z3.Z3_mk_bvuge),
+    '__gt__': _raw_binop(z3.Z3_mk_bvugt),
+    '__le__': _raw_binop(z3.Z3_mk_bvule),
+    '__lt__': _raw_binop(z3.Z3_mk_bvult),
+    'UGE': _raw_binop(z3.Z3_mk_bvuge),
+    'UGT': _raw_binop(z3.Z3_mk_bvugt),
+    'ULE': _raw_binop(z3.Z3_mk_bvule),
+    'ULT': _raw_binop(z3.Z3_mk_bvult),
+    'SGE': _raw_binop(z3.Z3_mk_bvsge),
+    'SGT': _raw_binop(z3.Z3_mk_bvsgt),
+    'SLE': _raw_binop(z3.Z3_mk_bvsle),
+    'SLT': _raw_binop(z3.Z3_mk_bvslt),
+    'And': _raw_array(z3.Z3_mk_and),
+    'Or': _raw_array(z3.Z3_mk_or),
+    'Not': _raw_unop(z3.Z3_mk_not),
+    'If': lambda ctx, args: z3.Z3_mk_ite(ctx, args[0], args[1], args[2]),
+}
+
+
+class SmartLRUCache:
+    """
+    An LRU cache that calls `evict(key, value)` for every entry that it drops, including on clear().
+
+    If `max_size` is larger than `maxsize`, the capacity adapts to the workload. The cache remembers the keys that it
+    recently evicted for lack of room, and every `window` lookups, it doubles (up to `max_size`) if a significant
+    share of the lookups missed on such keys, and halves (down to `min_size`) if it would have been of almost no use
+    even with twice the room.
+    """
+
+    def __init__(self, maxsize, evict=None, min_size=None, max_size=None, window=10000):
+        self.maxsize = maxsize
+        self.min_size = maxsize if min_size is None else min_size
+        self.max_size = maxsize if max_size is None else max_size
         self._evict = evict
+        self._d = collections.OrderedDict()
+        # the keys that were recently evicted for lack of room
+        self._ghosts = collections.OrderedDict()
+        self._window = window
+
+        self.hits = 0
+        self.misses = 0
+        self.ghost_hits = 0
+        self.evictions = 0
+        self._window_start = (0, 0, 0)
+
+    def __getitem__(self, key):
+        try:
+            v = self._d[key]
+        except KeyError:
+            self.misses += 1
+            if self._ghosts.pop(key, False):
+                self.ghost_hits += 1
+            if self.hits + self.misses - self._window_start[0] >= self._window:
+                self._adapt()
+            raise
+        self._d.move_to_end(key)
+        self.hits += 1
+        return v
+
+    def __setitem__(self, key, value):
+        d = self._d
+        old = d.pop(key, None)
+        if old is not None and self._evict:
+            self._evict(key, old)
+        d[key] = value
+        while len(d) > self.maxsize:
+            k, _ = self.popitem()
+            if self.max_size > self.maxsize:
+                self._ghosts[k] = True
+                if len(self._ghosts) > self.maxsize:
+                    self._ghosts.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._d
+
+    def __len__(self):
+        return len(self._d)
+
+    def __iter__(self):
+        return iter(self._d)
+
+    def items(self):
+        return self._d.items()
 
     def popitem(self):
-        key, val = LRUCache.popitem(self)
+        key, val = self._d.popitem(last=False)
+        self.evictions += 1
         if self._evict:
             self._evict(key, val)
         return key, val
 
+    def clear(self):
+        while self._d:
+            self.popitem()
+        self._ghosts.clear()
+
+    def trim(self, fraction):
+        k = min(len(self._d), int(math.ceil(len(self._d) * fraction)))
+        for _ in range(k):
+            self.popitem()
+        return k
+
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        while len(self._d) > maxsize:
+            self.popitem()
+        while len(self._ghosts) > maxsize:
+            self._ghosts.popitem(last=False)
+
+    def _adapt(self):
+        lookups, hits, ghost_hits = self.hits + self.misses, self.hits, self.ghost_hits
+        start_lookups, start_hits, start_ghost_hits = self._window_start
+        self._window_start = (lookups, hits, ghost_hits)
+
+        lookups -= start_lookups
+        hits -= start_hits
+        ghost_hits -= start_ghost_hits
+        if ghost_hits >= lookups * 0.1 and self.maxsize < self.max_size:
+            self.resize(min(self.maxsize * 2, self.max_size))
+        elif hits + ghost_hits < lookups * 0.05 and self.maxsize > self.min_size:
+            self.resize(max(self.maxsize // 2, self.min_size))
+
+    def stats(self):
+        return {
+            'entries': len(self._d),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'ghost_hits': self.ghost_hits,
+            'evictions': self.evictions,
+        }
+
+
+class SimplificationCache:
+    """
+    A cache of BackendZ3.simplify() results, keyed by the hash of the AST that was simplified.
+
+    The `maxsize` most recently used results are held strongly. Older ones are only held weakly, and are promoted back
+    if they are used again while still alive. The results are claripy ASTs, which each thread converts into its own Z3
+    context, so a single cache is shared by all the threads of a backend.
+
+    Every entry remembers how long its simplification took, and every hit adds that to `time_saved`.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        # hash -> (result, seconds)
+        self._strong = collections.OrderedDict()
+        self._weak = weakref.WeakValueDictionary()
+        self._times = { }
+
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.
+
+    def lookup(self, expr):
+        """
+        Returns the simplified form of `expr`, or None.
+        """
+        h = expr._hash
+        with self._lock:
+            try:
+                r, t = self._strong[h]
+                self._strong.move_to_end(h)
+            except KeyError:
+                r = self._weak.get(h, None)
+                if r is None:
+                    self.misses += 1
+                    return None
+                t = self._times.get(h, 0.)
+                self._store(h, r, t)
+            self.hits += 1
+            self.time_saved += t
+            return r
+
+    def store(self, expr, result, seconds):
+        with self._lock:
+            self._store(expr._hash, result, seconds)
+
+    def _store(self, h, result, seconds):
+        self._strong[h] = (result, seconds)
+        self._strong.move_to_end(h)
+        self._weak[h] = result
+        self._times[h] = seconds
+        while len(self._strong) > self.maxsize:
+            self._strong.popitem(last=False)
+        if len(self._times) > 2 * len(self._weak) + self.maxsize:
+            # forget the times of the results that were collected
+            self._times = { k: v for k,v in self._times.items() if k in self._weak }
+
+    def clear(self):
+        with self._lock:
+            self._strong.clear()
+            self._weak.clear()
+            self._times.clear()
+
+    def trim(self, fraction):
+        with self._lock:
+            k = min(len(self._strong), int(math.ceil(len(self._strong) * fraction)))
+            for _ in range(k):
+                self._strong.popitem(last=False)
+            return k
+
+    def __len__(self):
+        return len(self._strong)
+
+    def __iter__(self):
+        return iter(list(self._strong))
+
+    def items(self):
+        return list(self._strong.items())
+
+    def stats(self):
+        return {
+            'entries': len(self._strong),
+            'weak_entries': len(self._weak),
+            'hits': self.hits,
+            'misses': self.misses,
+            'time_saved': self.time_saved,
+        }
+
 
 #
 # And the (ugh) magic
 #
 
-from . import Backend
+from . import Backend, LRUObjectCache
 class BackendZ3(Backend):
     _split_on = { 'And', 'Or' }
 
-    def __init__(self, reuse_z3_solver=None, ast_cache_size=10000):
-        Backend.__init__(self, solver_required=True)
-        self._enable_simplification_cache = False
+    def __init__(self, reuse_z3_solver=None, ast_cache_size=10000, object_cache=None, raw_conversion=None,
+                 ast_cache_max_size=None, simplification_cache_size=10000):
+        # converted Z3 objects hold references into the Z3 context, so their number is bounded
+        Backend.__init__(self, solver_required=True, object_cache=LRUObjectCache if object_cache is None else object_cache)
+
+        # simplification results are shared by all threads. A size of 0 disables the cache.
+        self._simplification_cache = SimplificationCache(simplification_cache_size) if simplification_cache_size else None
         self._hash_to_constraint = weakref.WeakValueDictionary()
+        # the Z3 contexts whose checks were interrupted on purpose (see interrupt())
+        self._interrupted = set()
 
         # Per-thread Z3 solver
         # This setting is treated as a global setting and is not supposed to be changed during runtime, unless you know
@@ -117,7 +396,15 @@ class BackendZ3(Backend):
                 else False
         self.reuse_z3_solver = reuse_z3_solver
 
+        # Build Z3 terms with the C API, and only create z3py objects for the converted roots. This is much faster for
+        # large expressions, but only the roots end up in the object cache.
+        if raw_conversion is None:
+            raw_conversion = os.environ.get('Z3_RAW_CONVERSION', "False").lower() in {"1", "true", "yes", "y"}
+        self.raw_conversion = raw_conversion
+
+        # the abstraction cache starts at ast_cache_size entries, and grows up to ast_cache_max_size while it pays off
         self._ast_cache_size = ast_cache_size
+        self._ast_cache_max_size = ast_cache_size * 16 if ast_cache_max_size is None else ast_cache_max_size
 
         # and the operations
         all_ops = backend_fp_operations | backend_operations if supports_fp else backend_operations
@@ -202,12 +489,21 @@ class BackendZ3(Backend):
             self._tls.boolref_tactics = tactics
             return self._tls.boolref_tactics
 
+    @property
+    def _raw_bv_sorts(self):
+        try:
+            return self._tls.raw_bv_sorts
+        except AttributeError:
+            self._tls.raw_bv_sorts = { }
+            return self._tls.raw_bv_sorts
+
     @property
     def _ast_cache(self):
         try:
             return self._tls.ast_cache
         except AttributeError:
-            self._tls.ast_cache = SmartLRUCache(self._ast_cache_size, evict=self._pop_from_ast_cache)
+            self._tls.ast_cache = SmartLRUCache(self._ast_cache_size, evict=self._pop_from_ast_cache,
+                                                max_size=self._ast_cache_max_size)
             return self._tls.ast_cache
 
     @property
@@ -226,30 +522,25 @@ class BackendZ3(Backend):
             self._tls.sym_cache = weakref.WeakValueDictionary()
             return self._tls.sym_cache
 
-    @property
-    def _simplification_cache_key(self):
-        try:
-            return self._tls.simplification_cache_key
-        except AttributeError:
-            self._tls.simplification_cache_key = weakref.WeakValueDictionary()
-            return self._tls.simplification_cache_key
-
-    @property
-    def _simplification_cache_val(self):
-        try:
-            return self._tls.simplification_cache_val
-        except AttributeError:
-            self._tls.simplification_cache_val = weakref.WeakValueDictionary()
-            return self._tls.simplification_cache_val
-
     def downsize(self):
         Backend.downsize(self)
 
         self._ast_cache.clear()
         self._var_cache.clear()
         self._sym_cache.clear()
-        self._simplification_cache_key.clear()
-        self._simplification_cache_val.clear()
+        if self._simplification_cache is not None:
+            self._simplification_cache.clear()
+
+    def _caches(self):
+        caches = Backend._caches(self)
+        caches.update({
+            'ast_cache': (self._ast_cache, True),
+            'var_cache': (self._var_cache, False),
+            'sym_cache': (self._sym_cache, False),
+        })
+        if self._simplification_cache is not None:
+            caches['simplification_cache'] = (self._simplification_cache, True)
+        return caches
 
     @condom
     def _size(self, a):
@@ -266,6 +557,153 @@ class BackendZ3(Backend):
         _, raw_ast = tpl
         z3.Z3_dec_ref(self._context.ctx, raw_ast)
 
+    #
+    # Raw conversion
+    #
+
+    def _convert_all(self, exprs):
+        if self.raw_conversion:
+            return self._convert_all_raw(exprs)
+        return Backend._convert_all(self, exprs)
+
+    def _wrap_raw(self, ast):
+        """
+        Wraps a Z3 Ast pointer into a z3py object of the right class (partially copied from z3._to_expr_ref).
+        """
+        ctx_ref = self._context.ref()
+        k = z3.Z3_get_ast_kind(ctx_ref, ast)
+        sk = z3.Z3_get_sort_kind(ctx_ref, z3.Z3_get_sort(ctx_ref, ast))
+        if sk == z3.Z3_BOOL_SORT:
+            return z3.BoolRef(ast, self._context)
+        if sk == z3.Z3_BV_SORT:
+            if k == z3.Z3_NUMERAL_AST:
+                return z3.BitVecNumRef(ast, self._context)
+            else:
+                return z3.BitVecRef(ast, self._context)
+        if sk == z3.Z3_FLOATING_POINT_SORT:
+            if k == z3.Z3_APP_AST and z3.Z3_is_numeral_ast(ctx_ref, ast):
+                return z3.FPNumRef(ast, self._context)
+            else:
+                return z3.FPRef(ast, self._context)
+        return z3.ExprRef(ast, self._context)
+
+    def _raw_bv_sort(self, size):
+        sorts = self._raw_bv_sorts
+        try:
+            return sorts[size].ast
+        except KeyError:
+            sort = sorts[size] = z3.BitVecSortRef(z3.Z3_mk_bv_sort(self._context.ref(), size), self._context)
+            return sort.ast
+
+    def _raw_leaf(self, ctx_ref, ast):
+        """
+        Creates the Ast pointer for a leaf, or returns None if it should go through the z3py path.
+        """
+        op = ast.op
+        if op == 'BVV':
+            if ast.args[0] is None:
+                raise BackendError("Z3 can't handle empty BVVs")
+            return z3.Z3_mk_numeral(ctx_ref, str(ast.args[0]), self._raw_bv_sort(ast.args[1]))
+        elif op == 'BVS':
+            name = ast._encoded_name
+            self.extra_bvs_data[name] = (ast.args, ast.annotations)
+            return z3.Z3_mk_const(ctx_ref, z3.to_symbol(name, self._context), self._raw_bv_sort(ast.length))
+        elif op == 'BoolV':
+            return z3.Z3_mk_true(ctx_ref) if ast.args[0] else z3.Z3_mk_false(ctx_ref)
+        elif op == 'BoolS':
+            return z3.Z3_mk_const(ctx_ref, z3.to_symbol(ast._encoded_name, self._context), z3.Z3_mk_bool_sort(ctx_ref))
+        return None
+
+    @condom
+    def _convert_all_raw(self, exprs):
+        """
+        Converts the list of expressions `exprs` by building the Z3 terms with the C API. Operations are dispatched
+        through the _raw_ops table; the ones that are not in it (and non-bitvector, non-boolean nodes) fall back to the
+        z3py operations, with their children wrapped. Every intermediate Ast is referenced until the roots are wrapped.
+        """
+        ctx_ref = self._context.ref()
+        cache = self._object_cache if self._cache_objects else None
+        if cache is not None and cache.scoped:
+            cache.enter()
+
+        memo = { }
+        held = [ ]
+        results = [ ]
+        stack = [ ]
+
+        try:
+            for root in exprs:
+                if not isinstance(root, Base):
+                    results.append(self._convert(root))
+                    continue
+
+                stack.append((root, False))
+                while stack:
+                    ast, ready = stack.pop()
+
+                    if not ready:
+                        if id(ast) in memo:
+                            continue
+                        if self in ast._errored:
+                            raise BackendError("%s can't handle operation %s (%s) due to a failed "
+                                               "conversion on a child node" % (self, ast.op, ast.__class__.__name__))
+                        cached_obj = cache.lookup(ast) if cache is not None else None
+                        if cached_obj is not None:
+                            raw = cached_obj.as_ast()
+                        else:
+                            stack.append((ast, True))
+                            if ast.op not in self._op_expr:
+                                for a in ast.args:
+                                    if isinstance(a, Base) and id(a) not in memo:
+                                        stack.append((a, False))
+                            continue
+                    else:
+                        raw = self._raw_leaf(ctx_ref, ast) if ast.op in self._op_expr else None
+                        if raw is None:
+                            f = _raw_ops.get(ast.op, None)
+                            if f is not None and type(ast) in (BV, Bool):
+                                raw = f(ctx_ref, [ memo[id(a)] if isinstance(a, Base) else a for a in ast.args ])
+                            else:
+                                raw = self._raw_fallback(ast, memo).as_ast()
+
+                    z3.Z3_inc_ref(ctx_ref, raw)
+                    held.append(raw)
+                    memo[id(ast)] = raw
+
+                r = self._wrap_raw(memo[id(root)])
+                if cache is not None:
+                    cache.store(root, r)
+                results.append(r)
+
+        except BackendError:
+            for ast, ready in stack:
+                if ready:
+                    ast._errored.add(self)
+            raise
+
+        finally:
+            for raw in held:
+                z3.Z3_dec_ref(ctx_ref, raw)
+            if cache is not None and cache.scoped:
+                cache.exit()
+
+        return results
+
+    def _raw_fallback(self, ast, memo):
+        op = self._op_expr.get(ast.op, None)
+        if op is not None:
+            r = op(ast)
+        else:
+            args = [ self._wrap_raw(memo[id(a)]) if isinstance(a, Base) else self._convert(a) for a in ast.args ]
+            try:
+                r = self._call(ast.op, args)
+            except BackendUnsupportedError:
+                r = self.default_op(ast)
+
+        for a in ast.annotations:
+            r = self.apply_annotation(r, a)
+        return r
+
     #
     # Core creation methods
     #
@@ -401,14 +839,63 @@ class BackendZ3(Backend):
 
         return ast.value
 
-    def _abstract_internal(self, ctx, ast, split_on=None):
-        h = self._z3_ast_hash(ast)
-        try:
-            cached_ast, _ = self._ast_cache[h]
-            return cached_ast
-        except KeyError:
-            pass
+    def _abstract_internal(self, ctx, ast, split_on=None): #pylint:disable=unused-argument
+        """
+        Abstracts a Z3 Ast pointer into a claripy AST. The DAG is walked with an explicit stack, so that deep terms do
+        not hit the recursion limit, and with a memo, so that every shared subterm is abstracted once. Terms that have
+        arguments are also kept in the (per-thread) abstraction cache across calls.
+        """
+        cache = self._ast_cache
+        memo = { }
+        # the terms in memo that have arguments, and thus belong in the cache
+        inner = set()
+        # (node, None) for a node to visit, (node, its children) for a node whose children have been pushed
+        stack = [ (ast, None) ]
+
+        while stack:
+            node, children = stack[-1]
+            h = self._z3_ast_hash(node)
+
+            if children is None:
+                if h in memo:
+                    stack.pop()
+                    if h in inner:
+                        # every use refreshes the term, so that shared terms stay in the cache
+                        try:
+                            cache[h]
+                        except KeyError:
+                            cache[h] = (memo[h], node)
+                            z3.Z3_inc_ref(ctx, node)
+                    continue
+
+                num_args = z3.Z3_get_app_num_args(ctx, node)
+                if num_args:
+                    inner.add(h)
+                    try:
+                        memo[h] = cache[h][0]
+                        stack.pop()
+                        continue
+                    except KeyError:
+                        pass
+
+                children = [ z3.Z3_get_app_arg(ctx, node, i) for i in range(num_args) ]
+                stack[-1] = (node, children)
+                # reversed, so that the arguments are visited in order
+                stack.extend((c, None) for c in reversed(children))
+
+            else:
+                stack.pop()
+                memo[h] = self._abstract_node(ctx, node, [ memo[self._z3_ast_hash(c)] for c in children ])
+                if children:
+                    cache[h] = (memo[h], node)
+                    z3.Z3_inc_ref(ctx, node)
 
+        return memo[self._z3_ast_hash(ast)]
+
+    def _abstract_node(self, ctx, ast, children):
+        """
+        Abstracts a single Z3 term, given the abstractions of its arguments.
+        """
         decl = z3.Z3_get_app_decl(ctx, ast)
         decl_num = z3.Z3_get_decl_kind(ctx, decl)
         z3_sort = z3.Z3_get_sort(ctx, ast)
@@ -419,11 +906,7 @@ class BackendZ3(Backend):
             raise ClaripyError("unknown decl op %s" % z3_op_nums[decl_num])
         op_name = op_map[z3_op_nums[decl_num]]
 
-        num_args = z3.Z3_get_app_num_args(ctx, ast)
-        split_on = self._split_on if split_on is None else split_on
-        new_split_on = split_on if op_name in split_on else set()
-        children = [ self._abstract_internal(ctx, z3.Z3_get_app_arg(ctx, ast, i), new_split_on) for i in range(num_args) ]
-
+        num_args = len(children)
         append_children = True
 
         if op_name == 'True':
@@ -547,8 +1030,6 @@ class BackendZ3(Backend):
         else:
             a = result_ty(op_name, tuple(args))
 
-        self._ast_cache[h] = (a, ast)
-        z3.Z3_inc_ref(ctx, ast)
         return a
 
     def _abstract_to_primitive(self, ctx, ast):
@@ -638,6 +1119,26 @@ class BackendZ3(Backend):
             constraints.append(self._hash_to_constraint.get(str(core)))
         return constraints
 
+    @profiled
+    def _solver_check(self, solver):
+        r = solver.check()
+        if r == z3.unknown and self._interrupted and self._context in self._interrupted:
+            # the answer is not unsat, and must not be cached as such
+            raise ClaripySolverInterruptError("the check was interrupted")
+        return r
+
+    def interrupt(self, context):
+        """
+        Interrupts the check that is running in `context`, the Z3 context of another thread. Z3 answers unknown, as it
+        does on a timeout, so the interrupted check raises a ClaripySolverInterruptError instead of returning unsat,
+        until clear_interrupt() is called for the context.
+        """
+        self._interrupted.add(context)
+        context.interrupt()
+
+    def clear_interrupt(self, context):
+        self._interrupted.discard(context)
+
     @condom
     def _primitive_from_model(self, model, expr):
         v = model.eval(expr, model_completion=True)
@@ -672,7 +1173,7 @@ class BackendZ3(Backend):
 
             l.debug("Doing a check!")
             #print "CHECKING"
-            if solver.check() != z3.sat:
+            if self._solver_check(solver) != z3.sat:
                 return False
 
             if model_callback is not None:
@@ -705,7 +1206,7 @@ class BackendZ3(Backend):
         for i in range(n):
             solve_count += 1
             l.debug("Doing a check!")
-            if solver.check() != z3.sat:
+            if self._solver_check(solver) != z3.sat:
                 break
             model = solver.model()
 
@@ -764,7 +1265,7 @@ class BackendZ3(Backend):
 
             solve_count += 1
             l.debug("Doing a check!")
-            if solver.check() == z3.sat:
+            if self._solver_check(solver) == z3.sat:
                 l.debug("... still sat")
                 if model_callback is not None:
                     model_callback(self._generic_model(solver.model()))
@@ -787,7 +1288,7 @@ class BackendZ3(Backend):
             solver.push()
             solver.add(expr == lo)
             l.debug("Doing a check!")
-            if solver.check() == z3.sat:
+            if self._solver_check(solver) == z3.sat:
                 if model_callback is not None:
                     model_callback(self._generic_model(solver.model()))
                 vals.add(lo)
@@ -829,7 +1330,7 @@ class BackendZ3(Backend):
 
             solve_count += 1
             l.debug("Doing a check!")
-            if solver.check() == z3.sat:
+            if self._solver_check(solver) == z3.sat:
                 l.debug("... still sat")
                 lo = middle
                 vals.add(self._primitive_from_model(solver.model(), expr))
@@ -851,7 +1352,7 @@ class BackendZ3(Backend):
             solver.push()
             solver.add(expr == hi)
             l.debug("Doing a check!")
-            if solver.check() == z3.sat:
+            if self._solver_check(solver) == z3.sat:
                 if model_callback is not None:
                     model_callback(self._generic_model(solver.model()))
                 vals.add(hi)
@@ -868,28 +1369,20 @@ class BackendZ3(Backend):
     def _simplify(self, e): #pylint:disable=W0613,R0201
         raise Exception("This shouldn't be called. Bug Yan.")
 
+    @profiled
     @condom
     def simplify(self, expr):  #pylint:disable=arguments-differ
         if expr._simplified:
             return expr
 
-        if self._enable_simplification_cache:
-            try:
-                k = self._simplification_cache_key[expr._cache_key]
-                #print "HIT WEAK KEY CACHE"
-                return k
-            except KeyError:
-                pass
-            try:
-                k = self._simplification_cache_val[expr._cache_key]
-                #print "HIT WEAK VALUE CACHE"
-                return k
-            except KeyError:
-                pass
-
-            #print "MISS CACHE"
+        cache = self._simplification_cache
+        if cache is not None:
+            o = cache.lookup(expr)
+            if o is not None:
+                return o
 
         l.debug("SIMPLIFYING EXPRESSION")
+        start = time.perf_counter()
 
         #print "SIMPLIFYING"
 
@@ -914,9 +1407,8 @@ class BackendZ3(Backend):
         o = self._abstract(s)
         o._simplified = Base.FULL_SIMPLIFY
 
-        if self._enable_simplification_cache:
-            self._simplification_cache_val[expr._cache_key] = o
-            self._simplification_cache_key[expr._cache_key] = o
+        if cache is not None:
+            cache.store(expr, o, time.perf_counter() - start)
         return o
 
     def _is_false(self, e, extra_constraints=(), solver=None, model_callback=None):
@@ -982,24 +1474,7 @@ class BackendZ3(Backend):
         return z3.BoolRef(z3.Z3_mk_not(self._context.ref(), a.as_ast()), self._context)
 
     def _op_raw_If(self, i, t, e):
-        # partially copied from z3._to_expr_ref
-        ctx_ref = self._context.ref()
-        ast = z3.Z3_mk_ite(ctx_ref, i.as_ast(), t.as_ast(), e.as_ast())
-        k = z3.Z3_get_ast_kind(ctx_ref, ast)
-        sk = z3.Z3_get_sort_kind(ctx_ref, z3.Z3_get_sort(ctx_ref, ast))
-        if sk == z3.Z3_BOOL_SORT:
-            return z3.BoolRef(ast, self._context)
-        if sk == z3.Z3_BV_SORT:
-            if k == z3.Z3_NUMERAL_AST:
-                return z3.BitVecNumRef(ast, self._context)
-            else:
-                return z3.BitVecRef(ast, self._context)
-        if sk == z3.Z3_FLOATING_POINT_SORT:
-            if k == z3.Z3_APP_AST and z3.Z3_is_numeral_ast(ctx_ref, ast):
-                return z3.FPNumRef(ast, self._context)
-            else:
-                return z3.FPRef(ast, self._context)
-        return z3.ExprRef(ast, self._context)
+        return self._wrap_raw(z3.Z3_mk_ite(self._context.ref(), i.as_ast(), t.as_ast(), e.as_ast()))
 
     @condom
     def _op_raw_fpAbs(self, a):
@@ -1355,7 +1830,7 @@ from ..ast.fp import FP, FPV
 from ..ast.strings import StringV, StringS
 from ..operations import backend_operations, backend_fp_operations
 from ..fp import FSort, RM, RM_NearestTiesEven, RM_NearestTiesAwayFromZero, RM_TowardsPositiveInf, RM_TowardsNegativeInf, RM_TowardsZero
-from ..errors import ClaripyError, BackendError, ClaripyOperationError
+from ..errors import ClaripyError, BackendError, ClaripyOperationError, BackendUnsupportedError, ClaripySolverInterruptError
 from .. import _all_operations
 
 op_type_map = {
@@ -0,0 +1,184 @@
+import collections
+import itertools
+import math
+import weakref
+
+
+class ObjectCache:
+    """
+    The cache that Backend.convert() keeps converted ASTs in. Each backend picks a policy by passing a factory of these
+    as `object_cache` to Backend.__init__(), and a new cache is created for every thread.
+
+    Caches count their own hits and misses. A cache is `scoped` if it only keeps its entries for the duration of a
+    scope (see Backend.object_cache_scope()).
+    """
+
+    __slots__ = ('hits', 'misses')
+
+    scoped = False
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, ast):
+        """
+        Returns the object that `ast` was converted to, or None.
+        """
+        raise NotImplementedError()
+
+    def store(self, ast, obj):
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+    def trim(self, fraction):
+        """
+        Drops `fraction` of the entries, oldest (or least recently used) first.
+
+        :return:    The number of entries dropped.
+        """
+        raise NotImplementedError()
+
+    def __len__(self):
+        raise NotImplementedError()
+
+    def __iter__(self):
+        raise NotImplementedError()
+
+    def items(self):
+        raise NotImplementedError()
+
+    def stats(self):
+        return { 'entries': len(self), 'hits': self.hits, 'misses': self.misses }
+
+
+class _DictObjectCache(ObjectCache):
+    """
+    An ObjectCache backed by a mapping in `_d`, keyed by the AST hash. Since ASTs are hash-consed, an AST that is
+    collected and then rebuilt maps to the same entry.
+    """
+
+    __slots__ = ('_d',)
+
+    def __init__(self):
+        super(_DictObjectCache, self).__init__()
+        self._d = { }
+
+    def lookup(self, ast):
+        r = self._d.get(ast._hash, None)
+        if r is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return r
+
+    def store(self, ast, obj):
+        self._d[ast._hash] = obj
+
+    def clear(self):
+        self._d.clear()
+
+    def trim(self, fraction):
+        k = int(math.ceil(len(self._d) * fraction))
+        for key in list(itertools.islice(iter(self._d), k)):
+            self._d.pop(key, None)
+        return k
+
+    def __len__(self):
+        return len(self._d)
+
+    def __iter__(self):
+        return iter(self._d)
+
+    def items(self):
+        return self._d.items()
+
+
+class WeakObjectCache(_DictObjectCache):
+    """
+    Keeps converted objects for as long as the ASTs they were converted from are alive. This is the default policy.
+    """
+
+    __slots__ = ()
+
+    def __init__(self):
+        super(WeakObjectCache, self).__init__()
+        self._d = weakref.WeakKeyDictionary()
+
+    def lookup(self, ast):
+        r = self._d.get(ast._cache_key, None)
+        if r is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return r
+
+    def store(self, ast, obj):
+        self._d[ast._cache_key] = obj
+
+
+class LRUObjectCache(_DictObjectCache):
+    """
+    Keeps the `maxsize` most recently used converted objects, whether or not their ASTs are still alive. There are no
+    weakref callbacks to run when ASTs are collected.
+    """
+
+    __slots__ = ('maxsize',)
+
+    def __init__(self, maxsize=100000):
+        super(LRUObjectCache, self).__init__()
+        self._d = collections.OrderedDict()
+        self.maxsize = maxsize
+
+    def lookup(self, ast):
+        h = ast._hash
+        r = self._d.get(h, None)
+        if r is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._d.move_to_end(h)
+        return r
+
+    def store(self, ast, obj):
+        d = self._d
+        d[ast._hash] = obj
+        if len(d) > self.maxsize:
+            d.popitem(last=False)
+
+    def stats(self):
+        s = super(LRUObjectCache, self).stats()
+        s['maxsize'] = self.maxsize
+        return s
+
+
+class ArenaObjectCache(_DictObjectCache):
+    """
+    Keeps converted objects only until the outermost scope ends, and then drops all of them at once. Every call to
+    Backend.convert() is a scope, so a conversion still shares the conversion of common subexpressions. Callers can
+    widen the scope with Backend.object_cache_scope(), for example to share conversions across all the constraints of
+    a query.
+    """
+
+    __slots__ = ('_depth',)
+
+    scoped = True
+
+    def __init__(self):
+        super(ArenaObjectCache, self).__init__()
+        self._depth = 0
+
+    def store(self, ast, obj):
+        # outside of any scope, nothing would ever drop the entry
+        if self._depth:
+            self._d[ast._hash] = obj
+
+    def enter(self):
+        self._depth += 1
+
+    def exit(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._d.clear()
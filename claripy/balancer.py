@@ -1,18 +1,180 @@
 import logging
 import operator
 
+from .utils import LRUMemo
+
 l = logging.getLogger('claripy.balancer')
 
+
+# the results of balancing constraints, keyed by the hash of the constraint. It is shared by all frontends, so that a
+# constraint that was balanced in one state is not balanced again in its siblings. The helper backend is not part of the
+# key: it is always a BackendVSA, and they all give the same results.
+_balancer_cache = LRUMemo(0x2000)
+
+def balance(helper, c, validation_frontend=None, bounds=None):
+    """
+    Balances a constraint, like `Balancer(helper, c).compat_ret`, going through _balancer_cache. Nothing is cached
+    when a validation frontend is given, since validating is the point of balancing again.
+
+    :param bounds:  A BoundsStore with the bounds established by earlier constraints, to balance against. The results
+                    are cached along with the bounds that they depend on.
+    :return: A tuple of whether the constraint is satisfiable, and a list of (AST, replacement) tuples.
+    """
+    if validation_frontend is not None or not _balancer_cache.maxsize:
+        return Balancer(helper, c, validation_frontend=validation_frontend, bounds=bounds).compat_ret
+
+    key = c._hash
+    if bounds:
+        fingerprint = bounds.fingerprint(c.variables)
+        if fingerprint:
+            key = (c._hash, fingerprint)
+        else:
+            bounds = None
+
+    r = _balancer_cache.get(key)
+    if r is None:
+        sat, replacements = Balancer(helper, c, bounds=bounds).compat_ret
+        r = (sat, tuple(replacements))
+        _balancer_cache.put(key, r)
+    return r[0], list(r[1])
+
+
+class BoundsStore:
+    """
+    The bounds that balancing the constraints of a frontend has established so far. Each bounded AST maps to itself,
+    intersected with its bounds, so that a new constraint can be balanced against what the earlier ones established
+    instead of from scratch. Copies share their dicts until one of them is tightened, so branching a frontend does
+    not copy its bounds.
+    """
+
+    __slots__ = ('_bounded', '_by_var', '_shared')
+
+    def __init__(self):
+        # cache key -> the AST, intersected with its bounds
+        self._bounded = { }
+        # variable -> frozenset of the cache keys of the bounded ASTs that contain it
+        self._by_var = { }
+        self._shared = False
+
+    def copy(self):
+        c = BoundsStore.__new__(BoundsStore)
+        c._bounded = self._bounded
+        c._by_var = self._by_var
+        c._shared = self._shared = True
+        return c
+
+    def __len__(self):
+        return len(self._bounded)
+
+    def __getstate__(self):
+        return self._bounded, self._by_var
+
+    def __setstate__(self, s):
+        self._bounded, self._by_var = s
+        self._shared = False
+
+    def get(self, a):
+        """
+        Returns `a` intersected with its bounds, or None if it has none.
+        """
+        return self._bounded.get(a.cache_key, None)
+
+    def replacements(self):
+        """
+        Returns a new dict of cache key to bounded AST, to be used with `replace_dict()`.
+        """
+        return dict(self._bounded)
+
+    def relevant(self, a):
+        """
+        Checks whether any of the bounds concern the variables of `a`.
+        """
+        return not a.variables.isdisjoint(self._by_var)
+
+    def fingerprint(self, variables):
+        """
+        Returns a hashable summary of the bounds of the ASTs that contain any of `variables`, which is empty if there
+        are none.
+        """
+        keys = set()
+        for v in variables:
+            ks = self._by_var.get(v, None)
+            if ks:
+                keys |= ks
+        return frozenset(self._bounded[k]._hash for k in keys)
+
+    def _unshare(self):
+        if self._shared:
+            self._bounded = dict(self._bounded)
+            self._by_var = dict(self._by_var)
+            self._shared = False
+
+    def discard(self, keys):
+        """
+        Drops the bounds of the ASTs with the given cache keys.
+        """
+        keys = [ k for k in keys if k in self._bounded ]
+        if not keys:
+            return
+
+        self._unshare()
+        for k in keys:
+            del self._bounded[k]
+            for v in k.ast.variables:
+                ks = self._by_var[v] - { k }
+                if ks:
+                    self._by_var[v] = ks
+                else:
+                    del self._by_var[v]
+
+    def tighten(self, a, bounded):
+        """
+        Intersects the bounds of `a` with `bounded` (`a`, intersected with new bounds). When the result is a single
+        strided interval, it is stored as a single intersection, so that the bounded AST does not grow with the number
+        of constraints on `a`.
+
+        :return: `a`, intersected with all of its bounds.
+        """
+        k = a.cache_key
+        old = self._bounded.get(k, None)
+
+        si = backends.vsa.convert(bounded)
+        if old is not None:
+            old_si = backends.vsa.convert(old)
+            si = old_si.intersection(si)
+            if si.identical(old_si):
+                return old
+
+        if a.op != 'Reverse' and isinstance(si, vsa.StridedInterval) and \
+                not si._reversed and not si.uninitialized and not si.is_empty:
+            merged = a.intersection(BVS('bound', len(a), min=si.lower_bound, max=si.upper_bound, stride=si.stride))
+        else:
+            merged = bounded if old is None else old.intersection(bounded)
+
+        self._unshare()
+        self._bounded[k] = merged
+        if old is None:
+            for v in a.variables:
+                self._by_var[v] = self._by_var.get(v, frozenset()) | { k }
+        return merged
+
+
+
 class Balancer:
     """
     The Balancer is an equation redistributor. The idea is to take an AST and rebalance it to, for example, isolate
     unknown terms on one side of an inequality.
     """
 
-    def __init__(self, helper, c, validation_frontend=None):
+    def __init__(self, helper, c, validation_frontend=None, bounds=None):
         self._helper = helper
         self._validation_frontend = validation_frontend
+        # the bounds established by earlier constraints, which the constraint is balanced against
+        self._bounds = bounds
+        self._bounds_map = None
         self._truisms = [ ]
+        # the cache keys of the truisms that were queued, processed, and generated as assumptions
+        self._queued_truisms = set()
         self._processed_truisms = set()
         self._identified_assumptions = set()
         self._lower_bounds = { }
@@ -85,8 +247,24 @@ class Balancer:
     # AST helper functions
     #
 
+    def _bounded(self, a):
+        """
+        Returns `a`, with the ASTs that earlier constraints bounded intersected with their bounds.
+        """
+        if not self._bounds or not isinstance(a, Base) or not self._bounds.relevant(a):
+            return a
+        if self._bounds_map is None:
+            self._bounds_map = self._bounds.replacements()
+        return a.replace_dict(self._bounds_map)
+
+    def _is_true(self, a):
+        return backends.vsa.is_true(self._bounded(a))
+
+    def _is_false(self, a):
+        return backends.vsa.is_false(self._bounded(a))
+
     def _same_bound_bv(self, a):
-        si = backends.vsa.convert(a)
+        si = backends.vsa.convert(self._bounded(a))
         mx = self._max(a)
         mn = self._min(a)
         return BVS('bounds', len(a), min=mn, max=mx, stride=si._stride)
@@ -95,16 +273,14 @@ class Balancer:
     def _cardinality(a):
         return a.cardinality if isinstance(a, Base) else 0
 
-    @staticmethod
-    def _min(a, signed=False):
-        if not signed: bounds = backends.vsa.convert(a)._unsigned_bounds()
-        else: bounds = backends.vsa.convert(a)._signed_bounds()
+    def _min(self, a, signed=False):
+        si = backends.vsa.convert(self._bounded(a))
+        bounds = si._unsigned_bounds() if not signed else si._signed_bounds()
         return min(mn for mn,mx in bounds)
 
-    @staticmethod
-    def _max(a, signed=False):
-        if not signed: bounds = backends.vsa.convert(a)._unsigned_bounds()
-        else: bounds = backends.vsa.convert(a)._signed_bounds()
+    def _max(self, a, signed=False):
+        si = backends.vsa.convert(self._bounded(a))
+        bounds = si._unsigned_bounds() if not signed else si._signed_bounds()
         return max(mx for mn,mx in bounds)
 
     def _range(self, a, signed=False):
@@ -196,11 +372,11 @@ class Balancer:
         while len(self._truisms):
             truism = self._truisms.pop()
 
-            if truism in self._processed_truisms:
+            if truism.cache_key in self._processed_truisms:
                 continue
 
             unpacked_truisms = self._unpack_truisms(truism)
-            self._processed_truisms.add(truism)
+            self._processed_truisms.add(truism.cache_key)
             if len(unpacked_truisms):
                 self._queue_truisms(unpacked_truisms, check_true=True)
                 continue
@@ -211,10 +387,10 @@ class Balancer:
             truism = self._adjust_truism(truism)
 
             assumptions = self._get_assumptions(truism)
-            if truism not in self._identified_assumptions and len(assumptions):
+            if truism.cache_key not in self._identified_assumptions and len(assumptions):
                 l.debug("Queued assumptions %s for truism %s.", assumptions, truism)
-                self._truisms.extend(assumptions)
-                self._identified_assumptions.update(assumptions)
+                self._queue_truisms(assumptions)
+                self._identified_assumptions.update(a.cache_key for a in assumptions)
 
             l.debug("Processing truism %s", truism)
             balanced_truism = self._balance(truism)
@@ -222,16 +398,17 @@ class Balancer:
             self._handle(balanced_truism)
 
     def _queue_truism(self, t, check_true=False):
-        if not check_true:
-            self._truisms.append(t)
-        elif check_true and not is_true(t):
-            self._truisms.append(t)
+        # a truism that is already queued (or was processed) is not queued again
+        if t.cache_key in self._queued_truisms:
+            return
+        if check_true and self._is_true(t):
+            return
+        self._queued_truisms.add(t.cache_key)
+        self._truisms.append(t)
 
     def _queue_truisms(self, ts, check_true=False):
-        if check_true:
-            self._truisms.extend(t for t in ts if not is_true(t))
-        else:
-            self._truisms.extend(ts)
+        for t in ts:
+            self._queue_truism(t, check_true=check_true)
 
     @staticmethod
     def _handleable_truism(t):
@@ -308,11 +485,11 @@ class Balancer:
             return set()
 
     def _unpack_truisms_Or(self, c):
-        vals = [ is_false(v) for v in c.args ]
+        vals = [ self._is_false(v) for v in c.args ]
         if all(vals):
             raise ClaripyBalancerUnsatError()
         elif vals.count(False) == 1:
-            return { self._unpack_truisms(vals[vals.index(False)]) }
+            return { c.args[vals.index(False)] }
         else:
             return set()
 
@@ -394,12 +571,11 @@ class Balancer:
         new_rhs = truism.args[0].make_like('__add__', (old_rhs,) + other_adds)
         return truism.make_like(truism.op, (new_lhs, new_rhs))
 
-    @staticmethod
-    def _balance_ZeroExt(truism):
+    def _balance_ZeroExt(self, truism):
         num_zeroes, inner = truism.args[0].args
         other_side = truism.args[1][len(truism.args[1])-1:len(truism.args[1])-num_zeroes]
 
-        if is_true(other_side == 0):
+        if self._is_true(other_side == 0):
             # We can safely eliminate this layer of ZeroExt
             new_args = (inner, truism.args[1][len(truism.args[1])-num_zeroes-1:0])
             return truism.make_like(truism.op, new_args)
@@ -420,48 +596,50 @@ class Balancer:
 
         return truism
 
-    @staticmethod
-    def _balance_Extract(truism):
-        size = len(truism.args[0])
+    def _balance_Extract(self, truism):
         high, low, inner = truism.args[0].args
+        size = len(inner)
+
+        # padding with zeroes only preserves equality and unsigned order
+        if truism.op not in ('__eq__', '__ne__') and not self.comparison_info.get(truism.op, (None, None, False))[2]:
+            return truism
 
         if high < size-1:
             left_msb = inner[size-1:high+1]
-            left_msb_zero = is_true(left_msb == 0)
+            left_msb_zero = self._is_true(left_msb == 0)
         else:
             left_msb = None
             left_msb_zero = None
 
         if low > 0:
-            left_lsb = inner[high-1:0]
-            left_lsb_zero = is_true(left_lsb == 0)
+            left_lsb = inner[low-1:0]
+            left_lsb_zero = self._is_true(left_lsb == 0)
         else:
             left_lsb = None
             left_lsb_zero = None
 
         if left_msb_zero and left_lsb_zero:
             new_left = inner
-            new_right = _all_operations.Concat(BVV(0, len(left_msb)), truism.arg[1], BVV(0, len(left_lsb)))
+            new_right = _all_operations.Concat(BVV(0, len(left_msb)), truism.args[1], BVV(0, len(left_lsb)))
             return truism.make_like(truism.op, (new_left, new_right))
         elif left_msb_zero:
-            new_left = inner[high:0]
-            new_right = _all_operations.Concat(BVV(0, len(left_msb)), truism.arg[1])
+            new_left = inner[size-1:low]
+            new_right = _all_operations.Concat(BVV(0, len(left_msb)), truism.args[1])
             return truism.make_like(truism.op, (new_left, new_right))
         elif left_lsb_zero:
-            new_left = inner[size-1:low]
-            new_right = _all_operations.Concat(truism.arg[1], BVV(0, len(left_lsb)))
+            new_left = inner[high:0]
+            new_right = _all_operations.Concat(truism.args[1], BVV(0, len(left_lsb)))
             return truism.make_like(truism.op, (new_left, new_right))
         else:
             #TODO: handle non-zero single-valued cases
             return truism
 
-    @staticmethod
-    def _balance_Concat(truism):
+    def _balance_Concat(self, truism):
         size = len(truism.args[0])
         left_msb = truism.args[0].args[0]
         right_msb = truism.args[1][size-1:size-len(left_msb)]
 
-        if is_true(left_msb == 0) and is_true(right_msb == 0):
+        if self._is_true(left_msb == 0) and self._is_true(right_msb == 0):
             # we can cut these guys off!
             remaining_left = _all_operations.Concat(*truism.args[0].args[1:])
             remaining_right = truism.args[1][size-len(left_msb)-1:0]
@@ -476,13 +654,13 @@ class Balancer:
         shift_amount_expr = lhs.args[1]
         expr = lhs.args[0]
 
-        shift_amount_values = self._helper.eval(shift_amount_expr, 2)
+        shift_amount_values = self._helper.eval(self._bounded(shift_amount_expr), 2)
         if len(shift_amount_values) != 1:
             return truism
         shift_amount = shift_amount_values[0]
 
         rhs_lower = _all_operations.Extract(shift_amount - 1, 0, rhs)
-        rhs_lower_values = self._helper.eval(rhs_lower, 2)
+        rhs_lower_values = self._helper.eval(self._bounded(rhs_lower), 2)
         if len(rhs_lower_values) == 1 and rhs_lower_values[0] == 0:
             # we can remove the __lshift__
 
@@ -504,6 +682,8 @@ class Balancer:
             # the condition was probably a Not (TODO)
             return truism
 
+        true_condition = self._bounded(true_condition)
+        false_condition = self._bounded(false_condition)
         can_true = backends.vsa.has_true(true_condition)
         can_false = backends.vsa.has_true(false_condition)
         must_true = backends.vsa.is_true(true_condition)
@@ -609,9 +789,9 @@ class Balancer:
                 self._add_upper_bound(lhs, max_int-1)
 
     def _handle_If(self, truism):
-        if is_false(truism.args[2]):
+        if self._is_false(truism.args[2]):
             self._queue_truism(truism.args[0])
-        elif is_false(truism.args[1]):
+        elif self._is_false(truism.args[1]):
             self._queue_truism(self._invert_comparison(truism.args[0]))
 
     _handle___lt__ = _handle_comparison
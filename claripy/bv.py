@@ -41,31 +41,75 @@ def normalize_types(f):
 
     return normalize_helper
 
+def bvv_operand(f):
+    """
+    Converts the other operand of a binary operation to a BVV of the same (non-zero) size with BVV._operand(), unless
+    it is one already.
+    """
+    @functools.wraps(f)
+    def operand_guard(self, o):
+        if type(o) is not BVV or o.bits != self.bits or not self.bits:
+            o = self._operand(o)
+            if o is NotImplemented:
+                return o
+        return f(self, o)
+
+    return operand_guard
+
+def bvv_operand_0_length(f):
+    @functools.wraps(f)
+    def operand_guard(self, o):
+        if type(o) is not BVV or o.bits != self.bits:
+            o = self._operand(o, zero_length=True)
+            if o is NotImplemented:
+                return o
+        return f(self, o)
+
+    return operand_guard
+
+_masks = tuple((1 << n) - 1 for n in range(257))
+
+def _mask(bits):
+    return _masks[bits] if bits <= 256 else (1 << bits) - 1
+
+_new = object.__new__
+
+def _bvv(value, bits):
+    """
+    Creates a BVV without checking the arguments, for results of operations on other BVVs.
+    """
+    r = _new(BVV)
+    r.bits = bits
+    r._value = value & (_masks[bits] if bits <= 256 else (1 << bits) - 1)
+    return r
+
 class BVV(BackendObject):
-    __slots__ = [ 'bits', '_value', 'mod' ]
+    __slots__ = ( 'bits', '_value' )
 
     def __init__(self, value, bits):
-        if bits < 0 or not isinstance(bits, numbers.Number) or not isinstance(value, numbers.Number):
-            raise ClaripyOperationError("BVV needs a non-negative length and an int value")
+        if type(value) is not int or type(bits) is not int or bits <= 0:
+            if bits < 0 or not isinstance(bits, numbers.Number) or not isinstance(value, numbers.Number):
+                raise ClaripyOperationError("BVV needs a non-negative length and an int value")
 
-        if bits == 0 and value not in (0, "", None):
-            raise ClaripyOperationError("Zero-length BVVs cannot have a meaningful value.")
+            if bits == 0 and value not in (0, "", None):
+                raise ClaripyOperationError("Zero-length BVVs cannot have a meaningful value.")
 
         self.bits = bits
-        self._value = 0
-        self.mod = 2**bits
-        self.value = value
+        self._value = value & _mask(bits)
 
     def __hash__(self):
-        return hash((str(self.value), self.bits))
+        return hash((self._value, self.bits))
 
     def __getstate__(self):
-        return (self.bits, self.value)
+        return (self.bits, self._value)
 
     def __setstate__(self, s):
         self.bits = s[0]
-        self.mod = 2**self.bits
-        self.value = s[1]
+        self._value = s[1] & _mask(s[0])
+
+    @property
+    def mod(self):
+        return 1 << self.bits
 
     @property
     def value(self):
@@ -73,48 +117,67 @@ class BVV(BackendObject):
 
     @value.setter
     def value(self, v):
-        self._value = v & (self.mod - 1)
+        self._value = v & _mask(self.bits)
 
     @property
     def signed(self):
-        return self._value if self._value < self.mod//2 else self._value % (self.mod//2) - (self.mod//2)
+        v = self._value
+        if self.bits and v >> (self.bits - 1):
+            return v - (1 << self.bits)
+        return v
 
     @signed.setter
     def signed(self, v):
-        self._value = v % -self.mod
+        self._value = v & _mask(self.bits)
+
+    def _operand(self, o, zero_length=False):
+        """
+        Converts the other operand of a binary operation to a BVV of the same size. The operations call this (through
+        @bvv_operand) only if `o` is not already one, so that operations between BVVs skip it.
+
+        :param zero_length: Whether zero-length bitvectors are allowed.
+        :return:            The BVV, or NotImplemented if `o` can't be converted.
+        """
+        if hasattr(o, '__module__') and o.__module__ == 'z3':
+            raise ValueError("this should no longer happen")
+        if isinstance(o, numbers.Number):
+            o = BVV(o, self.bits)
+        if not isinstance(o, BVV):
+            return NotImplemented
+
+        if not zero_length and (self.bits == 0 or o.bits == 0):
+            raise ClaripyTypeError("The operation is not allowed on zero-length bitvectors.")
+        if self.bits != o.bits:
+            raise ClaripyTypeError("bitvectors are differently-sized (%d and %d)" % (self.bits, o.bits))
+        return o
 
     #
     # Arithmetic stuff
     #
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __add__(self, o):
-        return BVV(self.value + o.value, self.bits)
+        return _bvv(self._value + o._value, self.bits)
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __sub__(self, o):
-        return BVV(self.value - o.value, self.bits)
+        return _bvv(self._value - o._value, self.bits)
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __mul__(self, o):
-        return BVV(self.value * o.value, self.bits)
+        return _bvv(self._value * o._value, self.bits)
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __mod__(self, o):
-        if o.value == 0:
+        if o._value == 0:
             raise ClaripyZeroDivisionError()
-        return BVV(self.value % o.value, self.bits)
+        return _bvv(self._value % o._value, self.bits)
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __floordiv__(self, o):
-        if o.value == 0:
+        if o._value == 0:
             raise ClaripyZeroDivisionError()
-        return BVV(self.value // o.value, self.bits)
+        return _bvv(self._value // o._value, self.bits)
 
     def __truediv__(self, other):
         return self // other # decline to implicitly have anything to do with floats
@@ -165,43 +228,40 @@ class BVV(BackendObject):
     # Bit operations
     #
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __and__(self, o):
-        return BVV(self.value & o.value, self.bits)
+        return _bvv(self._value & o._value, self.bits)
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __or__(self, o):
-        return BVV(self.value | o.value, self.bits)
+        return _bvv(self._value | o._value, self.bits)
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __xor__(self, o):
-        return BVV(self.value ^ o.value, self.bits)
+        return _bvv(self._value ^ o._value, self.bits)
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __lshift__(self, o):
-        if o.signed < self.bits:
-            return BVV(self.value << o.signed, self.bits)
+        shift = o.signed
+        if shift < self.bits:
+            return _bvv(self._value << shift, self.bits)
         else:
-            return BVV(0, self.bits)
+            return _bvv(0, self.bits)
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __rshift__(self, o):
         # arithmetic shift uses the signed version
-        if o.signed < self.bits:
-            return BVV(self.signed >> o.signed, self.bits)
+        shift = o.signed
+        if shift < self.bits:
+            return _bvv(self.signed >> shift, self.bits)
         else:
-            return BVV(0, self.bits)
+            return _bvv(0, self.bits)
 
     def __invert__(self):
-        return BVV(self.value ^ self.mod-1, self.bits)
+        return _bvv(~self._value, self.bits)
 
     def __neg__(self):
-        return BVV((-self.value) % self.mod, self.bits)
+        return _bvv(-self._value, self.bits)
 
     #
     # Reverse bit operations
@@ -236,35 +296,29 @@ class BVV(BackendObject):
     # Boolean stuff
     #
 
-    @normalize_types
-    @compare_bits_0_length
+    @bvv_operand_0_length
     def __eq__(self, o):
-        return self.value == o.value
+        return self._value == o._value
 
-    @normalize_types
-    @compare_bits_0_length
+    @bvv_operand_0_length
     def __ne__(self, o):
-        return self.value != o.value
+        return self._value != o._value
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __lt__(self, o):
-        return self.value < o.value
+        return self._value < o._value
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __gt__(self, o):
-        return self.value > o.value
+        return self._value > o._value
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __le__(self, o):
-        return self.value <= o.value
+        return self._value <= o._value
 
-    @normalize_types
-    @compare_bits
+    @bvv_operand
     def __ge__(self, o):
-        return self.value >= o.value
+        return self._value >= o._value
 
     #
     # Conversions
@@ -274,7 +328,7 @@ class BVV(BackendObject):
         return self.bits
 
     def __repr__(self):
-        return 'BVV(0x%x, %d)' % (self.value, self.bits)
+        return 'BVV(0x%x, %d)' % (self._value, self.bits)
 
 #
 # External stuff
@@ -284,13 +338,13 @@ def BitVecVal(value, bits):
     return BVV(value, bits)
 
 def ZeroExt(num, o):
-    return BVV(o.value, o.bits + num)
+    return _bvv(o.value, o.bits + num)
 
 def SignExt(num, o):
-    return BVV(o.signed, o.bits + num)
+    return _bvv(o.signed, o.bits + num)
 
 def Extract(f, t, o):
-    return BVV((o.value >> t) & (2**(f+1) - 1), f-t+1)
+    return _bvv(o.value >> t, f-t+1)
 
 def Concat(*args):
     total_bits = 0
@@ -299,7 +353,7 @@ def Concat(*args):
     for o in args:
         total_value = (total_value << o.bits) | o.value
         total_bits += o.bits
-    return BVV(total_value, total_bits)
+    return _bvv(total_value, total_bits)
 
 def RotateRight(self, bits):
     bits_smaller = bits % self.size()
@@ -327,7 +381,7 @@ def Reverse(a):
         else:
             for i in range(0, size, 8):
                 out |= ((value & (0xff << i)) >> i) << (size - 8 - i)
-        return BVV(out, size)
+        return _bvv(out, size)
 
         # the RIGHT way to do it:
         #return BVV(int(("%x" % a.value).rjust(size/4, '0').decode('hex')[::-1].encode('hex'), 16), size)
@@ -352,48 +406,39 @@ def _reverse_64(v):
            ((v & 0xff000000000000) >> 40) | \
            ((v & 0xff00000000000000) >> 56)
 
-@normalize_types
-@compare_bits
+@bvv_operand
 def ULT(self, o):
-    return self.value < o.value
+    return self._value < o._value
 
-@normalize_types
-@compare_bits
+@bvv_operand
 def UGT(self, o):
-    return self.value > o.value
+    return self._value > o._value
 
-@normalize_types
-@compare_bits
+@bvv_operand
 def ULE(self, o):
-    return self.value <= o.value
+    return self._value <= o._value
 
-@normalize_types
-@compare_bits
+@bvv_operand
 def UGE(self, o):
-    return self.value >= o.value
+    return self._value >= o._value
 
-@normalize_types
-@compare_bits
+@bvv_operand
 def SLT(self, o):
     return self.signed < o.signed
 
-@normalize_types
-@compare_bits
+@bvv_operand
 def SGT(self, o):
     return self.signed > o.signed
 
-@normalize_types
-@compare_bits
+@bvv_operand
 def SLE(self, o):
     return self.signed <= o.signed
 
-@normalize_types
-@compare_bits
+@bvv_operand
 def SGE(self, o):
     return self.signed >= o.signed
 
-@normalize_types
-@compare_bits
+@bvv_operand
 def SMod(self, o):
     # compute the remainder like the % operator in C
     a = self.signed
@@ -402,10 +447,9 @@ def SMod(self, o):
         raise ClaripyZeroDivisionError()
     division_result = a//b if a*b>0 else (a+(-a%b))//b
     val = a - division_result*b
-    return BVV(val, self.bits)
+    return _bvv(val, self.bits)
 
-@normalize_types
-@compare_bits
+@bvv_operand
 def SDiv(self, o):
     # compute the round towards 0 division
     a = self.signed
@@ -413,7 +457,7 @@ def SDiv(self, o):
     if b == 0:
         raise ClaripyZeroDivisionError()
     val = a//b if a*b>0 else (a+(-a%b))//b
-    return BVV(val, self.bits)
+    return _bvv(val, self.bits)
 
 #
 # Pure boolean stuff
@@ -440,7 +484,9 @@ def If(c, t, f):
     if c: return t
     else: return f
 
-@normalize_types
-@compare_bits
 def LShR(a, b):
-    return BVV(a.value >> b.signed, a.bits)
+    if type(b) is not BVV or b.bits != a.bits or not a.bits:
+        b = a._operand(b)
+        if b is NotImplemented:
+            return b
+    return _bvv(a._value >> b.signed, a.bits)
@@ -0,0 +1,221 @@
+"""
+Introspection and incremental trimming of claripy's caches.
+
+:func:`cache_stats` reports, for each cache, its number of entries, an estimate of the memory it holds, and (when the
+:data:`claripy.profiling.profiler` is enabled) its hits, misses and hit rate. Per-thread backend caches are reported for
+the calling thread.
+
+A :class:`MemoryPressurePolicy` can be installed with :func:`set_memory_policy`. Frontends poll it before solving:
+once the process RSS crosses the soft limit, each poll trims a fraction of the largest (weighted by how cold it is)
+trimmable cache, and only past the hard limit does it fall back to dropping every cache, like :func:`claripy.reset`.
+"""
+
+import itertools
+import logging
+import math
+import os
+import sys
+import time
+
+from cachetools import Cache
+
+l = logging.getLogger("claripy.caches")
+
+
+def _estimate_bytes(container, sample_size=64):
+    """
+    Estimates the memory held by a cache from the shallow size of the container and of a sample of its entries.
+    """
+    n = len(container)
+    total = sys.getsizeof(container)
+    if n == 0:
+        return total
+
+    if isinstance(container, Cache):
+        # go through the base class, so that sampling does not refresh entries in an LRU cache
+        keys = list(itertools.islice(iter(container), sample_size))
+        sample = [ (k, Cache.__getitem__(container, k)) for k in keys ]
+    else:
+        sample = list(itertools.islice(container.items(), sample_size))
+    if not sample:
+        return total
+    per_entry = sum(sys.getsizeof(k) + sys.getsizeof(v) for k,v in sample) / len(sample)
+    return int(total + per_entry * n)
+
+
+def trim_cache(container, fraction):
+    """
+    Drops `fraction` of the entries of a cache. Caches with a `trim()` method trim themselves, LRU caches drop their
+    least recently used entries, and plain and weak dicts drop their oldest ones.
+
+    :return:    The number of entries dropped.
+    """
+    if hasattr(container, 'trim'):
+        return container.trim(fraction)
+
+    k = int(math.ceil(len(container) * fraction))
+    if k == 0:
+        return 0
+
+    if isinstance(container, Cache):
+        for _ in range(k):
+            container.popitem()
+    else:
+        for key in list(itertools.islice(iter(container), k)):
+            container.pop(key, None)
+    return k
+
+
+def all_caches():
+    """
+    Returns a dict of cache name to `(container, trimmable)` for every cache claripy knows about. Weak-valued caches
+    are not trimmable, since dropping their entries does not free anything.
+    """
+    caches = {
+        'ast.hash_cons': (Base._hash_cache, False),
+        'ast.bvv': (bv._bvv_cache, True),
+        'ast.boolv': (bool_._boolv_cache, False),
+        'ast.excavation': (base._excavation_memo, True),
+        'balancer': (balancer._balancer_cache, True),
+    }
+    if simplifications.simpleton.memo is not None:
+        caches['simplifier.memo'] = (simplifications.simpleton.memo, True)
+    for b in backends._all_backends:
+        for name, c in b._caches().items():
+            caches['%s.%s' % (type(b).__name__, name)] = c
+    return caches
+
+
+def cache_stats():
+    """
+    Returns a dict of cache name to a dict with its `entries`, estimated `bytes`, `trimmable` flag, and its `hits`,
+    `misses` and `hit_rate` (None if nothing was counted). Hits and misses come from the cache itself if it keeps
+    statistics, and from the profiler otherwise.
+    """
+    stats = { }
+    for name, (container, trimmable) in all_caches().items():
+        if hasattr(container, 'hits'):
+            # caches that keep their own statistics
+            hits, misses = container.hits, container.misses
+        else:
+            hits = profiler.counters.get(name + '.hit', 0)
+            misses = profiler.counters.get(name + '.miss', 0)
+        stats[name] = {
+            'entries': len(container),
+            'bytes': _estimate_bytes(container),
+            'trimmable': trimmable,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+        }
+    return stats
+
+
+def current_rss():
+    """
+    Returns the resident set size of this process in bytes, or None if it cannot be determined.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    # this is the peak RSS, which is the best we can do here (in kilobytes on Linux, in bytes on macOS)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class MemoryPressurePolicy:
+    """
+    Trims claripy's caches incrementally when the process RSS crosses configured thresholds.
+    """
+
+    def __init__(self, soft_limit, hard_limit=None, trim_fraction=0.25, interval=1.0):
+        """
+        :param soft_limit:      The RSS (in bytes) above which caches are trimmed, one cache per poll.
+        :param hard_limit:      The RSS (in bytes) above which all caches are dropped, like claripy.reset() does.
+        :param trim_fraction:   The fraction of a cache's entries dropped per trim.
+        :param interval:        The minimum number of seconds between two RSS checks.
+        """
+        self.soft_limit = soft_limit
+        self.hard_limit = hard_limit
+        self.trim_fraction = trim_fraction
+        self.interval = interval
+        self._last_poll = None
+        self.trims = 0
+        self.downsizes = 0
+
+    def _victim(self):
+        best, best_score = None, 0
+        for name, s in cache_stats().items():
+            if not s['trimmable'] or s['entries'] == 0:
+                continue
+            # prefer big caches, and among those, the ones that are rarely hit
+            score = s['bytes'] * (1 - s['hit_rate'] if s['hit_rate'] is not None else 1)
+            if best is None or score > best_score:
+                best, best_score = name, score
+        return best
+
+    def poll(self, force=False):
+        """
+        Checks the RSS, and trims caches if needed.
+
+        :param force:   Check even if the last check was less than `interval` seconds ago.
+        :return:        The name of the trimmed cache, 'downsize', or None if nothing was done.
+        """
+        now = time.monotonic()
+        if not force and self._last_poll is not None and now - self._last_poll < self.interval:
+            return None
+        self._last_poll = now
+
+        rss = current_rss()
+        if rss is None or rss < self.soft_limit:
+            return None
+
+        if self.hard_limit is not None and rss >= self.hard_limit:
+            l.info("RSS is %d bytes, over the hard limit. Dropping all caches.", rss)
+            backends.downsize()
+            bv._bvv_cache.clear()
+            base._excavation_memo.clear()
+            balancer._balancer_cache.clear()
+            if simplifications.simpleton.memo is not None:
+                simplifications.simpleton.memo.clear()
+            self.downsizes += 1
+            return 'downsize'
+
+        victim = self._victim()
+        if victim is None:
+            return None
+
+        container, _ = all_caches()[victim]
+        dropped = trim_cache(container, self.trim_fraction)
+        l.info("RSS is %d bytes, over the soft limit. Dropped %d entries from %s.", rss, dropped, victim)
+        self.trims += 1
+        return victim
+
+_policy = None
+
+def set_memory_policy(policy):
+    """
+    Installs a :class:`MemoryPressurePolicy` (or removes it, if `policy` is None).
+    """
+    global _policy
+    _policy = policy
+
+def poll_memory_policy():
+    if _policy is not None:
+        _policy.poll()
+
+from .ast.base import Base
+from .ast import base
+from .ast import bv
+from .ast import bool as bool_
+from .backend_manager import backends
+from .profiling import profiler
+from . import simplifications
+from . import balancer
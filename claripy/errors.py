@@ -19,6 +19,9 @@ class BackendUnsupportedError(BackendError):
 class ClaripyZ3Error(ClaripyError):
     pass
 
+class ClaripySolverInterruptError(ClaripyError):
+    pass
+
 class ClaripyBackendVSAError(BackendError):
     pass
 
@@ -1,7 +1,3 @@
-#hits = 0
-#misses = 0
-#ejects = 0
-
 class CompositedCacheMixin:
     def __init__(self, *args, **kwargs):
         super(CompositedCacheMixin, self).__init__(*args, **kwargs)
@@ -24,23 +20,22 @@ class CompositedCacheMixin:
     #
 
     def _remove_cached(self, names):
-        #global ejects
-
         for k in list(self._merged_solvers.keys()):
             if k & names:
-                #ejects += 1
+                if profiler.enabled:
+                    profiler.count('composite_cache.eject')
                 self._merged_solvers.pop(k)
 
     def _solver_for_names(self, names):
-        #global hits, misses
-
         n = frozenset(names)
         try:
             r = self._merged_solvers[frozenset(n)]
-            #hits += 1
+            if profiler.enabled:
+                profiler.count('composite_cache.hit')
             return r
         except KeyError:
-            #misses += 1
+            if profiler.enabled:
+                profiler.count('composite_cache.miss')
             s = super(CompositedCacheMixin, self)._solver_for_names(names)
             self._merged_solvers[n] = s
             return s
@@ -52,3 +47,5 @@ class CompositedCacheMixin:
     def _store_child(self, s, **kwargs):
         self._remove_cached(s.variables)
         return super(CompositedCacheMixin, self)._store_child(s, **kwargs)
+
+from ..profiling import profiler
@@ -236,14 +236,22 @@ class ModelCacheMixin:
 
     def satisfiable(self, extra_constraints=(), **kwargs):
         for _ in self._get_models(extra_constraints=extra_constraints):
+            if profiler.enabled:
+                profiler.count('model_cache.hit')
             return True
+        if profiler.enabled:
+            profiler.count('model_cache.miss')
         return super(ModelCacheMixin, self).satisfiable(extra_constraints=extra_constraints, **kwargs)
 
     def batch_eval(self, asts, n, extra_constraints=(), **kwargs):
         results = self._get_batch_solutions(asts, n=n, extra_constraints=extra_constraints)
 
         if len(results) == n or (len(asts) == 1 and asts[0].cache_key in self._eval_exhausted):
+            if profiler.enabled:
+                profiler.count('model_cache.hit')
             return results
+        if profiler.enabled:
+            profiler.count('model_cache.miss')
 
         remaining = n - len(results)
 
@@ -277,8 +285,12 @@ class ModelCacheMixin:
             cached = self._get_solutions(e, extra_constraints=extra_constraints)
 
         if len(cached) > 0:
+            if profiler.enabled:
+                profiler.count('model_cache.hit')
             return min(cached)
         else:
+            if profiler.enabled:
+                profiler.count('model_cache.miss')
             m = super(ModelCacheMixin, self).min(e, extra_constraints=extra_constraints, **kwargs)
             self._min_exhausted.add(e.cache_key)
             return m
@@ -289,8 +301,12 @@ class ModelCacheMixin:
             cached = self._get_solutions(e, extra_constraints=extra_constraints)
 
         if len(cached) > 0:
+            if profiler.enabled:
+                profiler.count('model_cache.hit')
             return max(cached)
         else:
+            if profiler.enabled:
+                profiler.count('model_cache.miss')
             m = super(ModelCacheMixin, self).max(e, extra_constraints=extra_constraints, **kwargs)
             self._max_exhausted.add(e.cache_key)
             return m
@@ -310,4 +326,5 @@ class ModelCacheMixin:
 
 from .. import backends, false
 from ..errors import UnsatError
+from ..profiling import profiler
 from ..ast import all_operations, Base
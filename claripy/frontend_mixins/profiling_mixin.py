@@ -0,0 +1,82 @@
+import time
+
+from ..profiling import profiler
+
+class ProfilingMixin:
+    """
+    Records the latency of every frontend call, and the number of constraints and extra constraints involved, into
+    :data:`claripy.profiling.profiler`. Unlike the DebugMixin, nothing is printed: the data is meant to be exported with
+    ``profiler.snapshot()`` once the workload is done. While the profiler is disabled, calls go straight through.
+    """
+
+    def _profiled_call(self, method, args, kwargs, extra_constraints=()):
+        f = getattr(super(ProfilingMixin, self), method)
+        if not profiler.enabled:
+            return f(*args, **kwargs)
+
+        name = type(self).__name__
+        profiler.record_value(name + '.constraints', len(self.constraints))
+        if extra_constraints:
+            profiler.record_value(name + '.extra_constraints', len(extra_constraints))
+
+        start = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            profiler.record_time(name + '.' + method, time.perf_counter() - start)
+
+    def branch(self):
+        return self._profiled_call('branch', (), { })
+
+    def merge(self, *args, **kwargs):
+        return self._profiled_call('merge', args, kwargs)
+
+    def combine(self, *args, **kwargs):
+        return self._profiled_call('combine', args, kwargs)
+
+    def split(self):
+        return self._profiled_call('split', (), { })
+
+    def add(self, constraints, **kwargs):
+        if profiler.enabled:
+            profiler.record_value(type(self).__name__ + '.added', len(constraints))
+        return self._profiled_call('add', (constraints,), kwargs)
+
+    def simplify(self, *args, **kwargs):
+        return self._profiled_call('simplify', args, kwargs)
+
+    def check_satisfiability(self, extra_constraints=(), **kwargs):
+        kwargs['extra_constraints'] = extra_constraints
+        return self._profiled_call('check_satisfiability', (), kwargs, extra_constraints)
+
+    def satisfiable(self, extra_constraints=(), **kwargs):
+        kwargs['extra_constraints'] = extra_constraints
+        return self._profiled_call('satisfiable', (), kwargs, extra_constraints)
+
+    def eval(self, e, n, extra_constraints=(), **kwargs):
+        kwargs['extra_constraints'] = extra_constraints
+        return self._profiled_call('eval', (e, n), kwargs, extra_constraints)
+
+    def batch_eval(self, exprs, n, extra_constraints=(), **kwargs):
+        kwargs['extra_constraints'] = extra_constraints
+        return self._profiled_call('batch_eval', (exprs, n), kwargs, extra_constraints)
+
+    def max(self, e, extra_constraints=(), **kwargs):
+        kwargs['extra_constraints'] = extra_constraints
+        return self._profiled_call('max', (e,), kwargs, extra_constraints)
+
+    def min(self, e, extra_constraints=(), **kwargs):
+        kwargs['extra_constraints'] = extra_constraints
+        return self._profiled_call('min', (e,), kwargs, extra_constraints)
+
+    def solution(self, e, v, extra_constraints=(), **kwargs):
+        kwargs['extra_constraints'] = extra_constraints
+        return self._profiled_call('solution', (e, v), kwargs, extra_constraints)
+
+    def is_true(self, e, extra_constraints=(), **kwargs):
+        kwargs['extra_constraints'] = extra_constraints
+        return self._profiled_call('is_true', (e,), kwargs, extra_constraints)
+
+    def is_false(self, e, extra_constraints=(), **kwargs):
+        kwargs['extra_constraints'] = extra_constraints
+        return self._profiled_call('is_false', (e,), kwargs, extra_constraints)
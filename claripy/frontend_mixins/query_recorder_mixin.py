@@ -0,0 +1,109 @@
+import itertools
+import threading
+import time
+
+_recorder_ids = itertools.count()
+
+# set while a recorded call is running in this thread, so that frontend calls made underneath it (including ones on
+# other frontends, such as the children created by branch()) are not recorded again
+_tls = threading.local()
+
+class QueryRecorderMixin:
+    """
+    Records every call made on the frontend into a :class:`claripy.query_log.QueryLog`, so that the workload can be
+    replayed later against a different solver stack. Only the outermost call is recorded; calls that the frontend makes
+    on itself (for example, eval() from inside max()) or on other frontends are part of the recorded call's wall time.
+    """
+
+    def __init__(self, *args, query_log=None, **kwargs):
+        super(QueryRecorderMixin, self).__init__(*args, **kwargs)
+        self._query_log = query_log
+        self._recorder_id = next(_recorder_ids)
+
+        if self._query_log is not None:
+            self._query_log.record(self, '__init__', (), { }, None, None, 0.0)
+
+    def _blank_copy(self, c):
+        super(QueryRecorderMixin, self)._blank_copy(c)
+        c._query_log = self._query_log
+        c._recorder_id = next(_recorder_ids)
+
+    def __setstate__(self, base_state):
+        super().__setstate__(base_state)
+        self._query_log = None
+        self._recorder_id = next(_recorder_ids)
+
+    #
+    # Recording
+    #
+
+    def _recorded_call(self, method, *args, **kwargs):
+        f = getattr(super(QueryRecorderMixin, self), method)
+        if self._query_log is None or getattr(_tls, 'recording', False):
+            return f(*args, **kwargs)
+
+        _tls.recording = True
+        start = time.perf_counter()
+        try:
+            r = f(*args, **kwargs)
+        except ClaripyError as e:
+            self._query_log.record(self, method, args, kwargs, None, type(e), time.perf_counter() - start)
+            raise
+        finally:
+            _tls.recording = False
+
+        self._query_log.record(self, method, args, kwargs, r, None, time.perf_counter() - start)
+        return r
+
+    def branch(self):
+        return self._recorded_call('branch')
+
+    def merge(self, *args, **kwargs):
+        return self._recorded_call('merge', *args, **kwargs)
+
+    def combine(self, *args, **kwargs):
+        return self._recorded_call('combine', *args, **kwargs)
+
+    def split(self):
+        return self._recorded_call('split')
+
+    def finalize(self):
+        return self._recorded_call('finalize')
+
+    def downsize(self):
+        return self._recorded_call('downsize')
+
+    def add(self, *args, **kwargs):
+        return self._recorded_call('add', *args, **kwargs)
+
+    def simplify(self, *args, **kwargs):
+        return self._recorded_call('simplify', *args, **kwargs)
+
+    def check_satisfiability(self, *args, **kwargs):
+        return self._recorded_call('check_satisfiability', *args, **kwargs)
+
+    def satisfiable(self, *args, **kwargs):
+        return self._recorded_call('satisfiable', *args, **kwargs)
+
+    def eval(self, *args, **kwargs):
+        return self._recorded_call('eval', *args, **kwargs)
+
+    def batch_eval(self, *args, **kwargs):
+        return self._recorded_call('batch_eval', *args, **kwargs)
+
+    def max(self, *args, **kwargs):
+        return self._recorded_call('max', *args, **kwargs)
+
+    def min(self, *args, **kwargs):
+        return self._recorded_call('min', *args, **kwargs)
+
+    def solution(self, *args, **kwargs):
+        return self._recorded_call('solution', *args, **kwargs)
+
+    def is_true(self, *args, **kwargs):
+        return self._recorded_call('is_true', *args, **kwargs)
+
+    def is_false(self, *args, **kwargs):
+        return self._recorded_call('is_false', *args, **kwargs)
+
+from ..errors import ClaripyError
@@ -37,10 +37,12 @@ class SatCacheMixin:
         return new_constraints
 
     def satisfiable(self, extra_constraints=(), **kwargs):
-        if self._cached_satness is False:
-            return False
-        if self._cached_satness is True and len(extra_constraints) == 0:
-            return True
+        if self._cached_satness is False or (self._cached_satness is True and len(extra_constraints) == 0):
+            if profiler.enabled:
+                profiler.count('sat_cache.hit')
+            return self._cached_satness
+        if profiler.enabled:
+            profiler.count('sat_cache.miss')
         r = super(SatCacheMixin, self).satisfiable(
             extra_constraints=extra_constraints, **kwargs
         )
@@ -120,3 +122,4 @@ class SatCacheMixin:
 
 from .. import false
 from ..errors import UnsatError
+from ..profiling import profiler
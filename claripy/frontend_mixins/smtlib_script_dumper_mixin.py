@@ -14,8 +14,10 @@ class SMTLibScriptDumperMixin:
         :return string: smt-lib script
         """
         try:
-            e_csts = self._solver_backend.convert_list(extra_constraints + tuple(self.constraints))
-            e_variables = self._solver_backend.convert_list(extra_variables)
+            # one batch, so that the variables share their conversions with the constraints
+            csts = tuple(extra_constraints) + tuple(self.constraints)
+            converted = self._solver_backend.convert_list(csts + tuple(extra_variables))
+            e_csts, e_variables = converted[:len(csts)], converted[len(csts):]
 
             variables, csts = self._solver_backend._get_all_vars_and_constraints(e_c=e_csts, e_v=e_variables)
             return self._solver_backend._get_satisfiability_smt_script(csts, variables)
@@ -13,17 +13,21 @@ class ConstrainedFrontend(Frontend):  # pylint:disable=abstract-method
         self.constraints = []
         self.variables = set()
         self._finalized = False
+        # the hashes of the constraints that the last simplification produced
+        self._simplified_hashes = frozenset()
 
     def _blank_copy(self, c):
         super(ConstrainedFrontend, self)._blank_copy(c)
         c.constraints = []
         c.variables = set()
         c._finalized = False
+        c._simplified_hashes = frozenset()
 
     def _copy(self, c):
         super(ConstrainedFrontend, self)._copy(c)
         c.constraints = list(self.constraints)
         c.variables = set(self.variables)
+        c._simplified_hashes = self._simplified_hashes
 
         # finalize both
         self.finalize()
@@ -38,6 +42,7 @@ class ConstrainedFrontend(Frontend):  # pylint:disable=abstract-method
 
     def __setstate__(self, s):
         self.constraints, self.variables, base_state = s
+        self._simplified_hashes = frozenset()
         super().__setstate__(base_state)
 
     #
@@ -114,8 +119,26 @@ class ConstrainedFrontend(Frontend):  # pylint:disable=abstract-method
         if len(to_simplify) == 0:
             return self.constraints
 
-        simplified = simplify(And(*to_simplify)).split(['And']) #pylint:disable=no-member
+        # Independent sets of constraints are simplified separately, and only if they gained constraints since the last
+        # simplification. They are kept in the order in which their constraints were added.
+        splitted = [ s for c in to_simplify for s in c.split(['And']) ]
+        position = { }
+        for n, c in enumerate(splitted):
+            position.setdefault(c._hash, n)
+        clusters = sorted(
+            (sorted(c_list, key=lambda c: position[c._hash]) for _, c_list in self._split_constraints(splitted)),
+            key=lambda c_list: position[c_list[0]._hash]
+        )
+
+        simplified = [ ]
+        for c_list in clusters:
+            if all(c._hash in self._simplified_hashes for c in c_list):
+                simplified.extend(c_list)
+            else:
+                simplified.extend(simplify(And(*c_list)).split(['And'])) #pylint:disable=no-member
+
         self.constraints = no_simplify + simplified
+        self._simplified_hashes = frozenset(c._hash for c in simplified)
         return self.constraints
 
     #
@@ -50,6 +50,7 @@ class FullFrontend(ConstrainedFrontend):
     #
 
     def _get_solver(self):
+        caches.poll_memory_policy()
         if getattr(self._tls, 'solver', None) is None or (self._finalized and len(self._to_add) > 0):
             self._tls.solver = self._solver_backend.solver(timeout=self.timeout)
             self._add_constraints()
@@ -232,3 +233,4 @@ class FullFrontend(ConstrainedFrontend):
 from ..errors import UnsatError, BackendError, ClaripyFrontendError
 from ..ast.bv import UGE, ULE
 from ..backend_manager import backends
+from .. import caches
@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 
+import collections
+import concurrent.futures
 import logging
+import threading
+import time
 
 l = logging.getLogger("claripy.frontends.full_frontend")
 
@@ -8,26 +12,177 @@ from ..frontend import Frontend
 
 _VALIDATE_BALANCER=False
 
+#
+# Concurrent solving
+#
+
+# Exact calls of concurrent HybridFrontends are all made in a single worker thread. Z3 contexts and the solvers of a
+# FullFrontend are per-thread, so a frontend that was used in two threads would need two solvers.
+_worker = None
+_worker_lock = threading.Lock()
+
+def _exact_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        return _worker
+
+
+class HybridStats:
+    """
+    The latencies of the approximate and exact paths of a HybridFrontend (and of the time spent waiting for the exact
+    one), and counts of which one answered. The branches of a frontend share it, and the same data goes to the
+    profiler (as `HybridFrontend.<path>`) when it is enabled.
+
+    The counters are `approximate` and `exact` for the answers of each path, `approximate_failed` when the approximate
+    frontend could not answer, `exact_skipped` when an exact call was dropped before it started, and `exact_cancelled`
+    when it was interrupted.
+    """
+
+    paths = ('approximate', 'exact', 'wait')
+
+    def __init__(self):
+        self.timings = { p: Distribution() for p in self.paths }
+        self.counters = collections.Counter()
+        # exact calls record their time from the worker thread
+        self._lock = threading.Lock()
+
+    def record_time(self, path, elapsed):
+        with self._lock:
+            self.timings[path].add(elapsed)
+        if profiler.enabled:
+            profiler.record_time('HybridFrontend.' + path, elapsed)
+
+    def count(self, event):
+        with self._lock:
+            self.counters[event] += 1
+        if profiler.enabled:
+            profiler.count('HybridFrontend.' + event)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'timings': { p: d.to_dict() for p, d in self.timings.items() },
+                'counters': dict(self.counters),
+            }
+
+
+class _ExactCall:
+    """
+    A call to an exact frontend, made in the worker thread once `start` is set (or its delay has passed), unless it is
+    cancelled first. Cancelling a running call interrupts its Z3 context, and the interrupted check raises a
+    ClaripySolverInterruptError instead of returning (and caching) an unsat answer.
+    """
+
+    def __init__(self, frontend, f_name, args, kwargs, stats):
+        self.frontend = frontend
+        self.f_name = f_name
+        self.args = args
+        self.kwargs = kwargs
+        self.stats = stats
+        self.start = threading.Event()
+        self.future = None
+        self._lock = threading.Lock()
+        self._state = 'queued'
+        self._backend = None
+        self._context = None
+
+    def run(self, delay):
+        self.start.wait(delay)
+        backend = getattr(self.frontend, '_solver_backend', None)
+        context = getattr(backend, '_context', None)
+        with self._lock:
+            if self._state == 'cancelled':
+                return None
+            self._state = 'running'
+            self._backend = backend
+            self._context = context
+
+        t = time.perf_counter()
+        try:
+            return getattr(self.frontend, self.f_name)(*self.args, **self.kwargs)
+        finally:
+            with self._lock:
+                if self._state == 'running':
+                    self._state = 'done'
+                elif hasattr(backend, 'clear_interrupt'):
+                    backend.clear_interrupt(context)
+                self._backend = None
+                self._context = None
+            self.stats.record_time('exact', time.perf_counter() - t)
+
+    def submit(self, delay=None):
+        self.future = _exact_worker().submit(self.run, delay)
+        return self
+
+    def cancel(self):
+        """
+        :return: 'exact_skipped' if the call had not started, 'exact_cancelled' if it was interrupted, or None if it
+                 was done already.
+        """
+        with self._lock:
+            state = self._state
+            if state == 'queued':
+                self._state = 'cancelled'
+            elif state == 'running':
+                self._state = 'cancelled'
+                if hasattr(self._backend, 'interrupt'):
+                    self._backend.interrupt(self._context)
+        self.start.set()
+        return { 'queued': 'exact_skipped', 'running': 'exact_cancelled' }.get(state, None)
+
+    def answered(self):
+        """
+        Checks whether the call returned an answer (and not an error) already.
+        """
+        return self.future.done() and self._state == 'done' and self.future.exception() is None
+
+
 class HybridFrontend(Frontend):
-    def __init__(self, exact_frontend, approximate_frontend, approximate_first=False, **kwargs):
+    def __init__(
+        self, exact_frontend, approximate_frontend, approximate_first=False,
+        concurrency=None, approximate_budget=0.01, **kwargs
+    ):
+        """
+        :param concurrency:         None to try the approximate frontend and then the exact one, 'race' to run the
+                                    exact one in a worker thread while the approximate one runs, or 'speculative' to
+                                    start it only once the approximate one has run for `approximate_budget` seconds.
+                                    Either way, the first answer wins. When the exact frontend is asked first, it still
+                                    runs in the worker thread.
+        :param approximate_budget:  In speculative mode, how long (in seconds) the approximate frontend gets.
+        """
         Frontend.__init__(self, **kwargs)
+        if concurrency not in (None, 'race', 'speculative'):
+            raise ClaripyValueError("concurrency should be None, 'race' or 'speculative'")
+
         self._exact_frontend = exact_frontend
         self._approximate_frontend = approximate_frontend
         self._approximate_first = approximate_first
+        self._concurrency = concurrency
+        self._approximate_budget = approximate_budget
+        self._stats = HybridStats()
+        self._pending = None
 
         if _VALIDATE_BALANCER:
             approximate_frontend._validation_frontend = self._exact_frontend
 
     def _blank_copy(self, c):
+        self._settle()
         c._exact_frontend = self._exact_frontend.blank_copy()
         c._approximate_frontend = self._approximate_frontend.blank_copy()
         c._approximate_first = self._approximate_first
+        c._concurrency = self._concurrency
+        c._approximate_budget = self._approximate_budget
+        c._stats = self._stats
+        c._pending = None
 
         if _VALIDATE_BALANCER:
             c._approximate_frontend._validation_frontend = self._exact_frontend
 
 
     def _copy(self, c):
+        self._settle()
         self._exact_frontend._copy(c._exact_frontend)
         self._approximate_frontend._copy(c._approximate_frontend)
         self._approximate_first = c._approximate_first
@@ -52,28 +207,111 @@ class HybridFrontend(Frontend):
     #
 
     def __getstate__(self):
-        return (self._exact_frontend, self._approximate_frontend, super().__getstate__())
+        self._settle()
+        return (
+            self._exact_frontend, self._approximate_frontend, self._concurrency, self._approximate_budget,
+            super().__getstate__()
+        )
 
     def __setstate__(self, s):
-        self._exact_frontend, self._approximate_frontend, base_state = s
+        self._exact_frontend, self._approximate_frontend, self._concurrency, self._approximate_budget, base_state = s
+        self._stats = HybridStats()
+        self._pending = None
         super().__setstate__(base_state)
 
+    def timing_stats(self):
+        """
+        Returns the timings and counters of the approximate and exact paths, as a dict. See HybridStats.
+        """
+        return self._stats.snapshot()
+
     #
     # Hybrid solving
     #
 
+    def _settle(self):
+        """
+        Waits for the last exact call to be done, so that the exact frontend can be used in this thread.
+        """
+        if self._pending is not None:
+            concurrent.futures.wait([ self._pending.future ])
+            self._pending = None
+
+    def _exact_call(self, f_name, args, kwargs):
+        if self._concurrency is None:
+            t = time.perf_counter()
+            try:
+                return getattr(self._exact_frontend, f_name)(*args, **kwargs)
+            finally:
+                self._stats.record_time('exact', time.perf_counter() - t)
+
+        self._settle()
+        call = _ExactCall(self._exact_frontend, f_name, args, kwargs, self._stats)
+        call.start.set()
+        self._pending = call.submit()
+        return self._wait(call)
+
+    def _wait(self, call):
+        t = time.perf_counter()
+        try:
+            return call.future.result()
+        finally:
+            self._stats.record_time('wait', time.perf_counter() - t)
+
+    def _approximate_call(self, f_name, args, kwargs):
+        t = time.perf_counter()
+        try:
+            return getattr(self._approximate_frontend, f_name)(*args, **kwargs)
+        finally:
+            self._stats.record_time('approximate', time.perf_counter() - t)
+
+    def _concurrent_call(self, f_name, args, kwargs):
+        # the exact call only starts after the ones already queued, so it does not need to wait for them
+        call = _ExactCall(self._exact_frontend, f_name, args, kwargs, self._stats)
+        self._pending = call.submit(0 if self._concurrency == 'race' else self._approximate_budget)
+
+        try:
+            solution = self._approximate_call(f_name, args, kwargs)
+        except ClaripyFrontendError:
+            self._stats.count('approximate_failed')
+            call.start.set()
+            solution = self._wait(call)
+            self._stats.count('exact')
+            return True, solution
+        except BaseException:
+            call.cancel()
+            raise
+
+        if call.answered():
+            # the exact answer came first
+            self._stats.count('exact')
+            return True, call.future.result()
+
+        cancelled = call.cancel()
+        if cancelled is not None:
+            self._stats.count(cancelled)
+        self._stats.count('approximate')
+        return False, solution
+
     def _do_call(self, f_name, *args, **kwargs):
         exact = kwargs.pop('exact', True)
 
+        if exact is False and self._concurrency is not None:
+            return self._concurrent_call(f_name, args, kwargs)
+
         # if approximating, try the approximation backend
         if exact is False:
             try:
-                return False, getattr(self._approximate_frontend, f_name)(*args, **kwargs)
+                solution = self._approximate_call(f_name, args, kwargs)
+                self._stats.count('approximate')
+                return False, solution
             except ClaripyFrontendError:
-                pass
+                self._stats.count('approximate_failed')
 
         # if that fails, try the exact backend
-        return True, getattr(self._exact_frontend, f_name)(*args, **kwargs)
+        solution = self._exact_call(f_name, args, kwargs)
+        self._stats.count('exact')
+        return True, solution
 
     def _hybrid_call(self, f_name, *args, **kwargs):
         _, solution = self._do_call(f_name, *args, **kwargs)
@@ -130,18 +368,25 @@ class HybridFrontend(Frontend):
     #
 
     def add(self, constraints):
+        self._settle()
         added = self._exact_frontend.add(constraints)
         self._approximate_frontend.add(constraints)
         return added
 
     def combine(self, others):
+        for f in (self,) + tuple(others):
+            f._settle()
         other_exact = [o._exact_frontend for o in others]
         other_approximate = [o._approximate_frontend for o in others]
         new_exact = self._exact_frontend.combine(other_exact)
         new_approximate = self._approximate_frontend.combine(other_approximate)
-        return HybridFrontend(new_exact, new_approximate)
+        return HybridFrontend(
+            new_exact, new_approximate, concurrency=self._concurrency, approximate_budget=self._approximate_budget
+        )
 
     def merge(self, others, merge_conditions, common_ancestor=None):
+        for f in (self,) + tuple(others):
+            f._settle()
         other_exact = [o._exact_frontend for o in others]
         other_approximate = [o._approximate_frontend for o in others]
         e_merged, new_exact = self._exact_frontend.merge(
@@ -152,29 +397,38 @@ class HybridFrontend(Frontend):
             other_approximate, merge_conditions,
             common_ancestor=common_ancestor._approximate_frontend if common_ancestor is not None else None
         )[-1]
-        return (e_merged, HybridFrontend(new_exact, new_approximate))
+        return (e_merged, HybridFrontend(
+            new_exact, new_approximate, concurrency=self._concurrency, approximate_budget=self._approximate_budget
+        ))
 
     def simplify(self):
+        self._settle()
         self._approximate_frontend.simplify()
         return self._exact_frontend.simplify()
 
     def downsize(self):
+        self._settle()
         self._exact_frontend.downsize()
         self._approximate_frontend.downsize()
 
     def finalize(self):
+        self._settle()
         self._exact_frontend.finalize()
         self._approximate_frontend.finalize()
 
     def split(self):
+        self._settle()
         results = []
         exacts = self._exact_frontend.split()
 
         for e in exacts:
             a = self._approximate_frontend.blank_copy()
             a.add(e.constraints)
-            results.append(HybridFrontend(e, a))
+            results.append(HybridFrontend(
+                e, a, concurrency=self._concurrency, approximate_budget=self._approximate_budget
+            ))
         return results
 
 
-from ..errors import ClaripyFrontendError
+from ..errors import ClaripyFrontendError, ClaripyValueError
+from ..profiling import profiler, Distribution
@@ -2,12 +2,50 @@
 
 import logging
 import numbers
+import time
 import weakref
 
 l = logging.getLogger("claripy.frontends.replacement_frontend")
 
 from .constrained_frontend import ConstrainedFrontend
 
+
+class ReplacementCache(weakref.WeakKeyDictionary):
+    """
+    The replacements of a ReplacementFrontend, along with the rewrites that `replace_dict()` stored in it, keyed by
+    cache key. Rewrites are indexed by the variables of the rewritten AST, so that a new replacement only drops the
+    rewrites that could contain the replaced AST. Both are weak, so that a rewrite goes away with the rewritten AST.
+    """
+
+    def __init__(self, replacements=()):
+        super(ReplacementCache, self).__init__(replacements)
+        # variable -> the cache keys of the rewrites of the ASTs that contain it
+        self._by_var = { }
+        # whether other frontends use this cache too
+        self.shared = False
+
+    def __setitem__(self, k, v):
+        # this is how replace_dict() stores rewrites
+        weakref.WeakKeyDictionary.__setitem__(self, k, v)
+        for var in k.ast.variables:
+            try:
+                self._by_var[var].add(k)
+            except KeyError:
+                self._by_var[var] = weakref.WeakSet((k,))
+
+    def set_replacement(self, k, v):
+        weakref.WeakKeyDictionary.__setitem__(self, k, v)
+
+    def invalidate(self, variables, replacements):
+        """
+        Drops the rewrites of the ASTs that contain any of `variables`, keeping the keys of `replacements`.
+        """
+        for var in variables:
+            for k in list(self._by_var.pop(var, ())):
+                if k not in replacements:
+                    self.pop(k, None)
+
+
 class ReplacementFrontend(ConstrainedFrontend):
     def __init__(self, actual_frontend, allow_symbolic=None, replacements=None, replacement_cache=None, unsafe_replacement=None, complex_auto_replace=None, auto_replace=None, replace_constraints=None, **kwargs):
         super(ReplacementFrontend, self).__init__(**kwargs)
@@ -17,8 +55,10 @@ class ReplacementFrontend(ConstrainedFrontend):
         self._complex_auto_replace = False if complex_auto_replace is None else complex_auto_replace
         self._replace_constraints = False if replace_constraints is None else replace_constraints
         self._unsafe_replacement = False if unsafe_replacement is None else unsafe_replacement
-        self._replacements = {} if replacements is None else replacements
-        self._replacement_cache = weakref.WeakKeyDictionary() if replacement_cache is None else replacement_cache
+        self._replacements = PersistentMap(replacements)
+        # built from the replacements when it is first needed
+        self._replacement_cache = None if replacement_cache is None else ReplacementCache(replacement_cache)
+        self._bounds = BoundsStore()
 
         self._validation_frontend = None
 
@@ -30,8 +70,9 @@ class ReplacementFrontend(ConstrainedFrontend):
         c._complex_auto_replace = self._complex_auto_replace
         c._replace_constraints = self._replace_constraints
         c._unsafe_replacement = self._unsafe_replacement
-        c._replacements = {}
-        c._replacement_cache = weakref.WeakKeyDictionary()
+        c._replacements = PersistentMap()
+        c._replacement_cache = None
+        c._bounds = BoundsStore()
 
         if self._validation_frontend is not None:
             c._validation_frontend = self._validation_frontend.blank_copy()
@@ -46,11 +87,20 @@ class ReplacementFrontend(ConstrainedFrontend):
 
         c._replacements = self._replacements
         c._replacement_cache = self._replacement_cache
+        if self._replacement_cache is not None:
+            self._replacement_cache.shared = True
+        c._bounds = self._bounds.copy()
 
     #
     # Replacements
     #
 
+    @property
+    def _cache(self):
+        if self._replacement_cache is None:
+            self._replacement_cache = ReplacementCache(self._replacements.items())
+        return self._replacement_cache
+
     def add_replacement(self, old, new, invalidate_cache=True, replace=True, promote=True):
         if not isinstance(old, Base):
             return
@@ -58,10 +108,11 @@ class ReplacementFrontend(ConstrainedFrontend):
         if old is new:
             return
 
-        if not replace and old.cache_key in self._replacements:
+        k = old.cache_key
+        if not replace and k in self._replacements:
             return
 
-        if not promote and old.cache_key in self._replacement_cache:
+        if not promote and k in self._cache:
             return
 
         if not isinstance(new, Base):
@@ -72,40 +123,46 @@ class ReplacementFrontend(ConstrainedFrontend):
             else:
                 return
 
-        if invalidate_cache:
-            self._replacements = dict(self._replacements)
-            self._replacement_cache = weakref.WeakKeyDictionary(self._replacements)
+        self._replacements = self._replacements.set(k, new)
 
-        self._replacements[old.cache_key] = new
-        self._replacement_cache[old.cache_key] = new
+        cache = self._replacement_cache
+        if cache is None:
+            return
+        if cache.shared or (invalidate_cache and not old.variables):
+            # the other frontends keep the old cache, and this one builds a new one when it needs it
+            self._replacement_cache = None
+            return
+        if invalidate_cache:
+            cache.invalidate(old.variables, self._replacements)
+        cache.set_replacement(k, new)
 
     def remove_replacements(self, old_entries):
-        self._replacements = {k: v for k, v in self._replacements if k not in old_entries}
-        self._replacement_cache = weakref.WeakKeyDictionary(self._replacements)
+        old_entries = list(old_entries)
+        for k in old_entries:
+            self._replacements = self._replacements.delete(k)
+        self._replacement_cache = None
+        self._bounds.discard(old_entries)
 
     def clear_replacements(self):
-        self._replacements = dict()
-        self._replacement_cache = weakref.WeakKeyDictionary(self._replacements)
+        self._replacements = PersistentMap()
+        self._replacement_cache = None
+        self._bounds = BoundsStore()
 
     def _replacement(self, old):
-        # depressing hack
-        try:
-            if not self._replacement_cache:
-                return old
-        except RuntimeError:
-            if not self._replacement_cache:
-                return old
+        if not self._replacements:
+            return old
 
         if not isinstance(old, Base):
             return old
 
+        cache = self._cache
         try:
-            return self._replacement_cache[old.cache_key]
+            return cache[old.cache_key]
         except KeyError:
             # not found in the cache
-            new = old.replace_dict(self._replacement_cache)
+            new = old.replace_dict(cache)
             if new is not old:
-                self._replacement_cache[old.cache_key] = new
+                cache[old.cache_key] = new
             return new
 
     def _add_solve_result(self, e, er, r):
@@ -123,7 +180,7 @@ class ReplacementFrontend(ConstrainedFrontend):
 
     def downsize(self):
         self._actual_frontend.downsize()
-        self._replacement_cache.clear()
+        self._replacement_cache = None
 
     def __getstate__(self):
         return (
@@ -133,6 +190,7 @@ class ReplacementFrontend(ConstrainedFrontend):
             self._auto_replace,
             self._replace_constraints,
             self._replacements,
+            self._bounds,
             self._actual_frontend,
             self._validation_frontend,
             super().__getstate__()
@@ -146,13 +204,15 @@ class ReplacementFrontend(ConstrainedFrontend):
             self._auto_replace,
             self._replace_constraints,
             self._replacements,
+            self._bounds,
             self._actual_frontend,
             self._validation_frontend,
             base_state
         ) = s
 
         super().__setstate__(base_state)
-        self._replacement_cache = weakref.WeakKeyDictionary(self._replacements)
+        self._replacements = PersistentMap(self._replacements)
+        self._replacement_cache = None
 
     #
     # Replacement solving
@@ -238,6 +298,7 @@ class ReplacementFrontend(ConstrainedFrontend):
 
     def add(self, constraints, **kwargs):
         if self._auto_replace:
+            balancing = 0
             for c in constraints:
                 # the badass thing here would be to use the *replaced* constraint, but
                 # we don't currently support chains of replacements, so we'll do a
@@ -254,7 +315,11 @@ class ReplacementFrontend(ConstrainedFrontend):
                         old, new = rc.args if rc.args[0].symbolic else rc.args[::-1]
                         self.add_replacement(old, new, replace=False, promote=True, invalidate_cache=True)
                 else:
-                    satisfiable, replacements = Balancer(backends.vsa, rc, validation_frontend=self._validation_frontend).compat_ret
+                    start = time.perf_counter()
+                    satisfiable, replacements = balance(
+                        backends.vsa, rc, validation_frontend=self._validation_frontend, bounds=self._bounds
+                    )
+                    balancing += time.perf_counter() - start
                     if not satisfiable:
                         self.add_replacement(rc, false)
                     for old, new in replacements:
@@ -265,7 +330,13 @@ class ReplacementFrontend(ConstrainedFrontend):
                         if rold.cardinality == 1:
                             continue
 
-                        self.add_replacement(old, rold.intersection(new))
+                        # the bounds of earlier constraints are folded into a single intersection
+                        if rold is not old and rold is not self._bounds.get(old):
+                            new = rold.intersection(new)
+                        self.add_replacement(old, self._bounds.tighten(old, new))
+
+            if self._complex_auto_replace and profiler.enabled:
+                profiler.record_time('ReplacementFrontend.balance', balancing)
 
         added = super(ReplacementFrontend, self).add(constraints, **kwargs)
         cr = self._replace_list(added)
@@ -281,5 +352,7 @@ from ..ast.base import Base
 from ..ast.bv import BVV
 from ..ast.bool import BoolV, false
 from ..errors import ClaripyFrontendError, BackendError
-from ..balancer import Balancer
+from ..balancer import balance, BoundsStore
+from ..utils import PersistentMap
+from ..profiling import profiler
 from ..backend_manager import backends
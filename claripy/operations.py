@@ -37,29 +37,44 @@ def op(name, arg_types, return_type, extra_check=None, calc_length=None, do_coer
             else:
                 yield arg
 
+    has_preprocessor = name in preprocessors
+    fast_check = _fast_arg_check(arg_types, extra_check)
+
     def _op(*args):
-        fixed_args = tuple(_type_fixer(args))
-        for i in fixed_args:
-            if i is NotImplemented:
-                return NotImplemented
-        if extra_check is not None:
-            success, msg = extra_check(*fixed_args)
-            if not success:
-                raise ClaripyOperationError(msg)
+        if fast_check(args):
+            # every argument already has the right type (and, if that is all the extra check checks, length)
+            fixed_args = args
+            if extra_check is not None and fast_check.needs_extra_check:
+                success, msg = extra_check(*fixed_args)
+                if not success:
+                    raise ClaripyOperationError(msg)
+        else:
+            fixed_args = tuple(_type_fixer(args))
+            for i in fixed_args:
+                if i is NotImplemented:
+                    return NotImplemented
+            if extra_check is not None:
+                success, msg = extra_check(*fixed_args)
+                if not success:
+                    raise ClaripyOperationError(msg)
 
         #pylint:disable=too-many-nested-blocks
-        simp = _handle_annotations(simplifications.simpleton.simplify(name, fixed_args), args)
+        simp = simplifications.simpleton.simplify(name, fixed_args)
         if simp is not None:
-            return simp
+            simp = _handle_annotations(simp, args)
+            if simp is not None:
+                return simp
 
         kwargs = {}
         if calc_length is not None:
             kwargs['length'] = calc_length(*fixed_args)
 
         kwargs['uninitialized'] = None
-        if any(a.uninitialized is True for a in args if isinstance(a, ast.Base)):
-            kwargs['uninitialized'] = True
-        if name in preprocessors:
+        for a in args:
+            if isinstance(a, ast.Base) and a._uninitialized is True:
+                kwargs['uninitialized'] = True
+                break
+        if has_preprocessor:
             args, kwargs = preprocessors[name](*args, **kwargs)
 
         return return_type(name, fixed_args, **kwargs)
@@ -67,6 +82,45 @@ def op(name, arg_types, return_type, extra_check=None, calc_length=None, do_coer
     _op.calc_length = calc_length
     return _op
 
+def _fast_arg_check(arg_types, extra_check):
+    """
+    Returns a function that checks, without coercing anything, that the arguments to an operation already have the
+    right types. If the extra check of the operation is the usual length check of binary operations, the function
+    checks the lengths too, and its `needs_extra_check` attribute is False.
+    """
+    if type(arg_types) is type: #pylint:disable=unidiomatic-typecheck
+        def check(args):
+            for a in args:
+                if not isinstance(a, arg_types):
+                    return False
+            return True
+    elif len(arg_types) == 1:
+        t0, = arg_types
+        check = lambda args: len(args) == 1 and isinstance(args[0], t0)
+    elif len(arg_types) == 2:
+        t0, t1 = arg_types
+        if extra_check is length_same_check:
+            check = lambda args: len(args) == 2 and isinstance(args[0], t0) and isinstance(args[1], t1) and \
+                args[0].length == args[1].length
+            check.needs_extra_check = False
+            return check
+        check = lambda args: len(args) == 2 and isinstance(args[0], t0) and isinstance(args[1], t1)
+    elif len(arg_types) == 3:
+        t0, t1, t2 = arg_types
+        check = lambda args: len(args) == 3 and isinstance(args[0], t0) and isinstance(args[1], t1) and \
+            isinstance(args[2], t2)
+    else:
+        def check(args):
+            if len(args) != len(arg_types):
+                return False
+            for a, t in zip(args, arg_types):
+                if not isinstance(a, t):
+                    return False
+            return True
+
+    check.needs_extra_check = True
+    return check
+
 def _handle_annotations(simp, args):
     if simp is None:
         return None
@@ -0,0 +1,184 @@
+"""
+Structured, low-overhead profiling of frontends and backends.
+
+Profiling is off by default. When it is off, every instrumented site costs a single attribute check on the global
+:data:`profiler`. Turn it on with ``claripy.profiling.profiler.enable()``, run a workload, and export the collected
+data with :meth:`Profiler.snapshot` (a dict) or :meth:`Profiler.to_json`.
+
+Three kinds of data are collected:
+
+- timings:  call latencies of frontend methods (from :class:`claripy.frontend_mixins.ProfilingMixin`) and backend
+            primitives (conversion, solver checks, simplification...), keyed by ``<class name>.<method>``.
+- values:   other distributions, such as the number of constraints a frontend held when it was queried.
+- counters: plain event counts, such as hits and misses of the model cache, the sat cache and the composite cache.
+            Counters named ``<cache>.hit`` and ``<cache>.miss`` are summarized into hit rates in the snapshot.
+"""
+
+import collections
+import functools
+import json
+import random
+import threading
+import time
+
+
+def pick_percentile(s, q):
+    """
+    Returns the `q`-quantile (between 0 and 1) of the sorted list `s`, or None if it is empty.
+    """
+    if not s:
+        return None
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+
+class Distribution:
+    """
+    Count, sum and extremes of a series of values, plus a bounded reservoir sample for percentiles.
+    """
+
+    __slots__ = ('count', 'total', 'min', 'max', '_samples', '_max_samples')
+
+    def __init__(self, max_samples=4096):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self._samples = [ ]
+        self._max_samples = max_samples
+
+    def add(self, v):
+        self.count += 1
+        self.total += v
+        if self.min is None or v < self.min:
+            self.min = v
+        if self.max is None or v > self.max:
+            self.max = v
+
+        if len(self._samples) < self._max_samples:
+            self._samples.append(v)
+        else:
+            i = random.randrange(self.count)
+            if i < self._max_samples:
+                self._samples[i] = v
+
+    def percentile(self, p):
+        """
+        Returns the (approximate) `p`-th percentile, where `p` is between 0 and 100.
+        """
+        return pick_percentile(sorted(self._samples), p / 100.0)
+
+    def to_dict(self):
+        s = sorted(self._samples)
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': pick_percentile(s, 0.50),
+            'p90': pick_percentile(s, 0.90),
+            'p99': pick_percentile(s, 0.99),
+        }
+
+
+class Profiler:
+    """
+    Collects timings, value distributions and counters. Use the global :data:`profiler` instance.
+    """
+
+    def __init__(self, max_samples=4096):
+        self.enabled = False
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+        self.timings = { }
+        self.values = { }
+        self.counters = collections.Counter()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.timings = { }
+            self.values = { }
+            self.counters = collections.Counter()
+
+    #
+    # Collection
+    #
+
+    def _add(self, table, name, v):
+        with self._lock:
+            try:
+                d = table[name]
+            except KeyError:
+                d = table[name] = Distribution(max_samples=self._max_samples)
+            d.add(v)
+
+    def record_time(self, name, elapsed):
+        self._add(self.timings, name, elapsed)
+
+    def record_value(self, name, v):
+        self._add(self.values, name, v)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    #
+    # Export
+    #
+
+    def hit_rates(self):
+        """
+        Returns a dict of cache name to its hit rate, for every cache with `.hit` or `.miss` counters.
+        """
+        caches = { k.rsplit('.', 1)[0] for k in self.counters if k.endswith('.hit') or k.endswith('.miss') }
+        rates = { }
+        for c in caches:
+            hits = self.counters[c + '.hit']
+            misses = self.counters[c + '.miss']
+            rates[c] = hits / (hits + misses) if hits + misses else None
+        return rates
+
+    def snapshot(self):
+        """
+        Returns all the collected data as a dict of plain Python values.
+        """
+        with self._lock:
+            timings = { k: v.to_dict() for k,v in self.timings.items() }
+            values = { k: v.to_dict() for k,v in self.values.items() }
+            counters = dict(self.counters)
+        return {
+            'timings': timings,
+            'values': values,
+            'counters': counters,
+            'hit_rates': self.hit_rates(),
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.snapshot(), sort_keys=True, **kwargs)
+
+profiler = Profiler()
+
+
+def profiled(f):
+    """
+    Decorates a method so that, when profiling is enabled, its latency is recorded as ``<class name>.<method name>``.
+    """
+    name = f.__name__
+
+    @functools.wraps(f)
+    def profiled_method(self, *args, **kwargs):
+        if not profiler.enabled:
+            return f(self, *args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return f(self, *args, **kwargs)
+        finally:
+            profiler.record_time(type(self).__name__ + '.' + name, time.perf_counter() - start)
+    return profiled_method
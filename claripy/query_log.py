@@ -0,0 +1,356 @@
+"""
+Recording and offline replay of frontend workloads.
+
+A :class:`QueryLog` receives every call made on a frontend that uses the
+:class:`claripy.frontend_mixins.QueryRecorderMixin`, and pickles it into a single stream. The stream shares a pickle
+memo between records, so ASTs that show up in several calls (which is nearly all of them) are only written once.
+
+A recorded log can be replayed against any solver stack with :func:`replay_query_log`, or from the command line::
+
+    python -m claripy.query_log trace.qlog --solver SolverComposite
+"""
+
+import collections
+import io
+import logging
+import pickle
+import threading
+import time
+
+l = logging.getLogger("claripy.query_log")
+
+# written into the stream whenever the writer drops its pickle memo, so that the reader can start over as well
+_CLEAR_MEMO = '__claripy_query_log_clear_memo__'
+
+# methods whose results do not depend on the order in which a solver returns models
+_DETERMINISTIC_METHODS = { 'satisfiable', 'check_satisfiability', 'min', 'max', 'solution', 'is_true', 'is_false' }
+_SOLUTION_METHODS = { 'eval', 'batch_eval' }
+
+
+class QueryRecord:
+    """
+    A single recorded frontend call.
+
+    :ivar frontend_id:  The id of the frontend that the call was made on.
+    :ivar method:       The name of the frontend method.
+    :ivar args:         The positional arguments of the call.
+    :ivar kwargs:       The keyword arguments of the call.
+    :ivar result:       The value returned by the call, or None if it raised.
+    :ivar exception:    The class of the exception raised by the call, or None.
+    :ivar elapsed:      The wall time of the call, in seconds.
+    """
+
+    __slots__ = ('frontend_id', 'method', 'args', 'kwargs', 'result', 'exception', 'elapsed')
+
+    def __init__(self, frontend_id, method, args, kwargs, result, exception, elapsed):
+        self.frontend_id = frontend_id
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.result = result
+        self.exception = exception
+        self.elapsed = elapsed
+
+    def __getstate__(self):
+        return (self.frontend_id, self.method, self.args, self.kwargs, self.result, self.exception, self.elapsed)
+
+    def __setstate__(self, s):
+        self.frontend_id, self.method, self.args, self.kwargs, self.result, self.exception, self.elapsed = s
+
+    def __repr__(self):
+        return "<QueryRecord %d.%s %.6fs>" % (self.frontend_id, self.method, self.elapsed)
+
+
+class FrontendRef:
+    """
+    Stands in for a recorded frontend when a log is read back.
+    """
+
+    __slots__ = ('id',)
+
+    def __init__(self, frontend_id):
+        self.id = frontend_id
+
+    def __eq__(self, other):
+        return type(other) is FrontendRef and self.id == other.id
+
+    def __hash__(self):
+        return hash((FrontendRef, self.id))
+
+    def __repr__(self):
+        return "<FrontendRef %d>" % self.id
+
+
+class _Pickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        recorder_id = getattr(obj, '_recorder_id', None)
+        if recorder_id is not None and isinstance(obj, Frontend):
+            return recorder_id
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        return FrontendRef(pid)
+
+
+class QueryLog:
+    """
+    A compact, append-only log of frontend calls.
+
+    The pickle memo keeps every recorded object alive, so it is dropped every `memo_limit` records to bound the memory
+    held by a long recording.
+    """
+
+    def __init__(self, f, memo_limit=100000):
+        """
+        :param f:           A path, or a binary file object, to write the log to.
+        :param memo_limit:  The number of records after which the shared pickle memo is dropped.
+        """
+        if isinstance(f, str):
+            self._file = open(f, 'wb')
+            self._owns_file = True
+        else:
+            self._file = f
+            self._owns_file = False
+
+        # records are pickled here first, so that a record that fails halfway never reaches the file
+        self._buffer = io.BytesIO()
+        self._pickler = _Pickler(self._buffer, pickle.HIGHEST_PROTOCOL)
+        self._lock = threading.Lock()
+        self._memo_limit = memo_limit
+        self._since_clear = 0
+        self.records = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record(self, frontend, method, args, kwargs, result, exception, elapsed):
+        """
+        Appends a call to the log. If the call cannot be pickled, recording is turned off rather than corrupting the
+        stream.
+        """
+        if self._pickler is None:
+            return
+
+        r = QueryRecord(frontend._recorder_id, method, args, kwargs, result, exception, elapsed)
+        with self._lock:
+            try:
+                if self._since_clear >= self._memo_limit:
+                    self._pickler.dump(_CLEAR_MEMO)
+                    self._pickler.clear_memo()
+                    self._since_clear = 0
+                self._pickler.dump(r)
+            except (pickle.PicklingError, TypeError, AttributeError, RecursionError):
+                # the memo may refer to objects that were never written, so the stream ends here
+                l.error("Unable to pickle a call to %s(). Recording is disabled from here on.", method, exc_info=True)
+                self._pickler = None
+                self._buffer = None
+                return
+            self._file.write(self._buffer.getbuffer())
+            self._buffer.seek(0)
+            self._buffer.truncate()
+            self._since_clear += 1
+            self.records += 1
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._pickler = None
+            if self._owns_file:
+                self._file.close()
+            else:
+                self._file.flush()
+
+
+def read_query_log(f):
+    """
+    Iterates over the records of a query log. Recorded frontends are represented by :class:`FrontendRef` objects.
+
+    :param f:   A path, or a binary file object, to read the log from.
+    """
+    if isinstance(f, str):
+        with open(f, 'rb') as fp:
+            yield from read_query_log(fp)
+        return
+
+    unpickler = _Unpickler(f)
+    while True:
+        try:
+            r = unpickler.load()
+        except EOFError:
+            return
+        if type(r) is str and r == _CLEAR_MEMO:
+            unpickler = _Unpickler(f)
+            continue
+        yield r
+
+#
+# Replay
+#
+
+def _percentiles(latencies):
+    if not latencies:
+        return { 'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0 }
+
+    s = sorted(latencies)
+    return { 'p50': pick_percentile(s, 0.50), 'p90': pick_percentile(s, 0.90), 'p99': pick_percentile(s, 0.99),
+             'max': s[-1] }
+
+
+class ReplayStats:
+    """
+    Timing and agreement statistics for a replayed log.
+
+    :ivar latencies:            A dict of method name to the list of replayed call latencies.
+    :ivar recorded_latencies:   A dict of method name to the list of recorded call latencies.
+    :ivar mismatches:           The number of calls whose outcome differed from the recorded one.
+    :ivar wall_time:            The total time spent in replayed calls.
+    """
+
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.recorded_latencies = collections.defaultdict(list)
+        self.mismatches = 0
+        self.wall_time = 0.0
+
+    @property
+    def queries(self):
+        return sum(len(v) for v in self.latencies.values())
+
+    def report(self):
+        """
+        Returns the statistics as a dict of plain Python values, suitable for JSON encoding.
+        """
+        everything = [ t for v in self.latencies.values() for t in v ]
+        recorded = [ t for v in self.recorded_latencies.values() for t in v ]
+        return {
+            'queries': len(everything),
+            'wall_time': self.wall_time,
+            'throughput': len(everything) / self.wall_time if self.wall_time else 0.0,
+            'latency': _percentiles(everything),
+            'recorded_latency': _percentiles(recorded),
+            'mismatches': self.mismatches,
+            'methods': {
+                m: dict(count=len(v), total=sum(v), **_percentiles(v)) for m,v in sorted(self.latencies.items())
+            },
+        }
+
+
+class QueryReplayer:
+    """
+    Replays recorded frontend calls against a solver stack.
+    """
+
+    def __init__(self, solver_factory):
+        """
+        :param solver_factory:  A callable returning a new, empty frontend. It is called for every root frontend
+                                created in the recording.
+        """
+        self._solver_factory = solver_factory
+        self._frontends = { }
+        self.stats = ReplayStats()
+
+    def _resolve(self, o):
+        if type(o) is FrontendRef:
+            try:
+                return self._frontends[o.id]
+            except KeyError:
+                l.warning("Frontend %d was used before it was created in the recording. Starting it empty.", o.id)
+                f = self._frontends[o.id] = self._solver_factory()
+                return f
+        elif type(o) in (tuple, list):
+            return type(o)(self._resolve(a) for a in o)
+        else:
+            return o
+
+    def _bind(self, recorded, actual):
+        if type(recorded) is FrontendRef:
+            self._frontends[recorded.id] = actual
+        elif type(recorded) in (tuple, list) and type(actual) in (tuple, list) and len(recorded) == len(actual):
+            for r,a in zip(recorded, actual):
+                self._bind(r, a)
+
+    @staticmethod
+    def _agrees(record, result, exception):
+        if record.exception is not None or exception is not None:
+            return exception is not None and record.exception is type(exception)
+        if record.method in _DETERMINISTIC_METHODS:
+            return record.result == result
+        if record.method in _SOLUTION_METHODS:
+            return len(record.result) == len(result)
+        return True
+
+    def replay(self, records):
+        """
+        Replays an iterable of :class:`QueryRecord` objects.
+
+        :return:    The :class:`ReplayStats` of this replayer.
+        """
+        for r in records:
+            if r.method == '__init__':
+                self._frontends[r.frontend_id] = self._solver_factory()
+                continue
+
+            frontend = self._resolve(FrontendRef(r.frontend_id))
+            args = self._resolve(r.args)
+            kwargs = { k: self._resolve(v) for k,v in r.kwargs.items() }
+
+            exception = None
+            result = None
+            start = time.perf_counter()
+            try:
+                result = getattr(frontend, r.method)(*args, **kwargs)
+            except ClaripyError as e:
+                exception = e
+            elapsed = time.perf_counter() - start
+
+            self._bind(r.result, result)
+            self.stats.latencies[r.method].append(elapsed)
+            self.stats.recorded_latencies[r.method].append(r.elapsed)
+            self.stats.wall_time += elapsed
+            if not self._agrees(r, result, exception):
+                l.debug("Replayed %r disagrees with the recording", r)
+                self.stats.mismatches += 1
+
+        return self.stats
+
+
+def replay_query_log(f, solver_factory=None):
+    """
+    Replays a query log against a solver stack.
+
+    :param f:               A path, or a binary file object, to read the log from.
+    :param solver_factory:  A callable returning a new, empty frontend (default: :class:`claripy.Solver`).
+    :return:                A :class:`ReplayStats`.
+    """
+    if solver_factory is None:
+        solver_factory = solvers.Solver
+    return QueryReplayer(solver_factory).replay(read_query_log(f))
+
+
+def _main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Replay a claripy query log and report its throughput and latency.")
+    parser.add_argument('log', help="the query log to replay")
+    parser.add_argument('--solver', default='Solver', help="the claripy solver class to replay against")
+    args = parser.parse_args(argv)
+
+    stats = replay_query_log(args.log, solver_factory=getattr(solvers, args.solver))
+    print(json.dumps(stats.report(), indent=4, sort_keys=True))
+
+from .errors import ClaripyError
+from .frontend import Frontend
+from .profiling import pick_percentile
+from . import solvers
+
+if __name__ == '__main__':
+    _main()
@@ -4,40 +4,301 @@ import operator
 
 from functools import reduce
 
+from .utils import LRUMemo
+
+
+class Match:
+    """
+    A pattern for a single argument of an operation: an AST whose op is one of `ops` (any AST, if `ops` is None) and
+    whose length is `length` (any length, if `length` is None).
+    """
+
+    __slots__ = ('ops', 'length')
+
+    def __init__(self, ops=None, length=None):
+        self.ops = frozenset((ops,) if isinstance(ops, str) else ops) if ops is not None else None
+        self.length = length
+
+    def matches(self, a):
+        if self.ops is not None and (not isinstance(a, ast.Base) or a.op not in self.ops):
+            return False
+        if self.length is not None and getattr(a, 'length', None) != self.length:
+            return False
+        return True
+
+
+class Rule:
+    """
+    A rewrite rule for the operations in `ops`. If the arguments match `pattern`, `rewrite(*args)` is called, and
+    returns the rewritten AST, or None if the rule does not apply after all.
+
+    `pattern` is None (any arguments) or a tuple with an entry for each argument, which is None (anything), a Match,
+    an op name, or a tuple of op names.
+    """
+
+    __slots__ = ('name', 'ops', 'pattern', 'rewrite', 'enabled', 'tries', 'hits')
+
+    def __init__(self, name, ops, pattern, rewrite):
+        self.name = name
+        self.ops = (ops,) if isinstance(ops, str) else tuple(ops)
+        if pattern is not None:
+            pattern = tuple(m if m is None or isinstance(m, Match) else Match(ops=m) for m in pattern)
+        self.pattern = pattern
+        self.rewrite = rewrite
+        self.enabled = True
+        self.tries = 0
+        self.hits = 0
+
+    def __repr__(self):
+        return '<Rule %s on %s>' % (self.name, ', '.join(self.ops))
+
+    def tested_ops(self, pos):
+        """
+        Returns the ops that this rule requires argument `pos` to have, or None if it takes any.
+        """
+        if self.pattern is None or pos >= len(self.pattern) or self.pattern[pos] is None:
+            return None
+        return self.pattern[pos].ops
+
+    def matches(self, args):
+        if self.pattern is None:
+            return True
+        if len(args) != len(self.pattern):
+            return False
+        for m, a in zip(self.pattern, args):
+            if m is not None and not m.matches(a):
+                return False
+        return True
+
+
+class SimplificationMemo(LRUMemo):
+    """
+    A bounded LRU memo of simplification results, keyed by the op and the hashes of the arguments. Operations that
+    cannot be simplified are remembered too.
+
+    AST hashes cover annotations, so the same operation over differently annotated arguments is a different entry. An
+    entry also holds on to the annotations of its arguments, so that an annotation that is hashed by identity cannot
+    be collected and have its identity reused while an entry depends on it.
+    """
+
+    def __init__(self, maxsize=0x10000):
+        super().__init__(maxsize)
+
+    @staticmethod
+    def key(op, args):
+        """
+        Returns the memo key for an operation, or None if it cannot be memoized.
+        """
+        key = [ op ]
+        for a in args:
+            if isinstance(a, ast.Base):
+                key.append(a._hash)
+            else:
+                # a plain value (e.g., the bounds of an Extract)
+                key.append((type(a), a))
+        key = tuple(key)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def lookup(self, key):
+        """
+        Returns a tuple of whether the operation was memoized, and its simplification (None if it is not simplifiable).
+        """
+        r = self.get(key)
+        if r is None:
+            return False, None
+        return True, r[0]
+
+    def store(self, key, args, result):
+        pins = tuple(a.annotations for a in args if isinstance(a, ast.Base) and a.annotations) or None
+        self.put(key, (result, pins))
+
 
 class SimplificationManager:
-    def __init__(self):
-        self._simplifiers = {
-            'Reverse': self.bv_reverse_simplifier,
-            'And': self.boolean_and_simplifier,
-            'Or': self.boolean_or_simplifier,
-            'Not': self.boolean_not_simplifier,
-            'Extract': self.extract_simplifier,
-            'Concat': self.concat_simplifier,
-            'If': self.if_simplifier,
-            '__lshift__': self.lshift_simplifier,
-            '__rshift__': self.rshift_simplifier,
-            'LShR': self.lshr_simplifier,
-            '__eq__': self.eq_simplifier,
-            '__ne__': self.ne_simplifier,
-            '__or__': self.bitwise_or_simplifier,
-            '__and__': self.bitwise_and_simplifier,
-            '__xor__': self.bitwise_xor_simplifier,
-            '__add__': self.bitwise_add_simplifier,
-            '__sub__': self.bitwise_sub_simplifier,
-            '__mul__': self.bitwise_mul_simplifier,
-            'ZeroExt': self.zeroext_simplifier,
-            'SignExt': self.signext_simplifier,
-            'fpToIEEEBV': self.fptobv_simplifier,
-            'fpToFP': self.fptofp_simplifier,
-            'StrExtract': self.str_extract_simplifier,
-            'StrReverse': self.str_reverse_simplifier,
+    """
+    Simplifies operations, as they are created, with a set of rewrite rules.
+
+    The rules of each operation are compiled into a decision tree over the ops of its arguments, so that only the rules
+    whose patterns match are tried, in the order in which they were added. The first rule that rewrites the operation
+    wins. Every rule counts how often it was tried and how often it applied, and can be disabled.
+
+    Results are memoized (see SimplificationMemo), so the rules only see each distinct operation once while it stays in
+    the memo. Changing the rules clears the memo.
+    """
+
+    def __init__(self, memo_size=0x10000):
+        self._rules = [ ]
+        self._rules_by_name = { }
+        self._trees = None
+        self.memo = SimplificationMemo(memo_size) if memo_size else None
+
+        for rule in self._default_rules():
+            self.add_rule(rule)
+
+    def add_rule(self, rule):
+        if rule.name in self._rules_by_name:
+            raise ValueError("There already is a rule named %s" % rule.name)
+        self._rules.append(rule)
+        self._rules_by_name[rule.name] = rule
+        self._rules_changed()
+
+    @property
+    def rules(self):
+        return list(self._rules)
+
+    def enable(self, name):
+        self._rules_by_name[name].enabled = True
+        self._rules_changed()
+
+    def disable(self, name):
+        self._rules_by_name[name].enabled = False
+        self._rules_changed()
+
+    def _rules_changed(self):
+        self._trees = None
+        if self.memo is not None:
+            self.memo.clear()
+
+    def rule_stats(self):
+        """
+        Returns a dict of rule name to a dict with the number of times the rule was `tried` (its pattern matched), the
+        number of `hits` (it rewrote the operation), and whether it is `enabled`.
+        """
+        return { r.name: { 'tries': r.tries, 'hits': r.hits, 'enabled': r.enabled } for r in self._rules }
+
+    def reset_stats(self):
+        for r in self._rules:
+            r.tries = 0
+            r.hits = 0
+
+    @staticmethod
+    def _compile(rules, tested=()):
+        """
+        Builds the decision tree for a list of rules. A leaf is the list of the rules to try, in order, and a node is a
+        tuple of the position of the argument to test, a dict of op to subtree, and the subtree for any other op.
+        """
+        counts = collections.Counter(
+            pos for r in rules if r.pattern is not None
+            for pos in range(len(r.pattern)) if pos not in tested and r.tested_ops(pos) is not None
+        )
+        if not counts:
+            return rules
+
+        # test the argument that most rules look at first
+        pos = max(counts, key=lambda p: (counts[p], -p))
+        tested = tested + (pos,)
+        keys = set(itertools.chain.from_iterable(r.tested_ops(pos) for r in rules if r.tested_ops(pos) is not None))
+        branches = {
+            k: SimplificationManager._compile([ r for r in rules if r.tested_ops(pos) is None or k in r.tested_ops(pos) ], tested)
+            for k in keys
         }
+        default = SimplificationManager._compile([ r for r in rules if r.tested_ops(pos) is None ], tested)
+        return (pos, branches, default)
+
+    def _build_trees(self):
+        by_op = collections.defaultdict(list)
+        for r in self._rules:
+            if r.enabled:
+                for op in r.ops:
+                    by_op[op].append(r)
+        self._trees = { op: self._compile(rules) for op, rules in by_op.items() }
+        return self._trees
 
     def simplify(self, op, args):
-        if op not in self._simplifiers:
+        trees = self._trees if self._trees is not None else self._build_trees()
+        node = trees.get(op, None)
+        if node is None:
             return None
-        return self._simplifiers[op](*args)
+
+        memo = self.memo
+        if memo is None:
+            return self._apply(node, args)
+        key = memo.key(op, args)
+        if key is None:
+            return self._apply(node, args)
+
+        found, r = memo.lookup(key)
+        if not found:
+            r = self._apply(node, args)
+            memo.store(key, args, r)
+        return r
+
+    @staticmethod
+    def _apply(node, args):
+        while type(node) is tuple:
+            pos, branches, default = node
+            a = args[pos] if pos < len(args) else None
+            node = branches.get(a.op, default) if isinstance(a, ast.Base) else default
+
+        for rule in node:
+            if rule.matches(args):
+                rule.tries += 1
+                r = rule.rewrite(*args)
+                if r is not None:
+                    rule.hits += 1
+                    return r
+        return None
+
+    @staticmethod
+    def _default_rules():
+        S = SimplificationManager
+        all_ops = lambda: ast.all_operations
+        return [
+            Rule('reverse_reverse', 'Reverse', ('Reverse',), lambda body: body.args[0]),
+            Rule('reverse_byte', 'Reverse', (Match(length=8),), lambda body: body),
+            Rule('reverse_concat', 'Reverse', ('Concat',), S.bv_reverse_concat_simplifier),
+            Rule('reverse_extract_reverse', 'Reverse', ('Extract',), S.bv_reverse_extract_simplifier),
+
+            Rule('and', 'And', None, S.boolean_and_simplifier),
+            Rule('or', 'Or', None, S.boolean_or_simplifier),
+
+            Rule('not_eq', 'Not', ('__eq__',), lambda body: body.args[0] != body.args[1]),
+            Rule('not_ne', 'Not', ('__ne__',), lambda body: body.args[0] == body.args[1]),
+            Rule('not_not', 'Not', ('Not',), lambda body: body.args[0]),
+            Rule('not_if', 'Not', ('If',), lambda body: all_ops().If(body.args[0], body.args[2], body.args[1])),
+            Rule('not_comparison', 'Not', (tuple(inverted_comparisons),),
+                 lambda body: getattr(all_ops(), inverted_comparisons[body.op])(body.args[0], body.args[1])),
+
+            Rule('extract_whole', 'Extract', None, S.extract_whole_simplifier),
+            Rule('extract_ext', 'Extract', (None, None, ('SignExt', 'ZeroExt')), S.extract_ext_simplifier),
+            Rule('extract_extract', 'Extract', (None, None, 'Extract'), S.extract_extract_simplifier),
+            Rule('extract', 'Extract', None, S.extract_simplifier),
+
+            Rule('concat', 'Concat', None, S.concat_simplifier),
+            Rule('if_concrete_cond', 'If', None, S.if_simplifier),
+
+            Rule('shift_by_zero', ('__lshift__', '__rshift__', 'LShR'), None, S.shift_by_zero_simplifier),
+            Rule('shift_out_concat', ('__rshift__', 'LShR'), ('Concat', None), S.shift_out_concat_simplifier),
+            Rule('shift_out_zeroext', ('__rshift__', 'LShR'), ('ZeroExt', None), S.shift_out_zeroext_simplifier),
+
+            Rule('eq', '__eq__', None, S.eq_simplifier),
+            Rule('ne', '__ne__', None, S.ne_simplifier),
+
+            Rule('bitwise_or_identity', '__or__', None, S.bitwise_or_simplifier),
+            Rule('bitwise_or_flatten', '__or__', None, S.bitwise_or_flatten_simplifier),
+            Rule('rotate_shift_mask', '__and__', ('__or__', 'BVV'), S.rotate_shift_mask_simplifier),
+            Rule('bitwise_and_identity', '__and__', None, S.bitwise_and_simplifier),
+            Rule('bitwise_and_flatten', '__and__', None, S.bitwise_and_flatten_simplifier),
+            Rule('bitwise_xor_identity', '__xor__', None, S.bitwise_xor_simplifier),
+            Rule('bitwise_xor_minmax', '__xor__', None, S.bitwise_xor_simplifier_minmax),
+            Rule('bitwise_xor_flatten', '__xor__', None, S.bitwise_xor_flatten_simplifier),
+            Rule('bitwise_add_zero', '__add__', None, S.bitwise_add_simplifier),
+            Rule('bitwise_add_flatten', '__add__', None, S.bitwise_add_flatten_simplifier),
+            Rule('bitwise_sub', '__sub__', None, S.bitwise_sub_simplifier),
+            Rule('bitwise_mul_flatten', '__mul__', None, S.bitwise_mul_simplifier),
+
+            Rule('extend_by_zero', ('ZeroExt', 'SignExt'), None, lambda n, e: e if n == 0 else None),
+            Rule('zeroext_zeroext', 'ZeroExt', (None, 'ZeroExt'), S.zeroext_simplifier),
+
+            Rule('fptobv_fptofp', 'fpToIEEEBV', ('fpToFP',), S.fptobv_simplifier),
+            Rule('fptofp_fptobv', 'fpToFP', ('fpToIEEEBV', None), S.fptofp_simplifier),
+
+            Rule('str_extract', 'StrExtract', None, S.str_extract_simplifier),
+            Rule('str_reverse', 'StrReverse', None, S.str_reverse_simplifier),
+        ]
 
     #
     # The simplifiers.
@@ -135,27 +396,20 @@ class SimplificationManager:
         return
 
     @staticmethod
-    def rshift_simplifier(val, shift):
+    def shift_by_zero_simplifier(val, shift):
         if (shift == 0).is_true():
             return val
-        if val.op == "Concat" and (val.args[0] == 0).is_true() and (shift > val.size() - val.args[0].size()).is_true():
-            return ast.all_operations.BVV(0, val.size())
-        if val.op == "ZeroExt" and (shift > val.size() - val.args[0]).is_true():
-            return ast.all_operations.BVV(0, val.size())
 
     @staticmethod
-    def lshr_simplifier(val, shift):
-        if (shift == 0).is_true():
-            return val
-        if val.op == "Concat" and (val.args[0] == 0).is_true() and (shift > val.size() - val.args[0].size()).is_true():
-            return ast.all_operations.BVV(0, val.size())
-        if val.op == "ZeroExt" and (shift > val.size() - val.args[0]).is_true():
+    def shift_out_concat_simplifier(val, shift):
+        # the shift drops everything but the zeros on top
+        if (val.args[0] == 0).is_true() and (shift > val.size() - val.args[0].size()).is_true():
             return ast.all_operations.BVV(0, val.size())
 
     @staticmethod
-    def lshift_simplifier(val, shift):
-        if (shift == 0).is_true():
-            return val
+    def shift_out_zeroext_simplifier(val, shift):
+        if (shift > val.size() - val.args[0]).is_true():
+            return ast.all_operations.BVV(0, val.size())
 
     @staticmethod
     def eq_simplifier(a, b):
@@ -258,38 +512,30 @@ class SimplificationManager:
                     return ast.all_operations.true
 
     @staticmethod
-    def bv_reverse_simplifier(body):
-        if body.op == 'Reverse':
-            # Reverse(Reverse(x)) ==> x
-            return body.args[0]
+    def bv_reverse_concat_simplifier(body):
+        if all(a.op == 'Extract' for a in body.args):
+            first_ast = body.args[0].args[2]
+            for i,a in enumerate(body.args):
+                if not (first_ast is a.args[2]
+                        and a.args[0] == ((i + 1) * 8 - 1)
+                        and a.args[1] == i * 8):
+                    break
+            else:
+                upper_bound = body.args[-1].args[0]
+                if first_ast.length == upper_bound + 1:
+                    return first_ast
+                else:
+                    return first_ast[upper_bound:0]
+        if all(a.length == 8 for a in body.args):
+            return body.make_like(body.op, body.args[::-1], simplify=True)
 
-        if body.length == 8:
-            # Reverse(byte) ==> byte
-            return body
+        if all(a.op == 'Reverse' for a in body.args):
+            if all(a.length % 8 == 0 for a in body.args):
+                return body.make_like(body.op, [a.args[0] for a in reversed(body.args)], simplify=True)
 
-        if body.op == 'Concat':
-            if all(a.op == 'Extract' for a in body.args):
-                first_ast = body.args[0].args[2]
-                for i,a in enumerate(body.args):
-                    if not (first_ast is a.args[2]
-                            and a.args[0] == ((i + 1) * 8 - 1)
-                            and a.args[1] == i * 8):
-                        break
-                else:
-                    upper_bound = body.args[-1].args[0]
-                    if first_ast.length == upper_bound + 1:
-                        return first_ast
-                    else:
-                        return first_ast[upper_bound:0]
-            if all(a.length == 8 for a in body.args):
-                return body.make_like(body.op, body.args[::-1], simplify=True)
-
-        if body.op == 'Concat':
-            if all(a.op == 'Reverse' for a in body.args):
-                if all(a.length % 8 == 0 for a in body.args):
-                    return body.make_like(body.op, [a.args[0] for a in reversed(body.args)], simplify=True)
-
-        if body.op == 'Extract' and body.args[2].op == 'Reverse':
+    @staticmethod
+    def bv_reverse_extract_simplifier(body):
+        if body.args[2].op == 'Reverse':
             # Reverse(Extract(hi, lo, Reverse(x))) ==> Extract(bits-lo-1, bits-hi-1, x)
             # Holds only when (hi+1) and lo are multiples of 8 (or, multiples of bits_per_byte if we really want to
             # suppport cLEMENCy)
@@ -429,6 +675,8 @@ class SimplificationManager:
         elif b is ast.all_operations.BVV(0, a.size()):
             return a
 
+    @staticmethod
+    def bitwise_add_flatten_simplifier(a, b):
         return SimplificationManager._flatten_simplifier('__add__', None, a, b)
 
     @staticmethod
@@ -506,9 +754,8 @@ class SimplificationManager:
         elif a is b or (a == b).is_true():
             return ast.all_operations.BVV(0, a.size())
 
-        result = SimplificationManager.bitwise_xor_simplifier_minmax(a,b)
-        if result is not None: return result
-
+    @staticmethod
+    def bitwise_xor_flatten_simplifier(a, b):
         def _flattening_filter(args):
             # since a ^ a == 0, we can safely remove those from args
             # this procedure is done carefully in order to keep the ordering of arguments
@@ -529,6 +776,8 @@ class SimplificationManager:
         elif a is b:
             return a
 
+    @staticmethod
+    def bitwise_or_flatten_simplifier(a, b):
         def _flattening_filter(args):
             # a | a == a
             return tuple(set(args))
@@ -537,12 +786,6 @@ class SimplificationManager:
 
     @staticmethod
     def bitwise_and_simplifier(a, b):
-
-        # try to perform a rotate-shift-mask simplification
-        r = SimplificationManager.rotate_shift_mask_simplifier(a, b)
-        if r is not None:
-            return r
-
         if (a == 2**a.size()-1).is_true():
             return b
         elif (b == 2**a.size()-1).is_true():
@@ -557,77 +800,42 @@ class SimplificationManager:
                 # yes!
                 return ast.all_operations.ZeroExt(a.args[0].size(), a.args[1])
 
+    @staticmethod
+    def bitwise_and_flatten_simplifier(a, b):
         def _flattening_filter(args):
             # a & a == a
             return tuple(set(args))
 
         return SimplificationManager._flatten_simplifier('__and__', _flattening_filter, a, b)
 
-    @staticmethod
-    def boolean_not_simplifier(body):
-        if body.op == '__eq__':
-            return body.args[0] != body.args[1]
-        elif body.op == '__ne__':
-            return body.args[0] == body.args[1]
-
-        if body.op == 'Not':
-            return body.args[0]
-
-        if body.op == 'If':
-            return ast.all_operations.If(body.args[0], body.args[2], body.args[1])
-
-        if body.op == 'SLT':
-            return ast.all_operations.SGE(body.args[0], body.args[1])
-        elif body.op == 'SLE':
-            return ast.all_operations.SGT(body.args[0], body.args[1])
-        elif body.op == 'SGT':
-            return ast.all_operations.SLE(body.args[0], body.args[1])
-        elif body.op == 'SGE':
-            return ast.all_operations.SLT(body.args[0], body.args[1])
-
-        if body.op == 'ULT':
-            return ast.all_operations.UGE(body.args[0], body.args[1])
-        elif body.op == 'ULE':
-            return ast.all_operations.UGT(body.args[0], body.args[1])
-        elif body.op == 'UGT':
-            return ast.all_operations.ULE(body.args[0], body.args[1])
-        elif body.op == 'UGE':
-            return ast.all_operations.ULT(body.args[0], body.args[1])
-
-        if body.op == '__lt__':
-            return ast.all_operations.UGE(body.args[0], body.args[1])
-        elif body.op == '__le__':
-            return ast.all_operations.UGT(body.args[0], body.args[1])
-        elif body.op == '__gt__':
-            return ast.all_operations.ULE(body.args[0], body.args[1])
-        elif body.op == '__ge__':
-            return ast.all_operations.ULT(body.args[0], body.args[1])
-
     @staticmethod
     def zeroext_simplifier(n, e):
-        if n == 0:
-            return e
+        # ZeroExt(A, ZeroExt(B, x)) ==> ZeroExt(A + B, x)
+        return e.make_like(e.op, (n + e.args[0], e.args[1]), length=n + e.size(), simplify=True)
 
-        if e.op == 'ZeroExt':
-            # ZeroExt(A, ZeroExt(B, x)) ==> ZeroExt(A + B, x)
-            return e.make_like(e.op, (n + e.args[0], e.args[1]), length=n + e.size(), simplify=True)
+    # TODO: SignExt of a value whose top bit is 0 could be a zero-extend instead
 
     @staticmethod
-    def signext_simplifier(n, e):
-        if n == 0:
-            return e
-
-        # TODO: if top bit is 0, do a zero-extend instead
-
-    @staticmethod
-    def extract_simplifier(high, low, val):
+    def extract_whole_simplifier(high, low, val):
         # if we're extracting the whole value, return the value
         if high - low + 1 == val.size():
             return val
 
-        if (val.op == 'SignExt' or val.op == 'ZeroExt') and low == 0 and high + 1 == val.args[1].size():
+    @staticmethod
+    def extract_ext_simplifier(high, low, val):
+        # extracting the extended value
+        if low == 0 and high + 1 == val.args[1].size():
             return val.args[1]
 
+    @staticmethod
+    def extract_extract_simplifier(high, low, val):
+        _, inner_low = val.args[:2]
+        new_low = inner_low + low
+        new_high = new_low + (high - low)
+        return (val.args[2])[new_high:new_low]
+
+    @staticmethod
+    def extract_simplifier(high, low, val):
         if val.op == 'ZeroExt':
             extending_bits = val.args[0]
             if extending_bits == 0:
@@ -681,10 +889,8 @@ class SimplificationManager:
                         return ast.all_operations.Extract(new_high, low_loc, self)
 
         if val.op == 'Extract':
-            _, inner_low = val.args[:2]
-            new_low = inner_low + low
-            new_high = new_low + (high - low)
-            return (val.args[2])[new_high:new_low]
+            # ZeroExt(0, Extract(...))
+            return SimplificationManager.extract_extract_simplifier(high, low, val)
 
         if val.op == 'Reverse' and val.args[0].op == 'Concat' and all(a.length % 8 == 0 for a in val.args[0].args):
             val = val.make_like('Concat',
@@ -710,17 +916,15 @@ class SimplificationManager:
     # oh gods
     @staticmethod
     def fptobv_simplifier(the_fp):
-        if the_fp.op == 'fpToFP' and len(the_fp.args) == 2:
+        if len(the_fp.args) == 2:
             return the_fp.args[0]
 
     @staticmethod
-    def fptofp_simplifier(*args):
-        if len(args) == 2 and args[0].op == 'fpToIEEEBV':
-            to_bv, sort = args
-            if sort == fp.FSORT_FLOAT and to_bv.length == 32:
-                return to_bv.args[0]
-            elif sort == fp.FSORT_DOUBLE and to_bv.length == 64:
-                return to_bv.args[0]
+    def fptofp_simplifier(to_bv, sort):
+        if sort == fp.FSORT_FLOAT and to_bv.length == 32:
+            return to_bv.args[0]
+        elif sort == fp.FSORT_DOUBLE and to_bv.length == 64:
+            return to_bv.args[0]
 
     @staticmethod
     def rotate_shift_mask_simplifier(a, b):
@@ -797,6 +1001,13 @@ class SimplificationManager:
 
 SIMPLE_OPS = ('Concat', 'SignExt', 'ZeroExt')
 
+# Not(a OP b) ==> a INVERTED_OP b
+inverted_comparisons = {
+    'SLT': 'SGE', 'SLE': 'SGT', 'SGT': 'SLE', 'SGE': 'SLT',
+    'ULT': 'UGE', 'ULE': 'UGT', 'UGT': 'ULE', 'UGE': 'ULT',
+    '__lt__': 'UGE', '__le__': 'UGT', '__gt__': 'ULE', '__ge__': 'ULT',
+}
+
 extract_distributable = {
     '__and__', '__rand__',
     '__or__', '__ror__',
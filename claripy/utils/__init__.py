@@ -1,2 +1,4 @@
 
 from .orderedset import OrderedSet
+from .persistent_map import PersistentMap
+from .lru_memo import LRUMemo
@@ -0,0 +1,74 @@
+import collections
+import math
+import threading
+
+
+class LRUMemo:
+    """
+    A bounded LRU mapping that counts its hits and misses, for claripy's process-wide memos. They are shared by every
+    frontend, including the ones that are solved in the worker thread of a concurrent HybridFrontend, so every access
+    goes through a lock.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._d = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Returns the value of `key` (and marks it as recently used), or `default`.
+        """
+        with self._lock:
+            try:
+                r = self._d[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._d.move_to_end(key)
+            self.hits += 1
+            return r
+
+    def put(self, key, value):
+        with self._lock:
+            self._d[key] = value
+            self._d.move_to_end(key)
+            while len(self._d) > self.maxsize:
+                self._d.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._d.clear()
+
+    def trim(self, fraction):
+        """
+        Drops `fraction` of the entries, least recently used first.
+
+        :return:    The number of entries dropped.
+        """
+        with self._lock:
+            k = min(len(self._d), int(math.ceil(len(self._d) * fraction)))
+            for _ in range(k):
+                self._d.popitem(last=False)
+            return k
+
+    def __len__(self):
+        return len(self._d)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._d))
+
+    def items(self):
+        with self._lock:
+            return list(self._d.items())
+
+    def stats(self):
+        return {
+            'entries': len(self._d),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / (self.hits + self.misses) if self.hits + self.misses else None,
+        }
@@ -0,0 +1,264 @@
+try:
+    _popcount = int.bit_count
+except AttributeError:
+    def _popcount(n):
+        return bin(n).count('1')
+
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+_HASH_MASK = (1 << 64) - 1
+
+
+class _BitmapNode:
+    """
+    A HAMT node. `entries` holds a key and a value for each bit set in `bitmap`, and a None key means that the value
+    is a sub-node.
+    """
+
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries
+
+    def get(self, h, shift, key, default):
+        bit = 1 << ((h >> shift) & _MASK)
+        if not self.bitmap & bit:
+            return default
+        idx = _popcount(self.bitmap & (bit - 1)) * 2
+        k = self.entries[idx]
+        if k is None:
+            return self.entries[idx+1].get(h, shift + _BITS, key, default)
+        if k is key or k == key:
+            return self.entries[idx+1]
+        return default
+
+    def assoc(self, h, shift, key, value):
+        """
+        :return: A tuple of the new node (this one, if nothing changed) and whether a key was added.
+        """
+        bit = 1 << ((h >> shift) & _MASK)
+        idx = _popcount(self.bitmap & (bit - 1)) * 2
+        if not self.bitmap & bit:
+            entries = self.entries[:idx] + [ key, value ] + self.entries[idx:]
+            return _BitmapNode(self.bitmap | bit, entries), True
+
+        k, v = self.entries[idx], self.entries[idx+1]
+        if k is None:
+            sub, added = v.assoc(h, shift + _BITS, key, value)
+            if sub is v:
+                return self, False
+            entries = list(self.entries)
+            entries[idx+1] = sub
+            return _BitmapNode(self.bitmap, entries), added
+
+        if k is key or k == key:
+            if v is value:
+                return self, False
+            entries = list(self.entries)
+            entries[idx+1] = value
+            return _BitmapNode(self.bitmap, entries), False
+
+        # two keys in the same slot: push them down into a sub-node
+        entries = list(self.entries)
+        entries[idx] = None
+        entries[idx+1] = _make_node(shift + _BITS, hash(k) & _HASH_MASK, k, v, h, key, value)
+        return _BitmapNode(self.bitmap, entries), True
+
+    def without(self, h, shift, key):
+        """
+        :return: The new node (this one, if the key is not there), or None if it would be empty.
+        """
+        bit = 1 << ((h >> shift) & _MASK)
+        if not self.bitmap & bit:
+            return self
+        idx = _popcount(self.bitmap & (bit - 1)) * 2
+        k, v = self.entries[idx], self.entries[idx+1]
+
+        if k is None:
+            sub = v.without(h, shift + _BITS, key)
+            if sub is v:
+                return self
+            if sub is not None:
+                entries = list(self.entries)
+                if type(sub) is _BitmapNode and len(sub.entries) == 2 and sub.entries[0] is not None:
+                    # a single key does not need a sub-node
+                    entries[idx:idx+2] = sub.entries
+                else:
+                    entries[idx+1] = sub
+                return _BitmapNode(self.bitmap, entries)
+        elif not (k is key or k == key):
+            return self
+
+        if self.bitmap == bit:
+            return None
+        return _BitmapNode(self.bitmap & ~bit, self.entries[:idx] + self.entries[idx+2:])
+
+    def items(self):
+        entries = self.entries
+        for i in range(0, len(entries), 2):
+            if entries[i] is None:
+                yield from entries[i+1].items()
+            else:
+                yield entries[i], entries[i+1]
+
+
+class _CollisionNode:
+    """
+    A HAMT node for keys with the same full hash.
+    """
+
+    __slots__ = ('hash', 'entries')
+
+    def __init__(self, h, entries):
+        self.hash = h
+        self.entries = entries
+
+    def _find(self, key):
+        entries = self.entries
+        for i in range(0, len(entries), 2):
+            if entries[i] is key or entries[i] == key:
+                return i
+        return -1
+
+    def get(self, h, shift, key, default):
+        idx = self._find(key)
+        return default if idx < 0 else self.entries[idx+1]
+
+    def assoc(self, h, shift, key, value):
+        if h != self.hash:
+            # not a collision after all, so this node goes under a bitmap node
+            node = _BitmapNode(1 << ((self.hash >> shift) & _MASK), [ None, self ])
+            return node.assoc(h, shift, key, value)
+
+        idx = self._find(key)
+        if idx < 0:
+            return _CollisionNode(h, self.entries + [ key, value ]), True
+        if self.entries[idx+1] is value:
+            return self, False
+        entries = list(self.entries)
+        entries[idx+1] = value
+        return _CollisionNode(h, entries), False
+
+    def without(self, h, shift, key):
+        idx = self._find(key)
+        if idx < 0:
+            return self
+        entries = self.entries[:idx] + self.entries[idx+2:]
+        if not entries:
+            return None
+        if len(entries) == 2:
+            return _BitmapNode(1 << ((h >> shift) & _MASK), entries)
+        return _CollisionNode(h, entries)
+
+    def items(self):
+        entries = self.entries
+        for i in range(0, len(entries), 2):
+            yield entries[i], entries[i+1]
+
+
+def _make_node(shift, h1, k1, v1, h2, k2, v2):
+    if h1 == h2:
+        return _CollisionNode(h1, [ k1, v1, k2, v2 ])
+    node, _ = _EMPTY.assoc(h1, shift, k1, v1)
+    node, _ = node.assoc(h2, shift, k2, v2)
+    return node
+
+_EMPTY = _BitmapNode(0, [ ])
+
+
+class PersistentMap:
+    """
+    An immutable mapping, implemented as a hash array mapped trie. Updating it returns a new map that shares all but
+    O(log n) of its nodes with the old one, so that copies of a big map are free and updating them is cheap.
+    """
+
+    __slots__ = ('_root', '_len')
+
+    def __init__(self, items=None):
+        self._root = _EMPTY
+        self._len = 0
+        if isinstance(items, PersistentMap):
+            self._root, self._len = items._root, items._len
+        elif items is not None:
+            if hasattr(items, 'items'):
+                items = items.items()
+            root, n = _EMPTY, 0
+            for k, v in items:
+                root, added = root.assoc(hash(k) & _HASH_MASK, 0, k, v)
+                n += added
+            self._root, self._len = root, n
+
+    @staticmethod
+    def _new(root, n):
+        m = PersistentMap.__new__(PersistentMap)
+        m._root = root
+        m._len = n
+        return m
+
+    def set(self, key, value):
+        """
+        :return: A new map, in which `key` maps to `value`.
+        """
+        root, added = self._root.assoc(hash(key) & _HASH_MASK, 0, key, value)
+        if root is self._root:
+            return self
+        return PersistentMap._new(root, self._len + added)
+
+    def delete(self, key):
+        """
+        :return: A new map, without `key` (which does not need to be in this one).
+        """
+        root = self._root.without(hash(key) & _HASH_MASK, 0, key)
+        if root is self._root:
+            return self
+        return PersistentMap._new(_EMPTY if root is None else root, self._len - 1)
+
+    def update(self, items):
+        """
+        :return: A new map, with the given (key, value) pairs (or the items of the given mapping) added.
+        """
+        if hasattr(items, 'items'):
+            items = items.items()
+        root, n = self._root, self._len
+        for k, v in items:
+            root, added = root.assoc(hash(k) & _HASH_MASK, 0, k, v)
+            n += added
+        return PersistentMap._new(root, n)
+
+    def get(self, key, default=None):
+        return self._root.get(hash(key) & _HASH_MASK, 0, key, default)
+
+    def __getitem__(self, key):
+        v = self._root.get(hash(key) & _HASH_MASK, 0, key, _missing)
+        if v is _missing:
+            raise KeyError(key)
+        return v
+
+    def __contains__(self, key):
+        return self._root.get(hash(key) & _HASH_MASK, 0, key, _missing) is not _missing
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for k, _ in self._root.items():
+            yield k
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        for _, v in self._root.items():
+            yield v
+
+    def items(self):
+        return self._root.items()
+
+    def __reduce__(self):
+        return PersistentMap, (list(self.items()),)
+
+    def __repr__(self):
+        return 'PersistentMap({%s})' % ', '.join('%r: %r' % kv for kv in self.items())
+
+_missing = object()
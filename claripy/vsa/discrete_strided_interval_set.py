@@ -1,3 +1,4 @@
+import bisect
 import functools
 import numbers
 import itertools
@@ -7,36 +8,83 @@ from .strided_interval import StridedInterval
 DEFAULT_MAX_CARDINALITY_WITHOUT_COLLAPSING = 256 # We don't collapse until there are more than this many SIs
 
 
+def _is_plain(si):
+    """
+    Whether a StridedInterval is a non-empty, non-wrapping, non-reversed interval, i.e. one that can be placed on the
+    sorted interval index.
+    """
+    return not si._is_bottom and not si._reversed and si._lower_bound <= si._upper_bound
+
+def _si_key(si):
+    # the index order: by lower bound, and containers before the intervals they contain
+    return (si._lower_bound, -si._upper_bound, si._stride, si._uninitialized)
+
+def _identity(si):
+    return (si._bits, si._stride, si._lower_bound, si._upper_bound, si._reversed, si._uninitialized, si._is_bottom)
+
+def _contains(a, b):
+    """
+    Whether every value of the plain StridedInterval b is a value of the plain StridedInterval a.
+    """
+    if a._uninitialized != b._uninitialized or b._lower_bound < a._lower_bound or b._upper_bound > a._upper_bound:
+        return False
+    if a._stride == 0:
+        return b._lower_bound == b._upper_bound == a._lower_bound
+    return (b._lower_bound - a._lower_bound) % a._stride == 0 and b._stride % a._stride == 0
+
+def _flatten(results):
+    for r in results:
+        if isinstance(r, DiscreteStridedIntervalSet):
+            for si in r._members():
+                yield si
+        else:
+            yield r
+
 def apply_on_each_si(f):
     @functools.wraps(f)
     def operator(self, o=None):
+        name = f.__name__
+
         if o is None:
             # This is an unary operator.
-            new_si_set = set()
+            new_si_set = [ getattr(a, name)() for a in self._members() ]
 
-            for a in self._si_set:
-                new_si_set.add(getattr(a, f.__name__)())
-
-            ret = DiscreteStridedIntervalSet(bits=self.bits, si_set=new_si_set)
+            ret = DiscreteStridedIntervalSet(bits=self.bits, si_set=_flatten(new_si_set))
             return ret.normalize()
 
         if isinstance(o, DiscreteStridedIntervalSet):
-            # We gotta apply the operation on each single object
-            new_si_set = set()
-
-            for a in self._si_set:
-                for b in o._si_set:
-                    new_si_set.add(getattr(a, f.__name__)(b))
-
-            ret = DiscreteStridedIntervalSet(bits=self.bits, si_set=new_si_set)
+            # We gotta apply the operation on each pair of objects. Once the distinct results so far are more than we
+            # keep without collapsing, the result is going to be collapsed anyway, so the remaining rows are computed
+            # against the collapsed operand instead of each of its SIs.
+            new_si_set = [ ]
+            seen = set()
+            cardinality = 0
+            collapsed = None
+
+            for a in self._members():
+                if collapsed is not None:
+                    new_si_set.append(getattr(a, name)(collapsed))
+                    continue
+
+                for b in o._members():
+                    r = getattr(a, name)(b)
+                    for si in _flatten((r,)):
+                        key = _identity(si)
+                        if key not in seen:
+                            seen.add(key)
+                            new_si_set.append(si)
+                            cardinality += si.cardinality
+
+                if cardinality > self._max_cardinality:
+                    collapsed = o.collapse()
+
+            ret = DiscreteStridedIntervalSet(bits=self.bits, si_set=_flatten(new_si_set))
             return ret.normalize()
 
         elif isinstance(o, (StridedInterval, numbers.Number, BVV)):
-            new_si_set = set()
-            for si in self._si_set:
-                new_si_set.add(getattr(si, f.__name__)(o))
+            new_si_set = [ getattr(si, name)(o) for si in self._members() ]
 
-            ret = DiscreteStridedIntervalSet(bits=self.bits, si_set=new_si_set)
+            ret = DiscreteStridedIntervalSet(bits=self.bits, si_set=_flatten(new_si_set))
             return ret.normalize()
 
         else:
@@ -71,17 +119,18 @@ dsis_id_ctr = itertools.count()
 class DiscreteStridedIntervalSet(StridedInterval):
     """
     A DiscreteStridedIntervalSet represents one or more discrete StridedInterval instances.
+
+    The StridedIntervals are kept on a sorted interval index: the plain (non-empty, non-wrapping and non-reversed)
+    ones are sorted by their lower bounds, without duplicates and without the ones that another one already contains,
+    so that unions are merges of two sorted lists and intersections only visit the SIs that overlap. The others are
+    kept aside.
     """
     def __init__(self, name=None, bits=0, si_set=None, max_cardinality=None):
         if name is None:
             name = "DSIS_%d" % next(dsis_id_ctr)
 
-         # Initialize the set for strided intervals
-        if si_set is not None and len(si_set):
-            self._si_set = si_set
-
-        else:
-            self._si_set = set()
+        # Initialize the index of strided intervals
+        self._index(si_set if si_set is not None else ())
 
         self._max_cardinality = DEFAULT_MAX_CARDINALITY_WITHOUT_COLLAPSING if max_cardinality is None else \
             max_cardinality
@@ -89,17 +138,65 @@ class DiscreteStridedIntervalSet(StridedInterval):
         StridedInterval.__init__(self, name=name, bits=bits)
 
         # Update lower_bound and upper_bound
-        for si in self._si_set:
+        for si in self._members():
             self._update_bounds(si)
             self._update_bits(si)
 
+    def _index(self, sis):
+        """
+        Builds the interval index from an iterable of StridedIntervals.
+
+        :param sis: The StridedIntervals. Sorted runs in it (like the members of other DSISes) are merged in linear
+                    time.
+        """
+        plain = [ ]
+        irregular = [ ]
+        seen = set()
+        for si in sis:
+            key = _identity(si)
+            if key in seen:
+                continue
+            seen.add(key)
+            (plain if _is_plain(si) else irregular).append(si)
+        plain.sort(key=_si_key)
+
+        # drop the SIs that are contained in the one that reaches the furthest so far
+        self._sis = [ ]
+        self._lows = [ ]
+        self._reach = [ ]
+        furthest = None
+        for si in plain:
+            if furthest is not None and _contains(furthest, si):
+                continue
+            if furthest is None or si._upper_bound > furthest._upper_bound:
+                furthest = si
+            self._sis.append(si)
+            self._lows.append(si._lower_bound)
+            self._reach.append(furthest._upper_bound)
+
+        self._irregular = irregular
+        self._cardinality = sum(si.cardinality for si in self._members())
+
+    def _members(self):
+        return itertools.chain(self._sis, self._irregular)
+
+    def _overlapping(self, si):
+        """
+        Returns the members whose values may intersect with those of a StridedInterval.
+        """
+        if not _is_plain(si):
+            return list(self._members())
+
+        start = bisect.bisect_left(self._reach, si._lower_bound)
+        end = bisect.bisect_right(self._lows, si._upper_bound)
+        return [ a for a in self._sis[start:end] if a._upper_bound >= si._lower_bound ] + self._irregular
 
     #
     # Properties
     #
 
     def __repr__(self):
-        representatives = ", ".join([ i.__repr__() for i in list(self._si_set)[ : 5] ])
+        representatives = ", ".join([ i.__repr__() for i in itertools.islice(self._members(), 5) ])
         if self.number_of_values > 5:
             representatives += ", ..."
 
@@ -112,14 +209,11 @@ class DiscreteStridedIntervalSet(StridedInterval):
 
         :return:
         """
-        cardinality = 0
-        for si in self._si_set:
-            cardinality += si.cardinality
-        return cardinality
+        return self._cardinality
 
     @property
     def number_of_values(self):
-        return len(self._si_set)
+        return len(self._sis) + len(self._irregular)
 
     @property
     def stride(self):
@@ -141,7 +235,7 @@ class DiscreteStridedIntervalSet(StridedInterval):
 
         if self.cardinality:
             r = None
-            for si in self._si_set:
+            for si in self._members():
                 r = r._union(si) if r is not None else si
 
             return r
@@ -157,14 +251,14 @@ class DiscreteStridedIntervalSet(StridedInterval):
         :return: A DiscreteStridedIntervalSet object.
         """
         if self.should_collapse(): return self.collapse()
-        elif self.number_of_values == 1: return list(self._si_set)[0]
+        elif self.number_of_values == 1: return next(self._members())
         else:
-            for si in self._si_set:
+            for si in self._members():
                 self._update_bits(si)
             return self
 
     def copy(self):
-        copied = DiscreteStridedIntervalSet(bits=self._bits, si_set=self._si_set.copy(),
+        copied = DiscreteStridedIntervalSet(bits=self._bits, si_set=self._members(),
                                             max_cardinality=self._max_cardinality)
 
         return copied
@@ -287,9 +381,7 @@ class DiscreteStridedIntervalSet(StridedInterval):
 
         :return: The negated value.
         """
-        new_si_set = set()
-        for si in self._si_set:
-            new_si_set.add(~si)
+        new_si_set = [ ~si for si in self._members() ]
 
         r = DiscreteStridedIntervalSet(bits=self._bits, si_set=new_si_set)
         return r.normalize()
@@ -342,17 +434,15 @@ class DiscreteStridedIntervalSet(StridedInterval):
         """
         # TODO: This method can be optimized
 
-        ret = set()
         bits = high_bit - low_bit + 1
 
-        for si in self._si_set:
-            ret.add(si.extract(high_bit, low_bit))
+        ret = DiscreteStridedIntervalSet(bits=bits, si_set=[ si.extract(high_bit, low_bit) for si in self._members() ])
 
-        if len(ret) > 1:
-            return DiscreteStridedIntervalSet(bits=bits, si_set=ret)
+        if ret.number_of_values > 1:
+            return ret
 
         else:
-            return list(ret)[0]
+            return next(ret._members())
 
     # Arithmetic operations
 
@@ -435,7 +525,7 @@ class DiscreteStridedIntervalSet(StridedInterval):
 
         ret = set()
 
-        for si in self._si_set:
+        for si in self._members():
             ret |= set(si.eval(n))
             if len(ret) >= n:
                 break
@@ -523,13 +613,8 @@ class DiscreteStridedIntervalSet(StridedInterval):
         :return:
         """
 
-        dsis = self.copy()
-        for si_ in dsis._si_set:
-            if BoolResult.is_true(si_ == si):
-                return dsis
-
-        dsis._si_set.add(si)
-        dsis._update_bounds(si)
+        dsis = DiscreteStridedIntervalSet(bits=self._bits, si_set=itertools.chain(self._members(), (si,)),
+                                          max_cardinality=self._max_cardinality)
 
         return dsis.normalize()
 
@@ -541,15 +626,22 @@ class DiscreteStridedIntervalSet(StridedInterval):
         :return:
         """
 
-        copied = self.copy()
+        # both indices are sorted, so building the new index merges them
+        merged = DiscreteStridedIntervalSet(bits=self._bits, si_set=itertools.chain(self._members(), dsis._members()),
+                                            max_cardinality=self._max_cardinality)
 
-        for a in dsis._si_set:
-            copied = copied.union(a)
+        return merged.normalize()
 
-        if isinstance(copied, DiscreteStridedIntervalSet):
-            copied._update_bounds(dsis)
+    def _intersect(self, si):
+        """
+        Returns the non-empty intersections of the members with a StridedInterval.
+        """
 
-        return copied.normalize()
+        for si_ in self._overlapping(si):
+            r = si_.intersection(si)
+            for a in _flatten((r,)):
+                if not a.is_empty:
+                    yield a
 
     def _intersection_with_si(self, si):
         """
@@ -559,16 +651,12 @@ class DiscreteStridedIntervalSet(StridedInterval):
         :return:
         """
 
-        new_si_set = set()
-        for si_ in self._si_set:
-            r = si_.intersection(si)
-            new_si_set.add(r)
+        new_si_set = list(self._intersect(si))
 
-        if len(new_si_set):
+        if new_si_set:
             ret = DiscreteStridedIntervalSet(bits=self.bits, si_set=new_si_set)
 
-            if ret.should_collapse(): return ret.collapse()
-            else: return ret
+            return ret.normalize()
 
         else:
             # There is no intersection between two operands
@@ -582,18 +670,11 @@ class DiscreteStridedIntervalSet(StridedInterval):
         :return:
         """
 
-        new_si_set = set()
-        for si in dsis._si_set:
-            r = self._intersection_with_si(si)
-
-            if isinstance(r, StridedInterval):
-                if not r.is_empty:
-                    new_si_set.add(r)
-
-            else: # r is a DiscreteStridedIntervalSet
-                new_si_set |= r._si_set
+        new_si_set = [ ]
+        for si in dsis._members():
+            new_si_set.extend(self._intersect(si))
 
-        if len(new_si_set):
+        if new_si_set:
             ret = DiscreteStridedIntervalSet(bits=self.bits, si_set=new_si_set)
 
             return ret.normalize()
@@ -624,6 +705,5 @@ class DiscreteStridedIntervalSet(StridedInterval):
         self._bits = val.bits
 
 from .errors import ClaripyVSAOperationError
-from .bool_result import BoolResult
 from ..bv import BVV
 from .valueset import ValueSet
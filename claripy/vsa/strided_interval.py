@@ -4,6 +4,7 @@ import itertools
 import logging
 import math
 import numbers
+import weakref
 from functools import reduce
 from past.builtins import xrange
 
@@ -143,7 +144,18 @@ def normalize_types(f):
 
     return normalizer
 
-si_id_ctr = itertools.count()
+_masks = tuple((1 << n) - 1 for n in range(129))
+
+def _mask(bits):
+    return _masks[bits] if 0 <= bits <= 128 else (1 << bits) - 1
+
+# the shared StridedIntervals, see StridedInterval.intern()
+_shared_sis = weakref.WeakValueDictionary()
+
+_new_si = object.__new__
+
+# the numbers in the names of nameless StridedIntervals, which are drawn when they are first needed
+_si_id_ctr = itertools.count()
 
 # Whether DiscreteStridedIntervalSet should be used or not. Sometimes we manually set it to False to allow easy
 # implementation of test cases.
@@ -327,17 +339,25 @@ class StridedInterval(BackendObject):
     DO NOT expect to see a 1-to-1 reproduction of [1].
 
     Thanks all corresponding authors for their outstanding works.
+
+    The StridedIntervals that BackendVSA hands out are interned (see intern()) and must not be modified. Operations
+    always return new StridedIntervals, and copy() returns a private one that can be modified before it is used.
     """
+
+    __slots__ = ('_name', '_auto_name', '_bits', '_stride', '_lower_bound', '_upper_bound', '_reversed', '_is_bottom',
+                 '_uninitialized', '_shared', '__weakref__')
+
     def __init__(self, name=None, bits=0, stride=None, lower_bound=None, upper_bound=None, uninitialized=False, bottom=False):
+        # nameless StridedIntervals are named on demand, see the name property
         self._name = name
+        self._auto_name = None
+        self._shared = False
 
-        if self._name is None:
-            self._name = "SI_%d" % next(si_id_ctr)
-
+        mask = _mask(bits)
         self._bits = bits
         self._stride = stride if stride is not None else 1
         self._lower_bound = lower_bound if lower_bound is not None else 0
-        self._upper_bound = upper_bound if upper_bound is not None else (2**bits-1)
+        self._upper_bound = upper_bound if upper_bound is not None else mask
 
         if lower_bound is not None and not isinstance(lower_bound, numbers.Number):
             raise ClaripyVSAError("'lower_bound' must be an int or a long. %s is not supported." % type(lower_bound))
@@ -349,7 +369,7 @@ class StridedInterval(BackendObject):
 
         self._is_bottom = bottom
 
-        self.uninitialized = uninitialized
+        self._uninitialized = uninitialized
 
         if self._upper_bound is not None and bits == 0:
             self._bits = self._min_bits()
@@ -361,33 +381,59 @@ class StridedInterval(BackendObject):
             self._lower_bound = StridedInterval.min_int(self.bits)
 
         # For lower bound and upper bound, we always store the unsigned version
-        self._lower_bound &= (2 ** bits - 1)
-        self._upper_bound &= (2 ** bits - 1)
+        self._lower_bound &= mask
+        self._upper_bound &= mask
 
         self.normalize()
 
-    def copy(self):
-        si = StridedInterval(name=self._name,
-                             bits=self.bits,
-                             stride=self.stride,
-                             lower_bound=self.lower_bound,
-                             upper_bound=self.upper_bound,
-                             uninitialized=self.uninitialized,
-                             bottom=self._is_bottom)
+    def _duplicate(self, name, auto_name=None):
+        si = _new_si(StridedInterval)
+        si._name = name
+        si._auto_name = auto_name
+        si._shared = False
+        si._bits = self._bits
+        si._stride = self._stride
+        si._lower_bound = self._lower_bound
+        si._upper_bound = self._upper_bound
+        si._reversed = False
+        si._is_bottom = self._is_bottom
+        si._uninitialized = self._uninitialized
+        si.normalize()
         si._reversed = self._reversed
         return si
 
+    def copy(self):
+        # a nameless StridedInterval draws its name now, so that the copy gets the same one
+        if self._name is None and self._auto_name is None:
+            self._auto_name = next(_si_id_ctr)
+        return self._duplicate(self._name, self._auto_name)
+
     def nameless_copy(self):
-        si = StridedInterval(name=None,
-                             bits=self.bits,
-                             stride=self.stride,
-                             lower_bound=self.lower_bound,
-                             upper_bound=self.upper_bound,
-                             uninitialized=self.uninitialized,
-                             bottom=self._is_bottom)
-        si._reversed = self._reversed
+        return self._duplicate(None)
+
+    def intern(self):
+        """
+        Returns the shared StridedInterval that is equal to this one, and makes this one the shared one if there is none
+        yet. Shared StridedIntervals are immutable. StridedIntervals with an explicit name are never shared.
+
+        :return: The shared StridedInterval.
+        """
+        if self._shared or self._name is not None or type(self) is not StridedInterval:
+            return self
+
+        key = (self._bits, self._stride, self._lower_bound, self._upper_bound, self._reversed, self._uninitialized,
+               self._is_bottom)
+        si = _shared_sis.get(key, None)
+        if si is None:
+            self._shared = True
+            _shared_sis[key] = self
+            si = self
         return si
 
+    def _check_mutable(self, old, new):
+        if self._shared and old != new:
+            raise ClaripyVSAError("Shared StridedIntervals are immutable. Modify a copy() instead.")
+
     def normalize(self):
         if self.bits == 8 and self.reversed:
             self._reversed = False
@@ -399,7 +445,7 @@ class StridedInterval(BackendObject):
             self._stride = 0
 
         if self.lower_bound < 0:
-            self.lower_bound &= (2 ** self.bits - 1)
+            self.lower_bound &= _mask(self.bits)
 
         self._normalize_top()
 
@@ -466,7 +512,7 @@ class StridedInterval(BackendObject):
     #
 
     def __hash__(self):
-        return hash(('%x %x %x %x' % (self.bits, self.lower_bound, self.upper_bound, self.stride), self._reversed, self.uninitialized))
+        return hash((self._bits, self._lower_bound, self._upper_bound, self._stride, self._reversed, self._uninitialized))
 
     def _normalize_top(self):
         if self.lower_bound == self._modular_add(self.upper_bound, 1, self.bits) and self.stride == 1:
@@ -961,7 +1007,7 @@ class StridedInterval(BackendObject):
                 return FalseResult()
 
         else:
-            if self.name == o.name:
+            if self._name is not None and self._name == o._name:
                 return TrueResult() # They are the same guy
 
             si_intersection = self.intersection(o)
@@ -1153,6 +1199,10 @@ class StridedInterval(BackendObject):
 
     @property
     def name(self):
+        if self._name is None:
+            if self._auto_name is None:
+                self._auto_name = next(_si_id_ctr)
+            return "SI_%d" % self._auto_name
         return self._name
 
     @property
@@ -1216,6 +1266,7 @@ class StridedInterval(BackendObject):
 
     @lower_bound.setter
     def lower_bound(self, value):
+        self._check_mutable(self._lower_bound, value)
         self._lower_bound = value
 
     @property
@@ -1224,6 +1275,7 @@ class StridedInterval(BackendObject):
 
     @upper_bound.setter
     def upper_bound(self, value):
+        self._check_mutable(self._upper_bound, value)
         self._upper_bound = value
 
     @property
@@ -1236,8 +1288,18 @@ class StridedInterval(BackendObject):
 
     @stride.setter
     def stride(self, value):
+        self._check_mutable(self._stride, value)
         self._stride = value
 
+    @property
+    def uninitialized(self):
+        return self._uninitialized
+
+    @uninitialized.setter
+    def uninitialized(self, value):
+        self._check_mutable(self._uninitialized, value)
+        self._uninitialized = value
+
     @property
     @reversed_processor
     def max(self):
@@ -1329,15 +1391,15 @@ class StridedInterval(BackendObject):
 
     @staticmethod
     def _modular_add(a, b, bits):
-        return (a + b) % (2 ** bits)
+        return (a + b) & _mask(bits)
 
     @staticmethod
     def _modular_sub(a, b, bits):
-        return (a - b) % (2 ** bits)
+        return (a - b) & _mask(bits)
 
     @staticmethod
     def _modular_mul(a, b, bits):
-        return (a * b) % (2 ** bits)
+        return (a * b) & _mask(bits)
 
     #
     # Helper methods
@@ -1390,7 +1452,7 @@ class StridedInterval(BackendObject):
 
     @staticmethod
     def max_int(k):
-        return StridedInterval.highbit(k + 1) - 1
+        return _mask(k)
 
     @staticmethod
     def min_int(k):
@@ -1,6 +1,6 @@
 import functools
-import itertools
 import numbers
+import threading
 
 from ..backend_object import BackendObject
 from ..annotation import Annotation
@@ -34,8 +34,6 @@ def normalize_types_one_arg(f):
 
     return normalizer
 
-vs_id_ctr = itertools.count()
-
 
 class RegionAnnotation(Annotation):
     """
@@ -103,11 +101,37 @@ class RegionAnnotation(Annotation):
     def __repr__(self):
         return "<RegionAnnotation %s:%#08x>" % (self.region_id, self.offset)
 
+# The region ID table. ValueSets refer to their regions by the index of the region ID in this table.
+_region_ids = { }
+_region_names = [ ]
+_region_lock = threading.Lock()
+
+def region_index(region):
+    """
+    Returns the index of a region ID in the region ID table, adding it if needed.
+
+    :param region:  The region ID.
+    :return:        The index, an int.
+    """
+    try:
+        return _region_ids[region]
+    except KeyError:
+        with _region_lock:
+            if region not in _region_ids:
+                _region_ids[region] = len(_region_names)
+                _region_names.append(region)
+            return _region_ids[region]
+
 class ValueSet(BackendObject):
     """
     ValueSet is a mapping between memory regions and corresponding offsets.
+
+    Most ValueSets have a single region, which is stored inline. The others keep a map from region index (see
+    :func:`region_index`) to an (offset, base address) pair. The map is shared by copies until one of them modifies it.
     """
 
+    __slots__ = ('_name', '_bits', '_si', '_reversed', '_rid', '_offset', '_base', '_map', '_map_shared')
+
     def __init__(self, name=None, region=None, region_base_addr=None, bits=None, val=None):
         """
         Constructor.
@@ -119,15 +143,21 @@ class ValueSet(BackendObject):
         :param val: an initial offset
         """
 
-        self._name = 'VS_%d' % next(vs_id_ctr) if name is None else name
+        # nameless ValueSets are named on demand, see the name property
+        self._name = name
         if bits is None:
             raise ClaripyVSAError('bits must be specified when creating a ValueSet.')
 
         self._bits = bits
 
         self._si = StridedInterval.empty(bits)
-        self._regions = {}
-        self._region_base_addrs = {}
+
+        # the single region, or the map of regions if there are several of them
+        self._rid = None
+        self._offset = None
+        self._base = None
+        self._map = None
+        self._map_shared = False
 
         self._reversed = False
 
@@ -158,6 +188,8 @@ class ValueSet(BackendObject):
 
     @property
     def name(self):
+        if self._name is None:
+            return 'VS_%x' % id(self)
         return self._name
 
     @property
@@ -166,7 +198,10 @@ class ValueSet(BackendObject):
 
     @property
     def regions(self):
-        return self._regions
+        """
+        A dict of region ID to offset. Modifying it does not modify the ValueSet.
+        """
+        return { _region_names[rid]: offset for rid, offset, _ in self._entries() }
 
     @property
     def reversed(self):
@@ -174,19 +209,19 @@ class ValueSet(BackendObject):
 
     @property
     def unique(self):
-        return len(self.regions) == 1 and self.regions.values()[0].unique
+        return self._map is None and self._rid is not None and self._offset.unique
 
     @property
     def cardinality(self):
         card = 0
-        for region in self._regions:
-            card += self._regions[region].cardinality
+        for _, offset, _ in self._entries():
+            card += offset.cardinality
 
         return card
 
     @property
     def is_empty(self):
-        return len(self._regions) == 0
+        return self._rid is None and self._map is None
 
     @property
     def valueset(self):
@@ -196,6 +231,72 @@ class ValueSet(BackendObject):
     # Private methods
     #
 
+    def _entries(self):
+        """
+        Returns a list of (region index, offset, base address) of all regions.
+        """
+        if self._rid is not None:
+            return [ (self._rid, self._offset, self._base) ]
+        if self._map is not None:
+            return [ (rid, offset, base) for rid, (offset, base) in self._map.items() ]
+        return [ ]
+
+    def _get(self, rid):
+        """
+        Returns the (offset, base address) of a region, or None.
+        """
+        if self._rid is not None:
+            return (self._offset, self._base) if rid == self._rid else None
+        if self._map is not None:
+            return self._map.get(rid, None)
+        return None
+
+    def _put(self, rid, offset, base):
+        if self._map is None:
+            if self._rid is None or self._rid == rid:
+                self._rid, self._offset, self._base = rid, offset, base
+                return
+            # the second region
+            self._map = { self._rid: (self._offset, self._base) }
+            self._map_shared = False
+            self._rid = self._offset = self._base = None
+
+        elif self._map_shared:
+            self._map = self._map.copy()
+            self._map_shared = False
+
+        self._map[rid] = (offset, base)
+
+    def _remove(self, rid):
+        if self._map is None:
+            if self._rid == rid:
+                self._rid = self._offset = self._base = None
+            return
+
+        if self._map_shared:
+            self._map = self._map.copy()
+            self._map_shared = False
+        self._map.pop(rid, None)
+
+        if len(self._map) == 1:
+            # back to a single region
+            self._rid, (self._offset, self._base) = next(iter(self._map.items()))
+            self._map = None
+
+    def _map_offsets(self, f, drop_empty=False):
+        """
+        Returns a new ValueSet with the same regions, where each offset is replaced by f(offset).
+
+        :param drop_empty:  Drop the regions for which f returns an empty StridedInterval.
+        """
+        vs = ValueSet(bits=self._bits)
+        vs._reversed = self._reversed
+        for rid, offset, base in self._entries():
+            offset = f(offset)
+            if not drop_empty or not offset.is_empty:
+                vs._put(rid, offset, base)
+        return vs
+
     def _set_si(self, region, region_base_addr, si):
         if isinstance(si, numbers.Number):
             si = StridedInterval(bits=self.bits, stride=0, lower_bound=si, upper_bound=si)
@@ -208,8 +309,7 @@ class ValueSet(BackendObject):
         if not isinstance(si, StridedInterval):
             raise ClaripyVSAOperationError('Unsupported type %s for si' % type(si))
 
-        self._regions[region] = si
-        self._region_base_addrs[region] = region_base_addr
+        self._put(region_index(region), si, region_base_addr)
         self._si = self._si.union(region_base_addr + si)
 
     def _merge_si(self, region, region_base_addr, si):
@@ -219,11 +319,12 @@ class ValueSet(BackendObject):
                                                upper_bound=region_base_addr
                                                )
 
-        if region not in self._regions:
+        rid = region_index(region)
+        old = self._get(rid)
+        if old is None:
             self._set_si(region, region_base_addr, si)
         else:
-            self._regions[region] = self._regions[region].union(si)
-            self._region_base_addrs[region] = self._region_base_addrs[region].union(region_base_addr)
+            self._put(rid, old[0].union(si), old[1].union(region_base_addr))
             self._si = self._si.union(region_base_addr + si)
 
     #
@@ -235,7 +336,7 @@ class ValueSet(BackendObject):
         return ValueSet(bits=bits)
 
     def items(self):
-        return self._regions.items()
+        return [ (_region_names[rid], offset) for rid, offset, _ in self._entries() ]
 
     def size(self):
         return len(self)
@@ -248,17 +349,26 @@ class ValueSet(BackendObject):
         :rtype: ValueSet
         """
 
-        vs = ValueSet(bits=self.bits)
-        vs._regions = self._regions.copy()
-        vs._region_base_addrs = self._region_base_addrs.copy()
+        vs = _new_vs(ValueSet)
+        vs._name = None
+        vs._bits = self._bits
+        vs._si = self._si
         vs._reversed = self._reversed
-        vs._si = self._si.copy()
+        vs._rid = self._rid
+        vs._offset = self._offset
+        vs._base = self._base
+        vs._map = self._map
+        if self._map is not None:
+            # the map is copied by whichever of them modifies it first
+            self._map_shared = True
+        vs._map_shared = self._map_shared
 
         return vs
 
     def get_si(self, region):
-        if region in self._regions:
-            return self._regions[region]
+        r = self._get(_region_ids.get(region, None))
+        if r is not None:
+            return r[0]
         # TODO: Should we return a None, or an empty SI instead?
         return None
 
@@ -279,16 +389,14 @@ class ValueSet(BackendObject):
         return vs
 
     def __repr__(self):
-        s = ""
-        for region, si in self._regions.items():
-            s = "%s: %s" % (region, si)
+        s = ", ".join("%s: %s" % (region, si) for region, si in self.items())
         return "(" + s + ")"
 
     def __len__(self):
         return self._bits
 
     def __hash__(self):
-        return hash(tuple((r, hash(self._regions[r])) for r in self._regions))
+        return hash(tuple((_region_names[rid], hash(offset)) for rid, offset, _ in self._entries()))
 
     #
     # Arithmetic operations
@@ -307,14 +415,12 @@ class ValueSet(BackendObject):
         :rtype: ValueSet
         """
 
-        new_vs = ValueSet(bits=self.bits)
+        new_vs = self._map_offsets(lambda si: si + other)
+        new_vs._reversed = False
 
         # Call __add__ on self._si
         new_vs._si = self._si.__add__(other)
 
-        for region in self._regions:
-            new_vs._regions[region] = self._regions[region] + other
-
         return new_vs
 
     @normalize_types_one_arg
@@ -337,9 +443,10 @@ class ValueSet(BackendObject):
         if isinstance(other, ValueSet):
             # A subtraction between two ValueSets produces a StridedInterval
 
-            if self.regions.keys() == other.regions.keys():
-                for region in self._regions:
-                    deltas.append(self._regions[region] - other._regions[region])
+            entries = self._entries()
+            if { rid for rid, _, _ in entries } == { rid for rid, _, _ in other._entries() }:
+                for rid, offset, _ in entries:
+                    deltas.append(offset - other._get(rid)[0])
 
             else:
                 # TODO: raise the proper exception here
@@ -354,14 +461,11 @@ class ValueSet(BackendObject):
         else:
             # A subtraction between a ValueSet and a StridedInterval produces another ValueSet
 
-            new_vs = self.copy()
+            new_vs = self._map_offsets(lambda si: si - other)
 
             # Call __sub__ on the base class
             new_vs._si = self._si.__sub__(other)
 
-            for region, si in new_vs._regions.items():
-                new_vs._regions[region] = si - other
-
             return new_vs
 
     @normalize_types_one_arg
@@ -377,14 +481,11 @@ class ValueSet(BackendObject):
             raise NotImplementedError()
 
         else:
-            new_vs = self.copy()
+            new_vs = self._map_offsets(lambda si: si % other)
 
             # Call __mode__ on the base class
             new_vs._si = self._si.__mod__(other)
 
-            for region, si in new_vs._regions.items():
-                new_vs._regions[region] = si % other
-
             return new_vs
 
     @normalize_types_one_arg
@@ -414,7 +515,7 @@ class ValueSet(BackendObject):
             # We return a StridedInterval instead
             ret = None
 
-            for region, si in self._regions.items():
+            for _, si, _ in self._entries():
                 r = si.__and__(other)
                 ret = r if ret is None else ret.union(r)
 
@@ -423,12 +524,8 @@ class ValueSet(BackendObject):
         else:
             # We should return a ValueSet here
 
-            new_vs = self.copy()
-
-            for region, si in self._regions.items():
-                r = si.__and__(other)
-
-                new_vs._regions[region] = r
+            new_vs = self._map_offsets(lambda si: si.__and__(other))
+            new_vs._si = self._si
 
             return new_vs
 
@@ -443,9 +540,10 @@ class ValueSet(BackendObject):
         if isinstance(other, ValueSet):
             same = False
             different = False
-            for region, si in other.regions.items():
-                if region in self.regions:
-                    comp_ret = self.regions[region] == si
+            for rid, si, _ in other._entries():
+                mine = self._get(rid)
+                if mine is not None:
+                    comp_ret = mine[0] == si
                     if BoolResult.has_true(comp_ret):
                         same = True
                     if BoolResult.has_false(comp_ret):
@@ -459,8 +557,9 @@ class ValueSet(BackendObject):
                 return MaybeResult()
             return FalseResult()
         elif isinstance(other, StridedInterval):
-            if 'global' in self.regions:
-                return self.regions['global'] == other
+            si = self.get_si('global')
+            if si is not None:
+                return si == other
             else:
                 return FalseResult()
         else:
@@ -488,7 +587,7 @@ class ValueSet(BackendObject):
 
         results = []
 
-        for _, si in self._regions.items():
+        for _, si, _ in self._entries():
             if len(results) < n:
                 results.extend(si.eval(n))
 
@@ -503,10 +602,10 @@ class ValueSet(BackendObject):
         :rtype:  int
         """
 
-        if len(self.regions) != 1:
+        if self._rid is None:
             raise ClaripyVSAOperationError("'min()' onlly works on single-region value-sets.")
 
-        return self.get_si(next(iter(self.regions))).min
+        return self._offset.min
 
     @property
     def max(self):
@@ -517,10 +616,10 @@ class ValueSet(BackendObject):
         :rtype:  int
         """
 
-        if len(self.regions) != 1:
+        if self._rid is None:
             raise ClaripyVSAOperationError("'max()' onlly works on single-region value-sets.")
 
-        return self.get_si(next(iter(self.regions))).max
+        return self._offset.max
 
     def reverse(self):
         # TODO: obviously valueset.reverse is not properly implemented. I'm disabling the old annoying output line for
@@ -545,17 +644,11 @@ class ValueSet(BackendObject):
         if high_bit - low_bit + 1 == self.bits:
             return self.copy()
 
-        if ('global' in self._regions and len(self._regions.keys()) > 1) or \
-            len(self._regions.keys()) > 0:
+        if not self.is_empty:
             si_ret = StridedInterval.top(high_bit - low_bit + 1)
 
         else:
-            if 'global' in self._regions:
-                si = self._regions['global']
-                si_ret = si.extract(high_bit, low_bit)
-
-            else:
-                si_ret = StridedInterval.empty(high_bit - low_bit + 1)
+            si_ret = StridedInterval.empty(high_bit - low_bit + 1)
 
         return si_ret
 
@@ -563,12 +656,12 @@ class ValueSet(BackendObject):
         new_vs = ValueSet(bits=self.bits + b.bits)
         # TODO: This logic is obviously flawed. Correct it later :-(
         if isinstance(b, StridedInterval):
-            for region, si in self._regions.items():
-                new_vs._set_si(region, self._region_base_addrs[region], si.concat(b))
+            for rid, si, base in self._entries():
+                new_vs._set_si(_region_names[rid], base, si.concat(b))
 
         elif isinstance(b, ValueSet):
-            for region, si in self._regions.items():
-                new_vs._set_si(region, self._region_base_addrs[region], si.concat(b.get_si(region)))
+            for rid, si, base in self._entries():
+                new_vs._set_si(_region_names[rid], base, si.concat(b.get_si(_region_names[rid])))
 
         else:
             raise ClaripyVSAOperationError('ValueSet.concat() got an unsupported operand %s (type %s)' % (b, type(b)))
@@ -577,70 +670,63 @@ class ValueSet(BackendObject):
 
     @normalize_types_one_arg
     def union(self, b):
-        merged_vs = self.copy()
-
         if type(b) is ValueSet:
-            for region, si in b.regions.items():
-                if region not in merged_vs._regions:
-                    merged_vs._regions[region] = si
+            merged_vs = self.copy()
+
+            for rid, si, base in b._entries():
+                mine = merged_vs._get(rid)
+                if mine is None:
+                    merged_vs._put(rid, si, base)
                 else:
-                    merged_vs._regions[region] = merged_vs._regions[region].union(si)
+                    merged_vs._put(rid, mine[0].union(si), mine[1])
 
-                merged_vs._si = merged_vs._si.union(b._si)
+            merged_vs._si = merged_vs._si.union(b._si)
 
         else:
-            for region, si in merged_vs._regions.items():
-                merged_vs._regions[region] = merged_vs._regions[region].union(b)
-
-            merged_vs._si = merged_vs._si.union(b)
+            merged_vs = self._map_offsets(lambda si: si.union(b))
+            merged_vs._si = self._si.union(b)
 
         return merged_vs
 
     @normalize_types_one_arg
     def widen(self, b):
-        merged_vs = self.copy()
-
         if isinstance(b, ValueSet):
-            for region, si in b.regions.items():
-                if region not in merged_vs.regions:
-                    merged_vs.regions[region] = si
+            merged_vs = self.copy()
+
+            for rid, si, base in b._entries():
+                mine = merged_vs._get(rid)
+                if mine is None:
+                    merged_vs._put(rid, si, base)
                 else:
-                    merged_vs.regions[region] = merged_vs.regions[region].widen(si)
+                    merged_vs._put(rid, mine[0].widen(si), mine[1])
 
             merged_vs._si = merged_vs._si.widen(b._si)
 
         else:
-            for region in merged_vs._regions:
-                merged_vs._regions[region] = merged_vs._regions[region].widen(b)
-
-            merged_vs._si = merged_vs._si.widen(b)
+            merged_vs = self._map_offsets(lambda si: si.widen(b))
+            merged_vs._si = self._si.widen(b)
 
         return merged_vs
 
     @normalize_types_one_arg
     def intersection(self, b):
-        vs = self.copy()
-
         if isinstance(b, ValueSet):
-            for region, si in b.regions.items():
-                if region not in vs.regions:
-                    pass
-                else:
-                    vs.regions[region] = vs.regions[region].intersection(si)
+            vs = self.copy()
 
-                    if vs.regions[region].is_empty:
-                        del vs.regions[region]
+            for rid, si, _ in b._entries():
+                mine = vs._get(rid)
+                if mine is not None:
+                    r = mine[0].intersection(si)
+                    if r.is_empty:
+                        vs._remove(rid)
+                    else:
+                        vs._put(rid, r, mine[1])
 
             vs._si = vs._si.intersection(b._si)
 
         else:
-            for region in self._regions:
-                vs.regions[region] = vs.regions[region].intersection(b)
-
-                if vs.regions[region].is_empty:
-                    del vs.regions[region]
-
-            vs._si = vs._si.intersection(b)
+            vs = self._map_offsets(lambda si: si.intersection(b), drop_empty=True)
+            vs._si = self._si.intersection(b)
 
         return vs
 
@@ -654,16 +740,15 @@ class ValueSet(BackendObject):
         if self._reversed != o._reversed:
             return False
 
-        for region, si in self.regions.items():
-            if region in o.regions:
-                o_si = o.regions[region]
-                if not si.identical(o_si):
-                    return False
-            else:
+        for rid, si, _ in self._entries():
+            o_si = o._get(rid)
+            if o_si is None or not si.identical(o_si[0]):
                 return False
 
         return True
 
+_new_vs = object.__new__
+
 
 from ..ast.base import Base
 from .strided_interval import StridedInterval
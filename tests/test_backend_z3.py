@@ -0,0 +1,129 @@
+import claripy
+from claripy.backends import BackendZ3
+
+def test_raw_conversion():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    f = claripy.FPS('f', claripy.FSORT_DOUBLE)
+
+    exprs = [
+        claripy.If(x > y, (x + y) * 3, claripy.Concat(x[15:0], y[15:0])) != 7,
+        claripy.And(claripy.Not(x == 1), claripy.SLT(x, y), claripy.Or(x.LShR(y) >> 2 == ~(-y) % 5, x // y <= 3)),
+        claripy.SignExt(32, x).SDiv(claripy.ZeroExt(32, y)) == claripy.BVV(0x1000000000, 64),
+        claripy.RotateLeft(x.reversed, 3) - y,
+        # these go through the z3py fallback
+        claripy.fpToSBV(claripy.fp.RM.RM_TowardsZero, f + f, 32) == x,
+        claripy.BoolV(True),
+        x,
+    ]
+
+    z3py = BackendZ3(raw_conversion=False).convert_list(exprs)
+    raw = BackendZ3(raw_conversion=True).convert_list(exprs)
+    assert len(raw) == len(exprs)
+    for a, b in zip(z3py, raw):
+        assert type(a) is type(b)
+        assert a.eq(b)
+
+    # the converted roots can be used with the regular backend
+    b = BackendZ3(raw_conversion=True)
+    s = b.solver()
+    b.add(s, [ x + y == 10, x - y == 2 ])
+    assert list(b.eval(x, 1, solver=s)) == [ 6 ]
+    assert list(b.eval(y, 1, solver=s)) == [ 4 ]
+
+def test_abstract_deep():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    e = x
+    for i in range(5000):
+        e = (e + y) ^ i
+
+    # this is deeper than the recursion limit
+    b = BackendZ3()
+    z = b.convert(e)
+    r = b._abstract(z)
+    assert b.convert(r).eq(z)
+    assert b._ast_cache.stats()['hits'] == 0
+    assert b._abstract(z) is r
+    assert b._ast_cache.stats()['hits'] == 1
+
+    # a shared subterm is abstracted once
+    r = b._abstract(b.convert((x * y) ^ ((x * y) + 1)))
+    assert r.args[0] is r.args[1].args[0]
+
+    # only terms with arguments are cached
+    b = BackendZ3()
+    b._abstract(b.convert((x + y) * 3))
+    assert len(b._ast_cache) == 2
+
+def test_ast_cache_adapts():
+    from claripy.backends.backend_z3 import SmartLRUCache
+
+    evicted = [ ]
+    c = SmartLRUCache(4, evict=lambda k,v: evicted.append(k), max_size=16, window=20)
+
+    # cycling over 6 keys thrashes 4 entries, so the cache grows
+    for _ in range(5):
+        for k in range(6):
+            try:
+                c[k]
+            except KeyError:
+                c[k] = k
+    assert c.maxsize == 8
+    assert c.stats()['ghost_hits'] > 0
+    assert len(evicted) == c.evictions
+
+    # keys that are never looked up again shrink it back
+    for k in range(100, 200):
+        try:
+            c[k]
+        except KeyError:
+            c[k] = k
+    assert c.maxsize == 4
+    assert len(c) == 4
+
+    c.clear()
+    assert len(c) == 0
+    assert len(evicted) == c.evictions
+
+def test_simplification_cache():
+    import threading
+
+    x = claripy.BVS('x', 32)
+    e = claripy.And(x + 1 > 10, x + 1 > 10, x != 3)
+
+    b = BackendZ3()
+    r = b.simplify(e)
+    assert b._simplification_cache.stats()['misses'] == 1
+    assert b.simplify(e) is r
+    stats = b._simplification_cache.stats()
+    assert stats['hits'] == 1 and stats['time_saved'] > 0
+
+    # the results are shared with the other threads, which convert them into their own contexts
+    results = [ ]
+    def simplify_and_solve():
+        results.append(b.simplify(e))
+        s = b.solver()
+        b.add(s, [ b.convert(results[0]) ])
+        results.append(b.satisfiable(solver=s))
+    t = threading.Thread(target=simplify_and_solve)
+    t.start()
+    t.join()
+    assert results == [ r, True ]
+    assert b._simplification_cache.hits == 2
+
+    # old entries are only held weakly
+    b._simplification_cache.trim(1)
+    assert len(b._simplification_cache) == 0
+    assert b.simplify(e) is r
+    assert len(b._simplification_cache) == 1
+
+    b = BackendZ3(simplification_cache_size=0)
+    assert b.simplify(e) is not None
+    assert b._simplification_cache is None
+
+if __name__ == '__main__':
+    test_raw_conversion()
+    test_abstract_deep()
+    test_ast_cache_adapts()
+    test_simplification_cache()
@@ -196,6 +196,95 @@ def test_complex_case_2():
     assert r[0][0] is x
 
 
+def test_balancer_cache():
+    from claripy.profiling import profiler
+
+    cache = claripy.balancer._balancer_cache
+    cache.clear()
+    x = claripy.BVS('x', 32)
+    c = x <= claripy.BVV(39, 32)
+
+    s, r = claripy.balancer.balance(claripy.backends.vsa, c)
+    assert s is True
+    assert cache.stats()['misses'] >= 1 and len(cache) == 1
+    hits = cache.hits
+    assert claripy.balancer.balance(claripy.backends.vsa, c) == (s, r)
+    assert cache.hits == hits + 1
+
+    # the same truism is queued once, even if it is reached several times
+    b = claripy.balancer.Balancer(claripy.backends.vsa, claripy.If(x > 10, claripy.false, claripy.true))
+    b._queue_truism(x <= 10)
+    n = len(b._truisms)
+    b._queue_truism(x <= 10)
+    assert len(b._truisms) == n
+
+    # sibling frontends share the results, and the balancing time of each add is reported
+    profiler.reset()
+    profiler.enable()
+    try:
+        parent = claripy.SolverReplacement(claripy.SolverVSA(), complex_auto_replace=True)
+        for _ in range(2):
+            child = parent.branch()
+            child.add([ c ])
+            assert child.max(x) == 39
+    finally:
+        profiler.disable()
+    assert cache.hits >= hits + 3
+    assert profiler.snapshot()['timings']['ReplacementFrontend.balance']['count'] == 2
+
+def test_bounds_store():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+
+    # later constraints are balanced against the bounds of the earlier ones
+    s = claripy.SolverHybrid()
+    s.add([ x < 0x100 ])
+    s.add([ claripy.Extract(7, 0, x) == 5 ])
+    assert s.min(x, exact=False) == 5 and s.max(x, exact=False) == 5
+
+    s = claripy.SolverHybrid()
+    s.add([ y == 4 ])
+    s.add([ x << y == 0x50 ])
+    assert s.max(x, exact=False) == 5
+
+    s = claripy.SolverHybrid()
+    s.add([ x < 5 ])
+    s.add([ x > 10 ])
+    assert not s.satisfiable(exact=False)
+
+    # the side truisms of balancing (here, x+3 >= 0 turns into x >= 0xfffffffd) do not make a constraint unsat
+    s = claripy.SolverHybrid()
+    s.add([ x + 3 == 0xb24 ])
+    s.add([ (x + 3).ULE(0xd805) ])
+    assert s.satisfiable(exact=False)
+    assert s.satisfiable()
+
+    # the bounds of a long chain are kept as a single intersection, and branches only copy them when they diverge
+    s = claripy.SolverReplacement(claripy.SolverVSA(), complex_auto_replace=True)
+    for i in range(50):
+        s.add([ x < 1000 - i ])
+    bounds = s._bounds
+    assert len(bounds) == 1
+    assert bounds.get(x).depth == 2
+    assert s.max(x) == 950
+
+    child = s.branch()
+    child.add([ x < 100 ])
+    assert child.max(x) == 99
+    assert s.max(x) == 950
+    assert bounds.get(x).depth == 2 and s._bounds._bounded is bounds._bounded
+
+    # dropping the replacements drops their bounds too
+    s = claripy.SolverReplacement(claripy.SolverVSA(), complex_auto_replace=True)
+    s.add([ x < 100, y < 100 ])
+    s.remove_replacements([ x.cache_key ])
+    s.add([ x > 50, y > 50 ])
+    assert s.max(x) == 0xffffffff and s.max(y) == 99
+    s.clear_replacements()
+    s.add([ y > 60 ])
+    assert s.max(y) == 0xffffffff
+
+
 if __name__ == '__main__':
     test_overflow()
     test_simple_guy()
@@ -204,3 +293,5 @@ if __name__ == '__main__':
     test_complex_case_0()
     test_complex_case_1()
     test_complex_case_2()
+    test_balancer_cache()
+    test_bounds_store()
@@ -44,6 +44,28 @@ def test_bv():
     assert ~zero == 255
 
 
+def test_bv_objects():
+    a = BVV(0xdeadbeef, 32)
+    b = BVV(-1, 32)
+    assert not hasattr(a, '__dict__')
+    assert b.value == 0xffffffff and b.signed == -1 and b.mod == 2**32
+    assert hash(a) == hash(BVV(0xdeadbeef + 2**32, 32))
+    assert hash(a) != hash(BVV(0xdeadbeef, 64))
+
+    # other numbers are converted to the size of the BVV
+    assert a + 0x21524111 == 0
+    assert (a ^ b).size() == 32
+    assert a.__add__("nope") is NotImplemented
+    nose.tools.assert_raises(ClaripyTypeError, lambda: a + BVV(1, 64))
+    nose.tools.assert_raises(ClaripyTypeError, lambda: a < BVV(1, 64))
+    nose.tools.assert_raises(ClaripyTypeError, lambda: a == BVV(0xdeadbeef, 64))
+
+    # wide bitvectors are masked too
+    c = BVV(2**300 + 5, 300)
+    assert (c * c).value == 25
+    assert (-c).signed == -5
+
+
 def test_zero_length():
     a = BVV(1, 8)
     b = BVV(0, 0)
@@ -0,0 +1,150 @@
+import cachetools
+
+import claripy
+from claripy import caches
+from claripy.profiling import profiler
+
+def test_cache_stats():
+    profiler.reset()
+    profiler.enable()
+    try:
+        x = claripy.BVS('x', 32)
+        claripy.BVV(1337, 32)
+        claripy.BVV(1337, 32)
+        s = claripy.Solver()
+        s.add(x + 1 == 10)
+        assert s.eval(x, 1)[0] == 9
+    finally:
+        profiler.disable()
+
+    stats = caches.cache_stats()
+    for name in ('ast.hash_cons', 'ast.bvv', 'ast.excavation', 'BackendZ3.object_cache', 'BackendZ3.ast_cache', 'BackendVSA.true_cache'):
+        assert name in stats
+    assert stats['ast.hash_cons']['entries'] > 0
+    assert stats['ast.hash_cons']['bytes'] > 0
+    assert not stats['ast.hash_cons']['trimmable']
+    assert stats['ast.bvv']['hits'] >= 1
+    assert stats['ast.bvv']['misses'] >= 1
+    assert 0 < stats['ast.bvv']['hit_rate'] < 1
+    assert stats['BackendZ3.object_cache']['entries'] > 0
+    assert stats['BackendZ3.object_cache']['misses'] > 0
+
+def test_trim_cache():
+    d = { i: i for i in range(100) }
+    assert caches.trim_cache(d, 0.25) == 25
+    assert len(d) == 75
+    assert min(d) == 25
+
+    # LRU caches drop their least recently used entries first
+    c = cachetools.LRUCache(100)
+    for i in range(10):
+        c[i] = i
+    assert c[0] == 0
+    assert caches.trim_cache(c, 0.5) == 5
+    assert sorted(c) == [ 0, 6, 7, 8, 9 ]
+
+def test_bvv_cache():
+    c = claripy.ast.bv.BVVCache(maxsize=4, hot_limit=2, hot_sizes=(32,))
+    hot = [ claripy.BVV(0, 32), claripy.BVV(1, 32), claripy.BVV(-1, 32) ]
+    for v in hot:
+        c[v.args] = v
+    for i in range(10, 20):
+        c[(i, 32)] = claripy.BVV(i, 32)
+    c[(3, 8)] = claripy.BVV(3, 8)
+
+    # the hot constants are never evicted, the others are bounded
+    assert len(c) == 3 + 4
+    assert c[(0xffffffff, 32)] is hot[2]
+    assert (3, 8) in c and (17, 32) in c and (16, 32) not in c
+    c[(17, 32)]
+    c[(20, 32)] = claripy.BVV(20, 32)
+    assert (17, 32) in c and (18, 32) not in c
+
+    assert c.trim(0.5) == 2
+    assert len(c) == 3 + 2
+    stats = c.stats()
+    assert stats['hot'] == 3 and stats['lru'] == 2
+    assert stats['hits'] == 2
+    assert stats['evictions'] == 10
+
+    c.clear()
+    assert len(c) == 0
+
+    # annotated constants do not replace the shared ones
+    x = claripy.BVV(0x1234567, 32)
+    claripy.BVV(0x1234567, 32, annotations=(claripy.SimplificationAvoidanceAnnotation(),))
+    assert claripy.BVV(0x1234567, 32) is x
+
+    claripy.reset()
+    assert len(claripy.ast.bv._bvv_cache) == 0
+
+def test_object_cache_policies():
+    from claripy.backends import BackendConcrete, BackendZ3, LRUObjectCache, ArenaObjectCache
+
+    x = claripy.BVS('x', 32)
+    e = (x + 1) * (x + 1)
+
+    b = BackendZ3(object_cache=lambda: LRUObjectCache(maxsize=2), raw_conversion=False)
+    b.convert(e)
+    assert len(b._object_cache) == 2
+    b.convert(x + 1)
+    assert b._object_cache.hits == 1
+    assert b._object_cache.stats()['misses'] == 4
+
+    b = BackendZ3(object_cache=ArenaObjectCache, raw_conversion=False)
+    b.convert(e)
+    # nothing outlives the conversion
+    assert len(b._object_cache) == 0
+    with b.object_cache_scope():
+        b.convert(e)
+        b.convert(x + 1)
+        assert len(b._object_cache) == 4
+    assert len(b._object_cache) == 0
+
+    # the default, weak policy
+    b = BackendConcrete()
+    v = claripy.BVV(0x1234, 32)
+    b.convert(v)
+    b.convert(v)
+    assert len(b._object_cache) == 1
+    assert b._object_cache.stats() == { 'entries': 1, 'hits': 1, 'misses': 1 }
+
+def test_memory_policy():
+    claripy.BVV(0xdeadbeef, 32)
+
+    # under the soft limit: nothing happens
+    p = caches.MemoryPressurePolicy(soft_limit=1 << 60)
+    assert p.poll() is None
+
+    # over the soft limit: one cache is trimmed per poll
+    p = caches.MemoryPressurePolicy(soft_limit=0, interval=0)
+    victim = p.poll()
+    assert victim is not None
+    assert caches.cache_stats()[victim]['trimmable']
+    assert p.trims == 1
+
+    # over the hard limit: everything goes
+    claripy.BVV(0xdeadbeef, 32)
+    p = caches.MemoryPressurePolicy(soft_limit=0, hard_limit=0)
+    assert p.poll() == 'downsize'
+    assert len(claripy.ast.bv._bvv_cache) == 0
+
+    # the installed policy is polled by the frontends
+    claripy.BVV(0xdeadbeef, 32)
+    p = caches.MemoryPressurePolicy(soft_limit=0, interval=0)
+    caches.set_memory_policy(p)
+    try:
+        s = claripy.Solver()
+        y = claripy.BVS('y', 32)
+        s.add(y > 1)
+        assert len(s.eval(y, 2)) == 2
+    finally:
+        caches.set_memory_policy(None)
+    assert p.trims > 0
+
+if __name__ == '__main__':
+    test_cache_stats()
+    test_trim_cache()
+    test_bvv_cache()
+    test_object_cache_policies()
+    test_memory_policy()
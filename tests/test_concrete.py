@@ -26,6 +26,74 @@ def test_concrete_fp():
     f = claripy.FPV(1.0, claripy.FSORT_FLOAT)
     nose.tools.assert_equal(claripy.backends.concrete.eval(f, 2), (1.0,))
 
+def test_concrete_convert_list():
+    bc = claripy.backends.concrete
+    calls = [ ]
+    op = bc._op_raw['__add__']
+    bc._op_raw['__add__'] = lambda *args: calls.append(args) or op(*args)
+    try:
+        # concrete objects are not cached, but the shared sum is only computed once per batch. the ASTs are built
+        # without eager evaluation, which would fold them into constants.
+        BV = claripy.ast.BV
+        a = BV('__add__', (claripy.BVV(1, 32), claripy.BVV(2, 32)), length=32, eager_backends=None)
+        b = BV('__mul__', (a, claripy.BVV(2, 32)), length=32, eager_backends=None)
+        c = BV('__mul__', (a, claripy.BVV(3, 32)), length=32, eager_backends=None)
+        results = bc.convert_list([ b, c, a, 4 ])
+    finally:
+        bc._op_raw['__add__'] = op
+    nose.tools.assert_equal(results, [ 6, 9, 3, 4 ])
+    nose.tools.assert_equal(len(calls), 1)
+
+def test_concrete_fold():
+    bc = claripy.backends.concrete
+
+    def check(op, args):
+        folded = bc.fold(op, args)
+        try:
+            called = bc._abstract(bc.call(op, args))
+        except (claripy.BackendError, claripy.ClaripyError, ValueError):
+            # folding leaves the errors to the regular evaluation
+            nose.tools.assert_is_none(folded)
+            return
+        if folded is not None:
+            nose.tools.assert_is(folded, called)
+
+    for size in (1, 8, 32):
+        values = [ claripy.BVV(v, size) for v in { 0, 1, 3, 2**(size-1), 2**size - 1, 2**size - 5 } ]
+        for a in values:
+            for op in ('__invert__', '__neg__'):
+                check(op, (a,))
+            check('Extract', (size - 1, 0, a))
+            check('ZeroExt', (8, a))
+            check('SignExt', (8, a))
+            for b in values:
+                for op in ('__add__', '__sub__', '__mul__', '__and__', '__or__', '__xor__', '__floordiv__', '__mod__',
+                           'SDiv', 'SMod', '__lshift__', '__rshift__', 'LShR', '__eq__', '__ne__', 'ULT', 'ULE',
+                           'UGT', 'UGE', 'SLT', 'SLE', 'SGT', 'SGE', 'Concat'):
+                    check(op, (a, b))
+                check('If', (claripy.true, a, b))
+                check('If', (claripy.false, a, b))
+
+    for a in (claripy.true, claripy.false):
+        check('Not', (a,))
+        for b in (claripy.true, claripy.false):
+            check('And', (a, b))
+            check('Or', (a, b))
+            check('__eq__', (a, b))
+
+    # the shortcut is taken by eager evaluation
+    a = claripy.BVV(0x12345678, 32)
+    nose.tools.assert_is(a + a, claripy.BVV(0x2468acf0, 32))
+    nose.tools.assert_is(claripy.SLT(claripy.BVV(-1, 32), a), claripy.true)
+    nose.tools.assert_is(claripy.Concat(a[7:0], a[31:24]), claripy.BVV(0x7812, 16))
+    # but not for annotated or symbolic arguments
+    x = claripy.BVS('x', 32)
+    nose.tools.assert_is_none(bc.fold('__add__', (a, x)))
+    b = claripy.BVV(1, 32, annotations=(claripy.SimplificationAvoidanceAnnotation(),))
+    nose.tools.assert_is_none(bc.fold('__add__', (a, b)))
+
 if __name__ == '__main__':
     test_concrete()
     test_concrete_fp()
+    test_concrete_convert_list()
+    test_concrete_fold()
@@ -514,6 +514,54 @@ def test_bool_conversion():
     except claripy.ClaripyOperationError:
         pass
 
+
+def test_op_coercion():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 16)
+
+    # arguments of the right types and lengths
+    assert (x + x).op == '__add__'
+    assert claripy.Concat(x, y).length == 48
+    # arguments that need to be coerced
+    assert (x + 1).args[1] is claripy.BVV(1, 32)
+    assert (1 - x).args[0] is claripy.BVV(1, 32)
+    # and arguments that cannot be
+    nose.tools.assert_raises(claripy.ClaripyOperationError, lambda: x + y)
+    nose.tools.assert_raises(claripy.ClaripyOperationError, lambda: claripy.ULT(x, y))
+
+    # the rounding mode of fp operations is optional
+    f = claripy.FPS('f', claripy.FSORT_DOUBLE)
+    assert (f + f).args[0] is claripy.fp.RM.default()
+
+
+def test_excavation_memo():
+    from claripy.ast.base import _excavation_memo
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    e = claripy.If(x > 10, x, y)
+    for i in range(40):
+        # e is used twice, so walking this as a tree would never finish
+        e = (e + claripy.If(y == i, x, y)) ^ (e * 3)
+
+    _excavation_memo.clear()
+    hits = _excavation_memo.hits
+    sub = e.args[0].args[0]
+    r = e.ite_excavated
+    nose.tools.assert_equal(r.op, 'If')
+    nose.tools.assert_true(len(_excavation_memo) > 0)
+
+    # the interior nodes are remembered, so excavating another expression over them does not walk them again
+    nose.tools.assert_is(sub.ite_excavated, _excavation_memo.get(sub._hash))
+    (e + 1).ite_excavated
+    nose.tools.assert_true(_excavation_memo.hits > hits)
+
+    n = len(_excavation_memo)
+    nose.tools.assert_equal(_excavation_memo.trim(0.5), (n + 1) // 2)
+    claripy.reset()
+    nose.tools.assert_equal(len(_excavation_memo), 0)
+
+
 if __name__ == '__main__':
     test_multiarg()
     test_depth()
@@ -534,3 +582,5 @@ if __name__ == '__main__':
     test_signed_symbolic()
     test_arith_shift()
     test_bool_conversion()
+    test_op_coercion()
+    test_excavation_memo()
@@ -0,0 +1,48 @@
+import json
+
+import claripy
+from claripy.profiling import profiler
+
+class ProfiledSolver(claripy.frontend_mixins.ProfilingMixin, claripy.Solver):
+    pass
+
+def test_profiling_disabled():
+    profiler.reset()
+    s = ProfiledSolver()
+    x = claripy.BVS('x', 32)
+    s.add([x > 10])
+    assert s.satisfiable()
+    snapshot = profiler.snapshot()
+    assert snapshot['timings'] == { }
+    assert snapshot['counters'] == { }
+
+def test_profiling():
+    profiler.reset()
+    profiler.enable()
+    try:
+        s = ProfiledSolver()
+        x = claripy.BVS('x', 32)
+        s.add([x > 10, x < 20])
+        assert s.satisfiable()
+        assert s.satisfiable()
+        assert s.max(x) == 19
+        assert len(s.eval(x, 3)) == 3
+    finally:
+        profiler.disable()
+
+    snapshot = json.loads(profiler.to_json())
+    timings = snapshot['timings']
+    # max() and eval() go through satisfiable() as well
+    assert timings['ProfiledSolver.satisfiable']['count'] >= 2
+    assert timings['ProfiledSolver.max']['count'] == 1
+    assert timings['BackendZ3.convert']['count'] > 0
+    assert timings['BackendZ3._solver_check']['count'] > 0
+    assert timings['ProfiledSolver.max']['p50'] <= timings['ProfiledSolver.max']['max']
+
+    assert snapshot['values']['ProfiledSolver.constraints']['max'] >= 2
+    assert snapshot['counters']['sat_cache.hit'] >= 1
+    assert 0 < snapshot['hit_rates']['sat_cache'] <= 1
+
+if __name__ == '__main__':
+    test_profiling_disabled()
+    test_profiling()
@@ -0,0 +1,77 @@
+import io
+
+import claripy
+from claripy.query_log import QueryLog, read_query_log, replay_query_log
+
+class RecordedSolver(claripy.frontend_mixins.QueryRecorderMixin, claripy.Solver):
+    pass
+
+def _record(f, memo_limit=100000):
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+
+    log = QueryLog(f, memo_limit=memo_limit)
+    s = RecordedSolver(query_log=log)
+    s.add([x > 10, x < 20])
+    assert s.satisfiable()
+    assert s.min(x) == 11
+    assert s.max(x) == 19
+
+    s2 = s.branch()
+    s2.add([y == x + 1])
+    assert s2.eval(y, 1)[0] in range(12, 21)
+    assert not s2.satisfiable(extra_constraints=(x == 30,))
+    assert s.solution(x, 15)
+    log.close()
+
+def test_record():
+    f = io.BytesIO()
+    _record(f)
+    f.seek(0)
+
+    records = list(read_query_log(f))
+    methods = [ r.method for r in records ]
+    # max() calls eval() internally, but only the outer call is recorded
+    assert methods == [ '__init__', 'add', 'satisfiable', 'min', 'max', 'branch', 'add', 'eval', 'satisfiable', 'solution' ]
+    assert records[5].result.id == records[6].frontend_id
+    assert records[3].result == 11
+    assert all(r.elapsed >= 0 for r in records)
+
+def test_replay():
+    for memo_limit in (100000, 2):
+        f = io.BytesIO()
+        _record(f, memo_limit=memo_limit)
+
+        for factory in (claripy.Solver, claripy.SolverComposite, claripy.SolverCacheless):
+            f.seek(0)
+            stats = replay_query_log(f, solver_factory=factory)
+            report = stats.report()
+            assert report['queries'] == 9
+            assert report['mismatches'] == 0
+            assert report['methods']['add']['count'] == 2
+            assert report['latency']['max'] >= report['latency']['p50']
+
+def test_unpicklable_call():
+    x = claripy.BVS('x', 32)
+    f = io.BytesIO()
+    log = QueryLog(f)
+    s = RecordedSolver(query_log=log)
+    s.add([x > 10])
+    size = len(f.getvalue())
+    # the lambda is only found after more than a pickle frame of the record has been written
+    try:
+        s.satisfiable(extra_constraints=(x < 20, b'a' * 0x20000, lambda: None))
+    except claripy.ClaripyError:
+        pass
+    s.add([x < 20])
+    log.close()
+
+    # nothing of the failed record was written, and the records before it can still be read
+    assert len(f.getvalue()) == size
+    f.seek(0)
+    assert [ r.method for r in read_query_log(f) ] == [ '__init__', 'add' ]
+
+if __name__ == '__main__':
+    test_record()
+    test_replay()
+    test_unpicklable_call()
@@ -117,9 +117,79 @@ def perf():
                         setup="from __main__ import perf_boolean_and_simplification_1"))
 
 
+def test_simplification_rules():
+    from claripy.simplifications import simpleton, SimplificationManager, Rule
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+
+    simpleton.reset_stats()
+    assert claripy.Not(claripy.ULT(x, y)) is claripy.UGE(x, y)
+    assert x.reversed.reversed is x
+    stats = simpleton.rule_stats()
+    assert stats['not_comparison']['hits'] == 1
+    assert stats['reverse_reverse']['hits'] == 1
+    # the other rules for Not were not even tried
+    assert stats['not_eq']['tries'] == 0 and stats['not_if']['tries'] == 0
+
+    # rules can be turned off
+    simpleton.disable('reverse_reverse')
+    try:
+        assert x.reversed.reversed.op == 'Reverse'
+    finally:
+        simpleton.enable('reverse_reverse')
+    assert x.reversed.reversed is x
+
+    # and new ones added
+    m = SimplificationManager()
+    m.add_rule(Rule('div_by_one', '__floordiv__', (None, 'BVV'), lambda a, b: a if b.args[0] == 1 else None))
+    assert m.simplify('__floordiv__', (x, claripy.BVV(1, 32))) is x
+    assert m.simplify('__floordiv__', (x, claripy.BVV(2, 32))) is None
+    assert m.simplify('__floordiv__', (x, y)) is None
+    assert m.rule_stats()['div_by_one'] == { 'tries': 2, 'hits': 1, 'enabled': True }
+
+
+def test_simplification_memo():
+    from claripy.simplifications import SimplificationManager
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    m = SimplificationManager(memo_size=3)
+
+    assert m.simplify('Reverse', (x.reversed,)) is x
+    assert m.simplify('Reverse', (x.reversed,)) is x
+    assert m.rule_stats()['reverse_reverse']['tries'] == 1
+    # operations that cannot be simplified are remembered too
+    assert m.simplify('__add__', (x, y)) is None
+    assert m.simplify('__add__', (x, y)) is None
+    assert m.memo.stats()['hits'] == 2
+    assert m.memo.stats()['misses'] == 2
+
+    # annotated arguments are different entries
+    annotated = x.annotate(claripy.SimplificationAvoidanceAnnotation())
+    assert m.simplify('__add__', (annotated, y)) is None
+    assert m.memo.stats()['misses'] == 3
+    assert len(m.memo) == 3
+
+    # the memo is bounded, and cleared when the rules change
+    m.simplify('__sub__', (x, x))
+    assert len(m.memo) == 3
+    m.disable('reverse_reverse')
+    assert len(m.memo) == 0
+    assert m.simplify('Reverse', (x.reversed,)) is None
+
+    # operations without rules do not go through the memo
+    m.simplify('__floordiv__', (x, y))
+    assert len(m.memo) == 1
+
+    assert SimplificationManager(memo_size=0).simplify('Reverse', (x.reversed,)) is x
+
+
 if __name__ == '__main__':
     test_simplification()
     test_bool_simplification()
     test_rotate_shift_mask_simplification()
     test_reverse_extract_reverse_simplification()
     test_reverse_concat_reverse_simplification()
+    test_simplification_rules()
+    test_simplification_memo()
@@ -479,6 +479,46 @@ def test_simplification_annotations():
     s.simplify()
     assert len(s.constraints) == 2
 
+def test_incremental_simplification():
+    from claripy.frontends import constrained_frontend
+
+    simplified = [ ]
+    def simplify(e):
+        simplified.append(e)
+        return claripy.simplify(e)
+
+    x = claripy.BVS("x", 32)
+    y = claripy.BVS("y", 32)
+    z = claripy.BVS("z", 32)
+
+    original = constrained_frontend.simplify
+    constrained_frontend.simplify = simplify
+    try:
+        s = claripy.Solver()
+        s.add(x > 10)
+        s.add(y == 3)
+        s.add(x > 11)
+        s.simplify()
+        assert len(simplified) == 2
+        assert len(s.constraints) == 2
+
+        # only the set of constraints on z is new
+        s.add(z < 5)
+        s.simplify()
+        assert len(simplified) == 3
+        assert simplified[-1].variables == z.variables
+        assert [ c.variables for c in s.constraints ] == [ x.variables, y.variables, z.variables ]
+
+        # branches keep what was simplified
+        t = s.branch()
+        t.add(x < 100)
+        t.simplify()
+        assert len(simplified) == 4
+        assert simplified[-1].variables == x.variables
+        assert t.max(x) == 99
+    finally:
+        constrained_frontend.simplify = original
+
 def raw_ancestor_merge(solver, reuse_z3_solver):
     claripy._backend_z3.reuse_z3_solver = reuse_z3_solver
 
@@ -556,6 +596,128 @@ def test_zero_division_in_cache_mixin():
     s.add(denum == 3)
     assert not s.satisfiable()
 
+def test_replacement_cache():
+    from claripy.utils import PersistentMap
+
+    m = PersistentMap()
+    maps = [ ]
+    for i in range(100):
+        maps.append(m)
+        m = m.set(i, i * 2)
+    m = m.delete(7)
+    assert len(m) == 99 and 7 not in m and m[8] == 16
+    assert len(maps[50]) == 50 and maps[50][49] == 98 and 50 not in maps[50]
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    z = claripy.BVS('z', 32)
+    s = claripy.SolverReplacement()
+    s.add([ x == 1 ])
+    assert s._replacement(y + 1) is y + 1
+    # the rewrites are weak, so the rewritten AST is kept alive
+    x1 = x + 1
+    assert s._replacement(x1) is claripy.BVV(2, 32)
+    cache = s._replacement_cache
+
+    # a new replacement only drops the rewrites that involve its variables
+    s.add([ y == 2 ])
+    assert s._replacement_cache is cache
+    assert x1.cache_key in cache
+    assert s._replacement(y + 1) is claripy.BVV(3, 32)
+
+    # branches share the replacements, and the first one to add one builds its own cache
+    b = s.branch()
+    b.add([ z == 3 ])
+    assert b._replacement(z + y) is claripy.BVV(5, 32)
+    assert s._replacement(z + y) is z + 2
+    assert s._replacement_cache is cache and b._replacement_cache is not cache
+    assert len(s._replacements) == 2 and len(b._replacements) == 3
+
+    # rewrites do not keep the rewritten ASTs alive
+    import gc, weakref
+    refs = [ ]
+    for i in range(20):
+        e = (y + i) * 3
+        refs.append(weakref.ref(e))
+        assert s._replacement(e) is claripy.BVV((2 + i) * 3, 32)
+    del e
+    gc.collect()
+    assert not any(r() is not None for r in refs)
+
+def test_hybrid_concurrency():
+    import concurrent.futures
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    constraints = [ x <= 10, x % 2 == 0, x != 8, y == x * 3 ]
+
+    expected = claripy.SolverHybrid()
+    expected.add(constraints)
+    for concurrency, budget in (('race', 0.01), ('speculative', 0), ('speculative', 10)):
+        s = claripy.SolverHybrid(concurrency=concurrency, approximate_budget=budget)
+        s.add(constraints)
+        # an approximate call gets the answer of whichever path wins
+        for exact in (False, True):
+            answers = (expected.min(x, exact=exact), expected.min(x))
+            assert s.min(x, exact=exact) in answers
+            answers = (expected.max(x, exact=exact), expected.max(x))
+            assert s.max(x, exact=exact) in answers
+            answers = (sorted(expected.eval(x, 20, exact=exact)), sorted(expected.eval(x, 20)))
+            assert sorted(s.eval(x, 20, exact=exact)) in answers
+            answers = (expected.satisfiable(extra_constraints=(y == 9,), exact=exact),
+                       expected.satisfiable(extra_constraints=(y == 9,)))
+            assert s.satisfiable(extra_constraints=(y == 9,), exact=exact) in answers
+
+        # branches keep working after a concurrent call, and share their statistics
+        b = s.branch()
+        b.add(x > 4)
+        assert sorted(b.eval(x, 20)) == [ 6, 10 ]
+        assert sorted(s.eval(x, 20)) == [ 0, 2, 4, 6, 10 ]
+        assert b.timing_stats() == s.timing_stats()
+
+        stats = s.timing_stats()
+        counters = stats['counters']
+        assert counters.get('approximate', 0) + counters.get('exact', 0) > 0
+        assert stats['timings']['approximate']['count'] > 0
+        assert stats['timings']['exact']['count'] > 0
+
+    # the approximate frontend answers before the exact one starts
+    s = claripy.SolverHybrid(concurrency='speculative', approximate_budget=60)
+    s.add(constraints)
+    assert sorted(s.eval(x, 20, exact=False)) == sorted(expected.eval(x, 20, exact=False))
+    assert s.timing_stats()['counters']['exact_skipped'] == 1
+
+    # the exact frontend answers first, when the approximate one waits for it
+    s = claripy.SolverHybrid(concurrency='race')
+    s.add(constraints)
+    approximate_eval = s._approximate_frontend.eval
+    def slow_eval(*args, **kwargs):
+        concurrent.futures.wait([ s._pending.future ])
+        return approximate_eval(*args, **kwargs)
+    s._approximate_frontend.eval = slow_eval
+    assert sorted(s.eval(x, 20, exact=False)) == sorted(expected.eval(x, 20))
+    assert s.timing_stats()['counters'] == { 'exact': 1 }
+
+    # an exact call that is interrupted is not taken (and cached) as unsat
+    import time
+    a = claripy.BVS('a', 128)
+    b = claripy.BVS('b', 128)
+    s = claripy.SolverHybrid(concurrency='race')
+    s.add([ a * b == (2**61 - 1) * (2**89 - 1), a.UGT(1), b.UGT(1), a.ULT(2**127), b.ULT(2**127) ])
+    approximate_satisfiable = s._approximate_frontend.satisfiable
+    def slow_satisfiable(*args, **kwargs):
+        while s._pending._state != 'running':
+            time.sleep(0.01)
+        time.sleep(0.2)
+        return approximate_satisfiable(*args, **kwargs)
+    s._approximate_frontend.satisfiable = slow_satisfiable
+    assert s.satisfiable(exact=False)
+    s._settle()
+    assert s.timing_stats()['counters'] == { 'approximate': 1, 'exact_cancelled': 1 }
+    assert s._exact_frontend._cached_satness is not False
+
+    nose.tools.assert_raises(claripy.ClaripyValueError, claripy.SolverHybrid, concurrency='sometimes')
+
 
 if __name__ == '__main__':
 
@@ -565,6 +727,7 @@ if __name__ == '__main__':
     for fparams in test_ancestor_merge():
         fparams[0](*fparams[1:])
     test_simplification_annotations()
+    test_incremental_simplification()
     test_model()
     for fparams in test_composite_discrepancy():
         fparams[0](*fparams[1:])
@@ -581,3 +744,5 @@ if __name__ == '__main__':
         fparams[0](*fparams[1:])
     test_composite_solver()
     test_zero_division_in_cache_mixin()
+    test_replacement_cache()
+    test_hybrid_concurrency()
@@ -1037,6 +1037,168 @@ def test_reverse():
     solver = claripy.SolverVSA()
     nose.tools.assert_equal(set(solver.eval(dsis_r, 3)), {0xffff, 0x100ffff})
 
+def test_shared_si():
+    x = claripy.SI(bits=32, stride=4, lower_bound=0, upper_bound=0x40)
+
+    # equal results of different ASTs are the same object
+    a = vsa_model((x + 4) & 0xff)
+    b = vsa_model((x & 0xff) + 4)
+    nose.tools.assert_true(a.identical(b))
+    nose.tools.assert_is(a, b)
+    nose.tools.assert_is(vsa_model(claripy.BVV(0x1337, 32)), vsa_model(claripy.BVV(0x1337, 32)))
+
+    # which can't be modified, but copies can
+    nose.tools.assert_raises(claripy.vsa.errors.ClaripyVSAError, setattr, a, 'lower_bound', 0x1000)
+    nose.tools.assert_raises(claripy.vsa.errors.ClaripyVSAError, setattr, a, 'uninitialized', True)
+    c = a.copy()
+    c.uninitialized = True
+    nose.tools.assert_is_not(c.intern(), a)
+    nose.tools.assert_false(a.uninitialized)
+
+    # named StridedIntervals are never shared
+    n = StridedInterval(name='foo', bits=32, stride=0, lower_bound=1, upper_bound=1)
+    nose.tools.assert_is(n.intern(), n)
+    nose.tools.assert_equal(hash(n), hash(StridedInterval(bits=32, stride=0, lower_bound=1, upper_bound=1)))
+
+    # sharing a result does not make two expressions equal, since only explicit names tell that
+    x, y = claripy.BVS('x', 32), claripy.BVS('y', 32)
+    nose.tools.assert_true(isinstance(vsa_model((x & 0xf) == (y & 0xf)), MaybeResult))
+    nose.tools.assert_true(claripy.SolverHybrid().satisfiable(extra_constraints=((x & 0xf) != (y & 0xf),), exact=False))
+
+    # nameless StridedIntervals keep their name in copies
+    m = StridedInterval(bits=32, stride=1, lower_bound=0, upper_bound=10)
+    nose.tools.assert_equal(m.copy().name, m.name)
+    nose.tools.assert_not_equal(m.nameless_copy().name, m.name)
+
+def test_op_cache():
+    from claripy.backends import ArenaObjectCache
+    from claripy.backends.backend_vsa import BackendVSA
+
+    x = claripy.SI(bits=32, stride=4, lower_bound=0, upper_bound=0x400)
+    e = ((x * 3) | 0x10) + x
+
+    # nothing is kept between conversions but the operation results
+    b = BackendVSA(object_cache=ArenaObjectCache)
+    r = b.convert(e)
+    nose.tools.assert_equal(b._op_cache.stats()['hits'], 0)
+    nose.tools.assert_is(b.convert(e), r)
+    stats = b._op_cache.stats()
+    nose.tools.assert_equal(stats['hits'], 3)
+    nose.tools.assert_equal(stats['ops']['__mul__'], { 'hits': 1, 'misses': 1 })
+    nose.tools.assert_true(r.identical(BackendVSA(op_cache_size=0).convert(e)))
+
+    nose.tools.assert_equal(b._op_cache.trim(0.5), 2)
+    b.downsize()
+    nose.tools.assert_equal(len(b._op_cache), 0)
+
+    # the names of operands are part of the key, since results can keep them
+    foo = b.convert(claripy.BVS('foo', 32, 0, 10, 1))
+    bar = b.convert(claripy.BVS('bar', 32, 0, 10, 1))
+    nose.tools.assert_equal(b._call('Reverse', [ foo ]).name, foo.name)
+    nose.tools.assert_equal(b._call('Reverse', [ bar ]).name, bar.name)
+    nose.tools.assert_is(b._call('Concat', [ foo ]), foo)
+    nose.tools.assert_is(b._call('Concat', [ bar ]), bar)
+
+    # named results are not shared, so they are not handed out twice
+    nose.tools.assert_is_not(b._call('Reverse', [ foo ]), b._call('Reverse', [ foo ]))
+
+    # whether DiscreteStridedIntervalSets are allowed is part of the key
+    u = claripy.BVV(1, 32).union(claripy.BVV(3, 32))
+    nose.tools.assert_is(type(b.convert(u)), StridedInterval)
+    claripy.vsa.strided_interval.allow_dsis = True
+    try:
+        nose.tools.assert_is(type(b.convert(u)), DiscreteStridedIntervalSet)
+    finally:
+        claripy.vsa.strided_interval.allow_dsis = False
+
+def test_dsis_index():
+    def SI(lo, hi, stride=1):
+        return StridedInterval(bits=32, stride=stride, lower_bound=lo, upper_bound=hi)
+
+    # duplicates and contained SIs are dropped, the rest is sorted
+    dsis = DiscreteStridedIntervalSet(bits=32, si_set=[ SI(40, 50), SI(0, 20), SI(4, 8, 2), SI(0, 20), SI(15, 30) ])
+    nose.tools.assert_equal([ (si.lower_bound, si.upper_bound) for si in dsis._members() ], [ (0, 20), (15, 30), (40, 50) ])
+    nose.tools.assert_equal(dsis.cardinality, 21 + 16 + 11)
+
+    # only the overlapping SIs are intersected
+    nose.tools.assert_equal([ si.lower_bound for si in dsis._overlapping(SI(25, 35)) ], [ 15 ])
+    r = dsis.intersection(SI(18, 45))
+    nose.tools.assert_true(isinstance(r, DiscreteStridedIntervalSet))
+    nose.tools.assert_equal(sorted(r.eval(100)), list(range(18, 31)) + list(range(40, 46)))
+    nose.tools.assert_true(dsis.intersection(SI(32, 38)).is_empty)
+
+    r = dsis.union(DiscreteStridedIntervalSet(bits=32, si_set=[ SI(60, 61), SI(42, 44) ]))
+    nose.tools.assert_equal(r.number_of_values, 4)
+
+    # a product that is going to be collapsed anyway is cut short, and the result is still sound
+    a = DiscreteStridedIntervalSet(bits=32, si_set=[ SI(i * 100, i * 100 + 9) for i in range(20) ])
+    b = DiscreteStridedIntervalSet(bits=32, si_set=[ SI(i * 1000, i * 1000 + 1) for i in range(20) ])
+    r = a + b
+    nose.tools.assert_false(isinstance(r, DiscreteStridedIntervalSet))
+    for x in (0, 1910, 19000 + 1901, 5000 + 701):
+        nose.tools.assert_true(BoolResult.is_true(r.intersection(SI(x, x)) == x))
+
+def test_valueset_compact():
+    from claripy.vsa import ValueSet
+    from claripy.vsa.valueset import region_index
+
+    def SI(lo, hi, stride=1):
+        return StridedInterval(bits=32, stride=stride, lower_bound=lo, upper_bound=hi)
+
+    nose.tools.assert_equal(region_index('compact_stack'), region_index('compact_stack'))
+    nose.tools.assert_not_equal(region_index('compact_stack'), region_index('compact_heap'))
+
+    # a single region is stored inline
+    vs = ValueSet(bits=32, region='compact_stack', region_base_addr=0, val=0x10)
+    nose.tools.assert_true(vs._map is None)
+    nose.tools.assert_true(vs.unique)
+    nose.tools.assert_equal(vs.regions, { 'compact_stack': vs.get_si('compact_stack') })
+    nose.tools.assert_equal((vs + 4).max, 0x14)
+
+    # copies share the map of a multi-region ValueSet until one of them modifies it
+    vs._merge_si('compact_heap', 0, SI(0, 0x20, 4))
+    nose.tools.assert_equal(sorted(vs.regions), [ 'compact_heap', 'compact_stack' ])
+    copied = vs.copy()
+    nose.tools.assert_true(copied._map is vs._map)
+    copied._merge_si('compact_global', 0, SI(8, 8))
+    nose.tools.assert_true(copied._map is not vs._map)
+    nose.tools.assert_equal(len(vs.regions), 2)
+    nose.tools.assert_equal(len(copied.regions), 3)
+    nose.tools.assert_true(vs.copy().identical(vs))
+
+    # dropping a region goes back to a single inline region
+    r = vs.intersection(SI(0x20, 0x20))
+    nose.tools.assert_equal(list(r.regions), [ 'compact_heap' ])
+    nose.tools.assert_true(r._map is None)
+    nose.tools.assert_equal(r.eval(10), [ 0x20 ])
+
+def test_evaluate_batch():
+    from claripy.backends import BackendVSA
+
+    x = claripy.SI(bits=32, stride=1, lower_bound=0, upper_bound=20)
+    y = claripy.SI(bits=32, stride=2, lower_bound=100, upper_bound=200)
+    c = claripy.If(x > 10, x, y)
+    t = c
+    for i in range(3):
+        t = claripy.If(x == i, t + i, t * 3) ^ c
+    exprs = [ (t + i) & 0xfff for i in range(4) ] + [ t > 5, c ]
+    constraints = [ x + 1 > 5 ]
+
+    b = BackendVSA()
+    values, bounds = b.evaluate_batch(exprs, constraints)
+    nose.tools.assert_equal(len(values), len(exprs))
+    for e, v in zip(exprs, values):
+        nose.tools.assert_true(e._excavated is not None)
+        nose.tools.assert_true(b.identical(v, BackendVSA().convert(e)))
+    nose.tools.assert_true(isinstance(values[4], BoolResult))
+    for (sat, replacements), c in zip(bounds, constraints):
+        expected_sat, expected = b.constraint_to_si(c)
+        nose.tools.assert_equal(sat, expected_sat)
+        nose.tools.assert_equal(len(replacements), len(expected))
+        for (k, v), (expected_k, expected_v) in zip(replacements, expected):
+            nose.tools.assert_true(k is expected_k)
+            nose.tools.assert_true(b.identical(b.convert(v), b.convert(expected_v)))
+
 if __name__ == '__main__':
     test_reasonable_bounds()
     test_reversed_concat()
@@ -1050,3 +1212,8 @@ if __name__ == '__main__':
     test_solution()
     test_shifting()
     test_reverse()
+    test_shared_si()
+    test_op_cache()
+    test_dsis_index()
+    test_valueset_compact()
+    test_evaluate_batch()